@@ -0,0 +1,448 @@
+# coding=utf-8
+
+import util
+import lector_tweets
+import argparse
+import json
+import random
+import datetime
+import platform
+import timeit
+import tempfile
+import shutil
+import os
+import bson
+from collections import Counter
+import pandas as pd
+
+__doc__ = """
+Este fichero de Python mide el tiempo de cada etapa del camino completo de los tweets: filtrado, escritura en
+Mongodb, lectura en pandas, anyadir la hora/minuto y los emoticonos/hashtags/menciones, y los contadores del
+analisis. Tambien se mide cada metodo de util.UtilidadPatternTexto sobre los textos, la escritura en ficheros y la
+lectura desde un fichero .bson sin Mongodb. Si esta instalado pyarrow se mide la lectura con la cache en Parquet y,
+con un Mongodb real, la lectura en paralelo con varios procesos. Tambien se miden las lecturas filtradas por fecha,
+lenguaje y hashtag y, con un Mongodb real, se comprueba con explain que utilizan los indices de la coleccion. Los
+tweets son sinteticos y se generan con una semilla fija para que las medidas sean reproducibles.
+El resultado se escribe en JSON para poder comparar el rendimiento entre versiones, con los segundos, los tweets por
+segundo y los microsegundos por tweet de cada etapa.
+=====================================================================
+Parametros:
+    * -e/--escalas: Numero de tweets de cada medida. **Opcional**, por defecto 10000 100000 1000000
+    * -mdbh/--mongodbhost: Mongodb host. **Opcional**, si no se indica se utiliza mongomock (sin servidor)
+    * -mdbp/--mongodbpuerto: Mongodb puerto. **Opcional**, por defecto 27017
+    * -bd/--basedatos: Base de datos donde se escriben los tweets. Se borra antes de cada medida.
+        **Opcional**, por defecto benchmarktweets
+    * -tl/--tamanyolote: Numero de tweets que se escriben juntos en Mongodb. **Opcional**, por defecto 1000
+    * -sm/--semilla: Semilla para generar los tweets. **Opcional**, por defecto 0
+    * -ct/--capacidadtendencias: Capacidad de los contadores de util.RastreadorTendencias. Es pequenya para que los
+        contadores se llenen y se compruebe que el error de las tendencias esta dentro de su cota comparando con
+        collections.Counter. **Opcional**, por defecto 50
+    * -tz/--tamanyotrozo: Numero de tweets de cada trozo al leer los tweets por trozos y acumular el analisis.
+        **Opcional**, por defecto 100000
+    * -np/--numeroprocesos: Numero de procesos de cada medida de la lectura en paralelo por rangos de _id. Solo se
+        mide si se indica -mdbh, ya que con mongomock cada proceso no puede abrir su propia conexion.
+        **Opcional**, por defecto 1 2 4
+    * -cct/--capacidadcachetexto: Capacidad de util.CacheCaracteristicasTexto al medir las caracteristicas del texto
+        con textos repetidos. **Opcional**, por defecto 100000
+    * -ptr/--proporciontextosrepetidos: Proporcion de textos que se sustituyen por uno anterior, como los de bots y
+        retweets, al medir util.CacheCaracteristicasTexto. **Opcional**, por defecto 0.3
+    * -s/--salida: Fichero donde escribir el resultado en JSON. **Opcional**, por defecto se muestra por pantalla
+
+Ejemplo:
+    python benchmark_tweets.py -e 10000 100000 -s benchmark.json
+"""
+
+# Elementos con los que se generan los textos de los tweets sinteticos
+PALABRAS = [u"madrid", u"hoy", u"partido", u"que", u"de", u"la", u"gente", u"metro", u"calor", u"mañana",
+            u"concierto", u"por", u"fin", u"viernes", u"gracias", u"el", u"en", u"vamos", u"ciudad", u"noche"]
+SIGNOSPUNTUACION = [u".", u",", u"!", u"?", u"...", u":"]
+EMOTICONOS = [u"\U0001F602", u"❤️", u"\U0001F60D", u"\U0001F525", u"\U0001F44F\U0001F3FD",
+              u"☀️", u"⚽", u"\U0001F1EA\U0001F1F8", u"\U0001F468‍\U0001F469‍\U0001F467"]
+HASHTAGS = [u"#Madrid", u"#RealMadrid", u"#Atleti", u"#viernes", u"#MadridCentral", u"#SanIsidro", u"#metro"]
+MENCIONES = [u"@metro_madrid", u"@MADRID", u"@realmadrid", u"@Atleti", u"@policia", u"@EmergenciasMad"]
+LENGUAJES = [u"es"] * 12 + [u"en"] * 4 + [u"und", u"pt", u"fr", u"it", u"ca"]
+DIAS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+# Argumentos de las lecturas filtradas de util.MongodbParseadorTweetsAPandas: un dia de los 28 de los tweets, un
+# lenguaje poco frecuente y un hashtag
+ARGUMENTOS_CONSULTAS = [("obtenerTweetsEnPandasPorFecha", {"fechaInicio": datetime.datetime(2018, 10, 5),
+                                                           "fechaFin": datetime.datetime(2018, 10, 6)}),
+                        ("obtenerTweetsEnPandasPorLenguaje", {"lenguajes": u"pt"}),
+                        ("obtenerTweetsEnPandasPorHashtag", {"hashtags": u"#MadridCentral"})]
+
+# Densidad aproximada de elementos en los textos: probabilidad de que cada token sea de cada tipo
+PROBABILIDAD_EMOTICONO = 0.08
+PROBABILIDAD_HASHTAG = 0.06
+PROBABILIDAD_MENCION = 0.05
+PROBABILIDAD_URL = 0.02
+PROBABILIDAD_SIGNOPUNTUACION = 0.1
+
+
+def generarTexto(aleatorio):
+    """
+    Genera un texto de tweet con emoticonos, hashtags, menciones, urls y signos de puntuacion.
+
+    :param aleatorio: random.Random con el que generar el texto
+    :return: texto del tweet
+    """
+    tokens = list()
+    for _ in range(aleatorio.randint(3, 30)):
+        probabilidad = aleatorio.random()
+        if probabilidad < PROBABILIDAD_EMOTICONO:
+            tokens.append(aleatorio.choice(EMOTICONOS))
+        elif probabilidad < PROBABILIDAD_EMOTICONO + PROBABILIDAD_HASHTAG:
+            # La mitad de los hashtags son de una cola larga (distribucion de Pareto) como en Twitter
+            tokens.append(aleatorio.choice(HASHTAGS) if aleatorio.random() < 0.5 else
+                          u"#tema%d" % int(aleatorio.paretovariate(1.2)))
+        elif probabilidad < PROBABILIDAD_EMOTICONO + PROBABILIDAD_HASHTAG + PROBABILIDAD_MENCION:
+            tokens.append(aleatorio.choice(MENCIONES))
+        elif probabilidad < PROBABILIDAD_EMOTICONO + PROBABILIDAD_HASHTAG + PROBABILIDAD_MENCION + PROBABILIDAD_URL:
+            tokens.append(u"https://t.co/%010x" % aleatorio.getrandbits(40))
+        elif probabilidad < PROBABILIDAD_EMOTICONO + PROBABILIDAD_HASHTAG + PROBABILIDAD_MENCION + \
+                PROBABILIDAD_URL + PROBABILIDAD_SIGNOPUNTUACION:
+            tokens.append(aleatorio.choice(SIGNOSPUNTUACION))
+        else:
+            tokens.append(aleatorio.choice(PALABRAS))
+    return u" ".join(tokens)
+
+
+def generarTweet(numeroTweet, aleatorio):
+    """
+    Genera un tweet sintetico con la misma estructura que los que envia Twitter, incluyendo campos que no estan en
+    DICT_KEYS_TWEERS para que el filtrado tenga que descartarlos.
+
+    :param numeroTweet: numero del tweet. Se utiliza para el id, que es creciente como en Twitter
+    :param aleatorio: random.Random con el que generar el tweet
+    :return: tweet en formato JSON
+    """
+    texto = generarTexto(aleatorio)
+    idTweet = 1050000000000000000 + numeroTweet
+    segundosDelDia = aleatorio.randint(0, 86399)
+    hashtags = [{"text": token[1:], "indices": [0, len(token)]} for token in texto.split() if token.startswith(u"#")]
+    menciones = [{"screen_name": token[1:], "name": token[1:], "id": 1, "id_str": "1", "indices": [0, len(token)]}
+                 for token in texto.split() if token in MENCIONES]
+    urls = [{"url": token, "expanded_url": u"https://www.madrid.es/%s" % token[13:], "indices": [0, len(token)]}
+            for token in texto.split() if token.startswith(u"https://t.co/")]
+    return {"created_at": "%s Oct %02d %02d:%02d:%02d +0000 2018" % (
+        DIAS[numeroTweet % 7], 1 + numeroTweet % 28, segundosDelDia // 3600, segundosDelDia // 60 % 60,
+        segundosDelDia % 60),
+            "id": idTweet,
+            "id_str": str(idTweet),
+            "text": texto,
+            "source": "<a href=\"http://twitter.com/download/android\">Twitter for Android</a>",
+            "truncated": False,
+            "in_reply_to_status_id": None,
+            "in_reply_to_user_id": None,
+            "user": {"id": numeroTweet % 5000, "id_str": str(numeroTweet % 5000),
+                     "name": u"Usuario %d" % (numeroTweet % 5000), "screen_name": "usuario%d" % (numeroTweet % 5000),
+                     "location": u"Madrid", "description": u"Descripcion del usuario", "followers_count": 100,
+                     "friends_count": 200, "favourites_count": 300, "statuses_count": 400, "lang": "es",
+                     "created_at": "Mon Jan 01 00:00:00 +0000 2012", "verified": False, "geo_enabled": False,
+                     "profile_image_url": "http://pbs.twimg.com/profile_images/1/imagen.jpg",
+                     "profile_background_color": "C0DEED", "profile_text_color": "333333", "following": None,
+                     "follow_request_sent": None, "notifications": None, "utc_offset": None, "time_zone": None},
+            "geo": None,
+            "coordinates": None,
+            "place": {"id": "206e932cc0e89fa2", "url": "https://api.twitter.com/1.1/geo/id/206e932cc0e89fa2.json",
+                      "place_type": "city", "name": u"Madrid", "full_name": u"Madrid, España", "country_code": "ES",
+                      "country": u"España", "bounding_box": {"type": "Polygon", "coordinates": [
+                    [[-3.8, 40.3], [-3.8, 40.6], [-3.5, 40.6], [-3.5, 40.3]]]}, "attributes": {}}
+            if aleatorio.random() < 0.1 else None,
+            "is_quote_status": False,
+            "quote_count": 0,
+            "reply_count": 0,
+            "retweet_count": 0,
+            "favorite_count": 0,
+            "entities": {"hashtags": hashtags, "urls": urls, "user_mentions": menciones, "symbols": []},
+            "favorited": False,
+            "retweeted": False,
+            "filter_level": "low",
+            "lang": aleatorio.choice(LENGUAJES),
+            "timestamp_ms": str(1539202764000 + numeroTweet)}
+
+
+def medir(resultado, nombreEtapa, funcion, *argumentos):
+    """
+    Ejecuta una funcion y guarda en el resultado los segundos que ha tardado.
+
+    :param resultado: diccionario donde guardar los segundos de la etapa
+    :param nombreEtapa: nombre de la etapa
+    :param funcion: funcion a ejecutar
+    :param argumentos: argumentos de la funcion
+    :return: lo que devuelva la funcion
+    """
+    instanteInicio = timeit.default_timer()
+    valorDevuelto = funcion(*argumentos)
+    resultado[nombreEtapa] = timeit.default_timer() - instanteInicio
+    return valorDevuelto
+
+
+def comprobarErrorTendencias(rastreadorTendencias, tweets):
+    """
+    Compara las tendencias de la ventana mas larga con las apariciones exactas obtenidas con collections.Counter.
+    Todos los tweets sinteticos estan dentro de la ventana mas larga mientras haya menos de 3600000 tweets.
+
+    :param rastreadorTendencias: util.RastreadorTendencias con los tweets ya anyadidos
+    :param tweets: tweets anyadidos
+    :return: diccionario por tipo con el error maximo encontrado, la cota del error, si todas las apariciones
+        estan dentro de la cota y cuantos del top 10 aproximado estan tambien en el top 10 exacto (con empates)
+    """
+    utilidadPatternTexto = util.UtilidadPatternTexto()
+    obtenerElementos = {
+        util.ParseadorTweetsAPandas.NOMBRE_COLUMNA_EMOTICONOS: utilidadPatternTexto.obtenerEmoticonosEnTexto,
+        util.ParseadorTweetsAPandas.NOMBRE_COLUMNA_HASHTAGS: utilidadPatternTexto.obtenerHashtagsEnTexto,
+        util.ParseadorTweetsAPandas.NOMBRE_COLUMNA_MENCIONES: utilidadPatternTexto.obtenerMencionesEnTexto}
+    ventana = max(rastreadorTendencias.ventanas)
+    errorTendencias = dict()
+    for tipo in util.RastreadorTendencias.TIPOS:
+        contadorExacto = Counter()
+        for tweet in tweets:
+            contadorExacto.update(obtenerElementos[tipo](tweet["text"]))
+        contadorVentana = rastreadorTendencias.obtenerContadorVentana(tipo, ventana)
+        cotaError = contadorVentana.obtenerCotaError()
+        errorMaximo = 0
+        dentroDeCota = True
+        for elemento, apariciones in contadorVentana.masComunes():
+            error = apariciones - contadorExacto[elemento]
+            errorMaximo = max(errorMaximo, error)
+            dentroDeCota = dentroDeCota and 0 <= error <= min(cotaError, contadorVentana.obtenerError(elemento))
+        # Un elemento del top aproximado es un acierto si sus apariciones reales llegan a las del decimo exacto
+        topExacto = contadorExacto.most_common(10)
+        aparicionesDecimo = topExacto[-1][1] if topExacto else 0
+        aciertosTop10 = sum(1 for elemento, _ in contadorVentana.masComunes(10)
+                            if contadorExacto[elemento] >= aparicionesDecimo)
+        errorTendencias[tipo] = {"errorMaximo": errorMaximo,
+                                 "cotaError": cotaError,
+                                 "dentroDeCota": dentroDeCota,
+                                 "aciertosTop10": aciertosTop10}
+    return errorTendencias
+
+
+def crearManejadorMongodb(args):
+    """
+    Crea el manejador de Mongodb contra el servidor indicado o contra mongomock si no se ha indicado ninguno.
+
+    :param args: parametros del programa
+    :return: manejador de Mongodb
+    """
+    if args.mongodbhost:
+        return util.ManejadorMongodb(mongodbHost=args.mongodbhost, mongodbPuerto=args.mongodbpuerto,
+                                     basedatosNombreTweets=args.basedatos)
+    import mongomock
+    return util.ManejadorMongodb(mongodbHost=None, mongodbPuerto=None, basedatosNombreTweets=args.basedatos,
+                                 mongoCliente=mongomock.MongoClient())
+
+
+def medirEscala(numeroTweets, args):
+    """
+    Mide el tiempo de cada etapa para un numero de tweets.
+
+    :param numeroTweets: numero de tweets sinteticos a generar
+    :param args: parametros del programa
+    :return: diccionario con los segundos de cada etapa y los tweets por segundo de cada una
+    """
+    aleatorio = random.Random(args.semilla)
+    resultado = dict()
+    tweets = medir(resultado, "generar", lambda: [generarTweet(numeroTweet, aleatorio) for numeroTweet in
+                                                  range(numeroTweets)])
+
+    filtroTwiter = lector_tweets.FiltroTwiter(lector_tweets.DICT_KEYS_TWEERS)
+    tweetsFiltrados = medir(resultado, "FiltroTwiter.filtrarTweetjson",
+                            lambda: [filtroTwiter.filtrarTweetjson(tweet) for tweet in tweets])
+
+    rastreadorTendencias = util.RastreadorTendencias(capacidad=args.capacidadtendencias)
+
+    def anyadirTendencias():
+        for tweet in tweets:
+            rastreadorTendencias.anyadirTweet(tweet)
+
+    medir(resultado, "RastreadorTendencias.anyadirTweet", anyadirTendencias)
+    errorTendencias = comprobarErrorTendencias(rastreadorTendencias, tweets)
+
+    # Cada metodo de UtilidadPatternTexto por separado sobre el texto de cada tweet
+    utilidadPatternTexto = util.UtilidadPatternTexto()
+    textos = [tweet["text"] for tweet in tweets]
+    for nombreMetodo in ["tokenizar", "obtenerCaracteristicasTexto", "limpiarTexto", "obtenerEmoticonosEnTexto",
+                         "obtenerHashtagsEnTexto", "obtenerMencionesEnTexto"]:
+        metodo = getattr(utilidadPatternTexto, nombreMetodo)
+        medir(resultado, "UtilidadPatternTexto.%s" % nombreMetodo, lambda: [metodo(texto) for texto in textos])
+
+    # Textos repetidos como los de bots y retweets: cada texto se sustituye con una probabilidad por uno anterior.
+    # Se miden las caracteristicas del texto sin y con util.CacheCaracteristicasTexto
+    aleatorioRepetidos = random.Random(args.semilla)
+    textosConRepetidos = list()
+    for texto in textos:
+        if textosConRepetidos and aleatorioRepetidos.random() < args.proporciontextosrepetidos:
+            texto = aleatorioRepetidos.choice(textosConRepetidos)
+        textosConRepetidos.append(texto)
+    cacheCaracteristicasTexto = util.CacheCaracteristicasTexto(args.capacidadcachetexto)
+    for nombreEtapa, cache in [("UtilidadPatternTexto.obtenerCaracteristicasTexto[textos repetidos]", None),
+                               ("UtilidadPatternTexto.obtenerCaracteristicasTexto[textos repetidos, cache]",
+                                cacheCaracteristicasTexto)]:
+        utilidadPatternTextoRepetidos = util.UtilidadPatternTexto(cache)
+        medir(resultado, nombreEtapa, lambda: [utilidadPatternTextoRepetidos.obtenerCaracteristicasTexto(texto)
+                                               for texto in textosConRepetidos])
+
+    manejadorMongodb = crearManejadorMongodb(args)
+    mongodbEscritorTweets = util.MongodbEscritorTweets(manejadorMongodb, vaciarAnterioresColecciones=True,
+                                                       tamanyoLote=args.tamanyolote)
+
+    def escribirTweets():
+        for tweetFiltrado in tweetsFiltrados:
+            mongodbEscritorTweets.escribirTweetFiltrado(tweetFiltrado)
+        mongodbEscritorTweets.vaciar()
+
+    try:
+        medir(resultado, "MongodbEscritorTweets.escribirTweetFiltrado", escribirTweets)
+    finally:  # Se para el hilo de vaciado aunque falle la escritura
+        mongodbEscritorTweets.detenerVaciado()
+
+    # Escritura sin Mongodb en segmentos comprimidos
+    directorioSegmentos = tempfile.mkdtemp()
+    try:
+        ficheroEscritorTweets = util.FicheroEscritorTweets(directorioSegmentos)
+
+        def escribirTweetsEnFicheros():
+            for tweetFiltrado in tweetsFiltrados:
+                ficheroEscritorTweets.escribirTweetFiltrado(tweetFiltrado)
+            ficheroEscritorTweets.vaciar()
+
+        medir(resultado, "FicheroEscritorTweets.escribirTweetFiltrado[%s]" % ficheroEscritorTweets.compresion,
+              escribirTweetsEnFicheros)
+    finally:
+        shutil.rmtree(directorioSegmentos)
+
+    mongodbParseadorTweetsAPandas = util.MongodbParseadorTweetsAPandas(manejadorMongodb)
+    medir(resultado, "pasearTodosTweetsFiltradoEnPandas",
+          mongodbParseadorTweetsAPandas.pasearTodosTweetsFiltradoEnPandas)
+    medir(resultado, "anyadirHoraMinuto", mongodbParseadorTweetsAPandas.anyadirHoraMinuto)
+
+    def acumularTrozos():
+        acumuladorAnalisis = util.AcumuladorAnalisis()
+        for pdTrozo in mongodbParseadorTweetsAPandas.iterarTweetsFiltradoEnPandas(args.tamanyotrozo):
+            acumuladorAnalisis.anyadirTrozo(pdTrozo)
+        return acumuladorAnalisis
+
+    medir(resultado, "iterarTweetsFiltradoEnPandas+AcumuladorAnalisis", acumularTrozos)
+
+    # Lectura en paralelo por rangos de _id. Con mongomock no se puede porque cada proceso abre su propia conexion
+    if manejadorMongodb.obtenerParametrosConexion() is not None:
+        for numeroProcesos in args.numeroprocesos:
+            medir(resultado, "pasearTodosTweetsFiltradoEnPandas[procesos=%d]" % numeroProcesos,
+                  util.MongodbParseadorTweetsAPandas(
+                      manejadorMongodb, numeroProcesos=numeroProcesos).pasearTodosTweetsFiltradoEnPandas)
+
+    # Lecturas filtradas. Con mongomock no hay explain y los indices de cada consulta quedan en None
+    indicesConsultas = dict()
+    for nombreMetodo, argumentos in ARGUMENTOS_CONSULTAS:
+        medir(resultado, "MongodbParseadorTweetsAPandas.%s" % nombreMetodo,
+              lambda: getattr(mongodbParseadorTweetsAPandas, nombreMetodo)(**argumentos))
+        indicesConsultas[nombreMetodo] = manejadorMongodb.obtenerIndicesConsulta(
+            mongodbParseadorTweetsAPandas.crearFiltro(**argumentos))
+
+    # Lectura sin Mongodb de un fichero .bson con los tweets escritos, como el que crea mongodump
+    directorioBson = tempfile.mkdtemp()
+    try:
+        ficheroBson = os.path.join(directorioBson, "tweetfiltrado.bson")
+        with open(ficheroBson, "wb") as fichero:
+            for tweetFiltrado in manejadorMongodb.obtenerColeccionTweetsFiltrados().find():
+                fichero.write(bson.BSON.encode(tweetFiltrado))
+        medir(resultado, "BsonParseadorTweetsAPandas.pasearTodosTweetsFiltradoEnPandas",
+              util.BsonParseadorTweetsAPandas(ficheroBson).pasearTodosTweetsFiltradoEnPandas)
+    finally:
+        shutil.rmtree(directorioBson)
+
+    if util.pyarrow is not None:  # Lectura con la cache en Parquet: la primera vez guarda la cache y despues la lee
+        directorioCache = tempfile.mkdtemp()
+        try:
+            for nombreEtapa in ["pasearTodosTweetsFiltradoEnPandas[cache fria]",
+                                "pasearTodosTweetsFiltradoEnPandas[cache caliente]"]:
+                medir(resultado, nombreEtapa, util.MongodbParseadorTweetsAPandas(
+                    manejadorMongodb, directorioCache=directorioCache).pasearTodosTweetsFiltradoEnPandas)
+        finally:
+            shutil.rmtree(directorioCache)
+
+    # La lectura ya anyade los emoticonos, hashtags, menciones y urls, por lo que se borran para medir solo esta
+    # etapa: primero con los hashtags, menciones y urls de las entidades y despues sacandolos todos del texto
+    pdTweets = mongodbParseadorTweetsAPandas.pdTweetsFiltrado
+    for nombreEtapa, columnasBorrar in [
+            ("anyadirEmoticonosHashtagsMenciones", [util.ParseadorTweetsAPandas.NOMBRE_COLUMNA_EMOTICONOS]),
+            ("anyadirEmoticonosHashtagsMenciones[sin entidades]", list(util.ParseadorTweetsAPandas.COLUMNAS_LISTA))]:
+        mongodbParseadorTweetsAPandas.pdTweetsFiltrado = pdTweets.drop(columnasBorrar, axis=1)
+        medir(resultado, nombreEtapa, mongodbParseadorTweetsAPandas.anyadirEmoticonosHashtagsMenciones)
+    pdTweets = mongodbParseadorTweetsAPandas.pdTweetsFiltrado
+
+    analisisUtilidad = util.AnalisisUtilidad()
+    for nombreColumna in [util.ParseadorTweetsAPandas.NOMBRE_COLUMNA_EMOTICONOS,
+                          util.ParseadorTweetsAPandas.NOMBRE_COLUMNA_HASHTAGS,
+                          util.ParseadorTweetsAPandas.NOMBRE_COLUMNA_MENCIONES]:
+        medir(resultado, "obtenerNumeroDeElementosListaEnSeriePandas[%s]" % nombreColumna,
+              analisisUtilidad.obtenerNumeroDeElementosListaEnSeriePandas, pdTweets[nombreColumna])
+        medir(resultado, "obtenerContadorDeElementosListaEnSeriePandas[%s]" % nombreColumna,
+              lambda: analisisUtilidad.obtenerContadorDeElementosListaEnSeriePandas(pdTweets[nombreColumna], top=10))
+        medir(resultado, "obtenerContadorPorGrupoDeElementosListaEnSeriePandas[%s]" % nombreColumna,
+              lambda: analisisUtilidad.obtenerContadorPorGrupoDeElementosListaEnSeriePandas(
+                  pdTweets[nombreColumna], pdTweets[util.ParseadorTweetsAPandas.NOMBRE_COLUMNA_HORA], top=3))
+    medir(resultado, "obtenerContadorDeElementosNoListaEnSeriePandas[%s]" %
+          util.ParseadorTweetsAPandas.NOMBRE_COLUMNA_LENGUAJE,
+          lambda: analisisUtilidad.obtenerContadorDeElementosNoListaEnSeriePandas(
+              pdTweets[util.ParseadorTweetsAPandas.NOMBRE_COLUMNA_LENGUAJE], top=10))
+
+    mongodbEscritorTweets.borrarContenido()
+    return {"errorTendencias": errorTendencias,
+            "indicesConsultas": indicesConsultas,
+            "cacheCaracteristicasTexto": cacheCaracteristicasTexto.obtenerEstadisticas(),
+            "segundos": resultado,
+            "tweetsPorSegundo": dict((nombreEtapa, numeroTweets / segundos if segundos > 0 else None)
+                                     for nombreEtapa, segundos in resultado.items()),
+            "microsegundosPorTweet": dict((nombreEtapa, segundos * 1e6 / numeroTweets)
+                                          for nombreEtapa, segundos in resultado.items())}
+
+
+if __name__ == '__main__':
+    """
+    Si se llama a este programa, se parsean los parametros, se mide cada escala y se escribe el resultado en JSON.
+    """
+
+    parser = argparse.ArgumentParser(description="Este programa mide el rendimiento de cada etapa de los tweets")
+    parser.add_argument("-e", "--escalas", default=[10000, 100000, 1000000], type=int, nargs='+',
+                        help="Numero de tweets de cada medida")
+    parser.add_argument("-mdbh", "--mongodbhost", help="Mongodb host. Si no se indica se utiliza mongomock")
+    parser.add_argument("-mdbp", "--mongodbpuerto", default=27017, type=int, help="Mongodb puerto")
+    parser.add_argument("-bd", "--basedatos", default="benchmarktweets",
+                        help="Base de datos donde se escriben los tweets. Se borra antes de cada medida")
+    parser.add_argument("-tl", "--tamanyolote", default=1000, type=int,
+                        help="Numero de tweets que se escriben juntos en Mongodb")
+    parser.add_argument("-sm", "--semilla", default=0, type=int, help="Semilla para generar los tweets")
+    parser.add_argument("-ct", "--capacidadtendencias", default=50, type=int,
+                        help="Capacidad de los contadores de las tendencias")
+    parser.add_argument("-tz", "--tamanyotrozo", default=util.MongodbParseadorTweetsAPandas.TAMANYO_TROZO, type=int,
+                        help="Numero de tweets de cada trozo al leer por trozos")
+    parser.add_argument("-np", "--numeroprocesos", default=[1, 2, 4], type=int, nargs='+',
+                        help="Numero de procesos de cada medida de la lectura en paralelo")
+    parser.add_argument("-cct", "--capacidadcachetexto", default=util.CacheCaracteristicasTexto.CAPACIDAD, type=int,
+                        help="Capacidad de la cache de las caracteristicas del texto")
+    parser.add_argument("-ptr", "--proporciontextosrepetidos", default=0.3, type=float,
+                        help="Proporcion de textos repetidos al medir la cache de las caracteristicas del texto")
+    parser.add_argument("-s", "--salida", help="Fichero donde escribir el resultado en JSON")
+
+    args = parser.parse_args()
+
+    resultado = {"python": platform.python_version(),
+                 "pandas": pd.__version__,
+                 "mongodb": "%s:%d" % (args.mongodbhost, args.mongodbpuerto) if args.mongodbhost else "mongomock",
+                 "tamanyoLote": args.tamanyolote,
+                 "semilla": args.semilla,
+                 "capacidadTendencias": args.capacidadtendencias,
+                 "capacidadCacheTexto": args.capacidadcachetexto,
+                 "proporcionTextosRepetidos": args.proporciontextosrepetidos,
+                 "escalas": dict()}
+    for numeroTweets in args.escalas:
+        resultado["escalas"][str(numeroTweets)] = medirEscala(numeroTweets, args)
+
+    resultadoJson = json.dumps(resultado, indent=4, sort_keys=True)
+    if args.salida:
+        with open(args.salida, "w") as ficheroSalida:
+            ficheroSalida.write(resultadoJson)
+    else:
+        print resultadoJson
@@ -5,6 +5,24 @@ import tweepy
 import argparse
 import json
 import httplib
+import threading
+import timeit
+import Queue
+import gzip
+import io
+import re
+import time
+import calendar
+import os
+import inspect
+from collections import Counter
+
+# Decodificador JSON para la decodificacion rapida. Se utiliza ujson si esta instalado y si no el de la libreria
+# estandar (orjson solo existe para Python 3, por lo que no se puede utilizar en este programa)
+try:
+    import ujson as jsonRapido
+except ImportError:
+    jsonRapido = json
 
 __author__ = "Enrique Rodriguez Moron"
 __doc__ = """
@@ -28,6 +46,35 @@ Parametros:
         Cualquier valor menor a 0 se considera escucha infinita
     * -tt/--temastweets: Lista de temas en los que se esta interesado. El programa buscara tweets que contengan todos
         los parametros (and). **Opcional**, madrid por defecto
+    * -tl/--tamanyolote: Numero de tweets que se escriben juntos en Mongodb. **Opcional**, 1 por defecto (cada tweet
+        se escribe en el momento)
+    * -iv/--intervalovaciado: Segundos maximos que un tweet puede estar pendiente de ser escrito en Mongodb cuando
+        se escribe por lotes. **Opcional**, 5 por defecto
+    * -nt/--numerotrabajadores: Numero de hilos que procesan los tweets. **Opcional**, 0 por defecto (se procesan en
+        el mismo hilo que lee de Twitter)
+    * -tc/--tamanyocola: Numero maximo de tweets pendientes de ser procesados por los hilos. **Opcional**, 1000 por
+        defecto
+    * -dr/--decodificacionrapida: Descarta los retweets y mensajes de control sin decodificar el JSON y decodifica el
+        resto con ujson si esta instalado. **Opcional**, este parametro no tiene que tener valor
+    * -rp/--reproducir: Lista de ficheros con tweets grabados (uno en JSON por linea, en texto plano o gzip) que se
+        procesan en lugar de escuchar a Twitter. Al terminar se muestra un informe con el rendimiento. **Opcional**,
+        no necesita las claves de Twitter
+    * -ro/--ritmooriginal: Al reproducir tweets grabados, respeta los tiempos originales segun su created_at en lugar
+        de procesarlos tan rapido como se pueda. **Opcional**, este parametro no tiene que tener valor
+    * -lh/--latenciahidratacion: Segundos maximos que un tweet truncado espera a que se pida su texto completo junto
+        con otros tweets truncados. **Opcional**, 2 por defecto
+    * -ft/--ficherotendencias: Fichero JSON donde se guardan, al terminar, los emoticonos, hashtags y menciones mas
+        frecuentes de los ultimos 5 minutos y la ultima hora (ver util.RastreadorTendencias). Si el fichero ya existe
+        se continua desde su estado. **Opcional**, si no se indica no se obtienen tendencias
+    * -de/--directorioescritura: Directorio donde se escriben los tweets en segmentos NDJSON comprimidos en lugar de
+        en Mongodb (ver util.FicheroEscritorTweets). Los segmentos se pueden cargar despues en Mongodb con volcarEn.
+        **Opcional**, si no se indica se escriben en Mongodb
+    * -ds/--directoriospool: Directorio donde se guardan los tweets mientras Mongodb no responde, para cargarlos
+        cuando vuelva a responder sin dejar de escuchar (ver util.MongodbEscritorTweets). **Opcional**, si no se indica
+        el programa termina cuando Mongodb no responde
+    * -mbs/--megabytesspool: Megabytes maximos que puede ocupar el spool. **Opcional**, 1024 por defecto
+    * -tss/--segundosseleccionservidor: Segundos que se espera a Mongodb antes de dar una escritura por fallida.
+        **Opcional**, por defecto los de pymongo (30 segundos)
 
 Mongodb:
     Puesto que los tweets son almacenados en Mongodb, es requisito que una instancia este arrancada y se notifique
@@ -47,8 +94,18 @@ Procesado de tweest:
     sin este procesado en una coleccion en Mongodb. Para ver que campos estan siendo guardados consultar 
     DICT_KEYS_TWEERS.
     
+    Si el tweet esta truncado, se pide su texto completo a Twitter. Para no hacer una peticion por tweet, los tweets
+    truncados esperan (como mucho unos segundos) y se piden hasta 100 juntos (ver HidratadorTweets).
+
     Posteriormente se guarda el tweet procesado (y el no procesado si asi se ha dicho) para ser analizado.
 
+    Si se indica un numero de trabajadores, el hilo que lee de Twitter solo mete los tweets en una cola acotada y
+    son los trabajadores los que los procesan. Asi un procesado lento (completar textos truncados, escribir en
+    Mongodb) no retrasa la lectura y Twitter no corta la conexion por leer despacio.
+
+    Si se indica un fichero de tendencias, los emoticonos, hashtags y menciones de cada tweet se cuentan mientras se
+    escucha, de forma aproximada y con memoria acotada, para poder consultar las tendencias sin leer los tweets.
+
 Testeado y versiones de librerias:
     * python 2.7.14
     * tweepy 3.5.0
@@ -154,6 +211,11 @@ class FiltroTwiter:
 
     Esta clase se utilizara para guardar algunos campos del tweet que pueden ser interesantes ahora o en un
     posterior analisis.
+
+    Al crear el objeto, el diccionario se compila una unica vez en un plan de proyeccion (ver
+    compilarPlanProyeccion) y filtrarTweetjson construye el tweet filtrado cogiendo solo los campos del plan, por lo
+    que el coste depende del tamanyo del diccionario y no del tamanyo del tweet. El resultado es el mismo que el de
+    filtrarTweetjsonConDiccionarioPorParametro.
     """
 
     def __init__(self, diccionarioParaFiltrar={}):
@@ -166,17 +228,70 @@ class FiltroTwiter:
             campo y 2) otro diccionario con el que filtrar los valores de la key del tweet
         """
         self.diccionarioParaFiltrar = diccionarioParaFiltrar
+        self.planProyeccion = self.compilarPlanProyeccion(diccionarioParaFiltrar)
 
     def filtrarTweetjson(self, tweetjson):
         """
         Filtra un tweet en formato JSON utilizando el diccionario que se le ha pasado por parametro al objeto cuando
-        se ha creado.
+        se ha creado. Se utiliza el plan de proyeccion compilado a partir del diccionario.
 
         :param tweetjson: Tweet en formato JSON que se quiere filtrar
         :return: El tweet en formato JSON filtrado. Si el diccionario y tweet no estan en formato
             dict, devuelve None
         """
-        return self.filtrarTweetjsonConDiccionarioPorParametro(self.diccionarioParaFiltrar, tweetjson)
+        return self.proyectarTweetjson(self.planProyeccion, tweetjson)
+
+    def compilarPlanProyeccion(self, diccionarioParaFiltrar):
+        """
+        Compila el diccionario para filtrar en un plan de proyeccion: una tupla de pares (key, subplan) donde el
+        subplan es None si se quiere todo el valor de la key u otro plan si se quiere filtrar el valor. Las keys
+        cuyo valor en el diccionario no es ni str ni dict no se incluyen ya que nunca se mantienen.
+
+        :param diccionarioParaFiltrar: diccionario con el que se filtra el tweet
+        :return: el plan de proyeccion o None si el diccionario no es un dict
+        """
+        if type(diccionarioParaFiltrar) is not dict:
+            return None
+        planProyeccion = list()
+        for key, diccionarioParaFiltrarEsteKey in diccionarioParaFiltrar.iteritems():
+            if type(diccionarioParaFiltrarEsteKey) is str:  # Se mantienen todos los valores
+                planProyeccion.append((key, None))
+            elif type(diccionarioParaFiltrarEsteKey) is dict:  # Se filtra el contenido
+                planProyeccion.append((key, self.compilarPlanProyeccion(diccionarioParaFiltrarEsteKey)))
+        return tuple(planProyeccion)
+
+    def proyectarTweetjson(self, planProyeccion, tweetjson):
+        """
+        Construye el tweet filtrado cogiendo del tweet solo las keys del plan de proyeccion. Esta funcion es
+        recursiva para los valores que se tienen que filtrar.
+
+        :param planProyeccion: plan de proyeccion obtenido con compilarPlanProyeccion
+        :param tweetjson: Tweet o parte del tweet otiginal en formato JSON que se quiere filtrar
+        :return: El tweet o parte del tweet en formato JSON filtrado. Si el plan no existe o el tweet no esta en
+            formato dict, devuelve None
+        """
+        if planProyeccion is None or type(tweetjson) is not dict:
+            return None
+
+        tweetjsonFiltrado = dict()
+        for key, subplanProyeccion in planProyeccion:
+            if key in tweetjson:
+                valorjson = tweetjson[key]
+                if subplanProyeccion is None:  # Se mantiene todo el valor
+                    tweetjsonFiltrado[key] = valorjson
+                elif type(valorjson) is list:  # Se filtra cada elemento y se mantienen los que no quedan vacios
+                    listtweetjsonFiltrado = list()
+                    for elementojson in valorjson:
+                        elementojsonFiltrado = self.proyectarTweetjson(subplanProyeccion, elementojson)
+                        if elementojsonFiltrado:
+                            listtweetjsonFiltrado.append(elementojsonFiltrado)
+                    tweetjsonFiltrado[key] = listtweetjsonFiltrado
+                elif type(valorjson) is dict:  # Se filtra y solo se mantiene si no queda vacio
+                    valorjsonFiltrado = self.proyectarTweetjson(subplanProyeccion, valorjson)
+                    if valorjsonFiltrado:
+                        tweetjsonFiltrado[key] = valorjsonFiltrado
+                # Si el valor del JSON es de cualquier otro tipo no se incluye
+        return tweetjsonFiltrado
 
     def filtrarTweetjsonConDiccionarioPorParametro(self, diccionarioParaFiltrar, tweetjson):
         """
@@ -235,6 +350,265 @@ class FiltroTwiter:
             return None
 
 
+class HidratadorTweets(object):
+    """
+    Clase para completar el texto de los tweets truncados pidiendolos a la API en lotes de hasta 100 tweets con
+    statuses/lookup (api.statuses_lookup) en lugar de hacer una peticion por tweet con api.get_status. Asi se hacen
+    muchas menos peticiones y se tarda mas en llegar al limite de peticiones de Twitter.
+
+    Los tweets truncados se guardan como pendientes hasta que hay tamanyoLote o hasta que el mas antiguo lleva
+    latenciaMaxima segundos esperando. Esto se comprueba cada vez que se anyade un tweet o se llama a
+    obtenerListos. Para que el plazo se cumpla aunque no lleguen mas tweets, TwiterListener llama a obtenerListos
+    desde un hilo cuando vence el plazo del mas antiguo (ver obtenerEspera). Al terminar se tiene que llamar a
+    vaciar. Si la peticion falla, los tweets se devuelven con el texto truncado.
+
+    Metodos disponibles:
+        * anyadir: anyade un tweet truncado y devuelve los tweets completados si toca hacer la peticion
+        * obtenerListos: devuelve los tweets completados si el mas antiguo lleva demasiado tiempo esperando
+        * obtenerEspera: devuelve los segundos que faltan para que venza el plazo del tweet mas antiguo
+        * vaciar: completa y devuelve todos los tweets pendientes
+        * hidratar: completa el texto de una lista de tweets con una sola peticion
+        * pedirTweetsExtendidos: pide a statuses/lookup los tweets extendidos de una lista de ids
+    """
+
+    TAMANYO_LOTE = 100  # Maximo numero de tweets que admite statuses/lookup en una peticion
+    LATENCIA_MAXIMA = 2.0  # Segundos maximos que un tweet truncado puede estar esperando
+
+    def __init__(self, api, tamanyoLote=TAMANYO_LOTE, latenciaMaxima=LATENCIA_MAXIMA):
+        """
+        Crea el objeto
+
+        :param api: tweepy.API con el autenticado
+        :param tamanyoLote: numero de tweets truncados que se piden juntos. Como maximo 100
+        :param latenciaMaxima: segundos maximos que un tweet truncado puede estar esperando
+        """
+        self.api = api
+        self.tamanyoLote = min(tamanyoLote, HidratadorTweets.TAMANYO_LOTE)
+        self.latenciaMaxima = latenciaMaxima
+        self.tweetsPendientes = list()  # Lista de (instante en el que llego, tweet)
+        self.cerrojo = threading.Lock()
+        self.numeroPeticiones = 0
+        self.numeroTweetsHidratados = 0
+        self.numeroTweetsNoHidratados = 0
+        # tweepy < 3.6 no admite tweet_mode en statuses_lookup pero si en la llamada interna _statuses_lookup. Se
+        # decide aqui una sola vez cual se utiliza, mirando los parametros de statuses_lookup
+        argumentos = inspect.getargspec(api.statuses_lookup)
+        self.admiteTweetMode = "tweet_mode" in argumentos.args or argumentos.keywords is not None
+
+    def anyadir(self, tweetJson):
+        """
+        Anyade un tweet truncado a los pendientes.
+
+        :param tweetJson: tweet truncado en formato JSON
+        :return: lista con los tweets completados si se ha llegado a tamanyoLote o el mas antiguo lleva demasiado
+            tiempo esperando. Lista vacia en caso contrario
+        """
+        with self.cerrojo:
+            self.tweetsPendientes.append((timeit.default_timer(), tweetJson))
+            lote = self.sacarLote()
+        return self.hidratar(lote)
+
+    def obtenerListos(self):
+        """
+        Devuelve los tweets completados si el mas antiguo lleva demasiado tiempo esperando.
+
+        :return: lista con los tweets completados o lista vacia si todavia no toca hacer la peticion
+        """
+        with self.cerrojo:
+            lote = self.sacarLote()
+        return self.hidratar(lote)
+
+    def obtenerEspera(self):
+        """
+        Devuelve los segundos que faltan para que el tweet pendiente mas antiguo lleve latenciaMaxima esperando.
+
+        :return: segundos que faltan, 0 si ya ha vencido el plazo o latenciaMaxima si no hay tweets pendientes
+        """
+        with self.cerrojo:
+            if not self.tweetsPendientes:
+                return self.latenciaMaxima
+            return max(0.0, self.latenciaMaxima - (timeit.default_timer() - self.tweetsPendientes[0][0]))
+
+    def vaciar(self):
+        """
+        Completa y devuelve todos los tweets pendientes.
+
+        :return: lista con todos los tweets que estaban pendientes
+        """
+        with self.cerrojo:
+            tweetsPendientes = [tweetJson for _, tweetJson in self.tweetsPendientes]
+            self.tweetsPendientes = list()
+        tweetsListos = list()
+        for inicio in range(0, len(tweetsPendientes), self.tamanyoLote):
+            tweetsListos.extend(self.hidratar(tweetsPendientes[inicio:inicio + self.tamanyoLote]))
+        return tweetsListos
+
+    def sacarLote(self):
+        """
+        Saca de los pendientes el siguiente lote si se ha llegado a tamanyoLote o el mas antiguo lleva demasiado
+        tiempo esperando. Se tiene que llamar con el cerrojo cogido.
+
+        :return: lista con los tweets del lote o lista vacia si todavia no toca hacer la peticion
+        """
+        if self.tweetsPendientes and (len(self.tweetsPendientes) >= self.tamanyoLote or
+                                      timeit.default_timer() - self.tweetsPendientes[0][0] >= self.latenciaMaxima):
+            lote = [tweetJson for _, tweetJson in self.tweetsPendientes[:self.tamanyoLote]]
+            self.tweetsPendientes = self.tweetsPendientes[self.tamanyoLote:]
+            return lote
+        return list()
+
+    def hidratar(self, tweets):
+        """
+        Completa el texto de los tweets con una unica peticion a statuses/lookup. Se cambia el campo text por el
+        full_text del tweet extendido.
+
+        :param tweets: lista de tweets truncados en formato JSON
+        :return: la misma lista de tweets con el texto completado si se ha podido
+        """
+        if not tweets:
+            return tweets
+        ids = [tweetJson["id"] for tweetJson in tweets]
+        try:
+            tweetsExtendidos = self.pedirTweetsExtendidos(ids)
+        except tweepy.TweepError:  # No se puede completar el texto, se dejan los tweets truncados
+            with self.cerrojo:
+                self.numeroTweetsNoHidratados += len(tweets)
+            return tweets
+
+        textosCompletos = dict((tweetExtendido._json["id"], tweetExtendido._json["full_text"]) for tweetExtendido in
+                               tweetsExtendidos if "full_text" in tweetExtendido._json)
+        numeroTweetsHidratados = 0
+        for tweetJson in tweets:
+            if tweetJson["id"] in textosCompletos:
+                tweetJson["text"] = textosCompletos[tweetJson["id"]]
+                numeroTweetsHidratados += 1
+        with self.cerrojo:
+            self.numeroPeticiones += 1
+            self.numeroTweetsHidratados += numeroTweetsHidratados
+            self.numeroTweetsNoHidratados += len(tweets) - numeroTweetsHidratados
+        return tweets
+
+    def pedirTweetsExtendidos(self, ids):
+        """
+        Pide a statuses/lookup los tweets extendidos (tweet_mode="extended"), con statuses_lookup o, si la version
+        de tweepy no lo admite (ver admiteTweetMode), con la llamada interna que recibe los ids separados por comas.
+
+        :param ids: lista de ids de tweets, como maximo 100
+        :return: lista de tweepy.Status de los tweets encontrados
+        """
+        if self.admiteTweetMode:
+            return self.api.statuses_lookup(ids, tweet_mode="extended")
+        return self.api._statuses_lookup(",".join(str(id) for id in ids), tweet_mode="extended")
+
+
+class ReproductorTweets(object):
+    """
+    Clase para pasar a un TwiterListener tweets grabados en ficheros en lugar de recibirlos de Twitter. Permite medir
+    el rendimiento del procesado sin conexion y reproducir localmente picos de tweets.
+
+    Los ficheros tienen un tweet en JSON (tal y como lo envia Twitter) por linea y pueden estar en texto plano o
+    comprimidos con gzip (terminados en .gz). Los tweets se pueden pasar tan rapido como se pueda o respetando los
+    tiempos originales segun su created_at.
+
+    Metodos disponibles:
+        * reproducir: pasa todos los tweets de los ficheros al listener y devuelve un informe con las metricas
+        * abrirFichero: abre un fichero de tweets en texto plano o gzip
+        * esperarInstanteOriginal: espera hasta el momento en el que se tiene que pasar un tweet
+    """
+
+    # Pattern para obtener el created_at sin decodificar el JSON. El primero que aparece es el del tweet
+    FECHACREACION_PATTERN = re.compile(r'"created_at":\s*"([^"]+)"')
+
+    def __init__(self, ficheros, ritmoOriginal=False):
+        """
+        Crea el objeto
+
+        :param ficheros: lista de ficheros con los tweets grabados
+        :param ritmoOriginal: True si se quieren pasar los tweets respetando los tiempos de su created_at y False
+            (por defecto) si se quieren pasar tan rapido como se pueda
+        """
+        self.ficheros = ficheros
+        self.ritmoOriginal = ritmoOriginal
+        self.instantePrimerTweet = None
+        self.instanteInicio = None
+
+    def reproducir(self, twiterListener):
+        """
+        Pasa todos los tweets de los ficheros a on_data del listener hasta que se acaban o el listener devuelve False.
+        Despues se detiene el listener y se escriben los tweets pendientes del escritor, aunque se haya lanzado una
+        excepcion, que se vuelve a lanzar despues.
+
+        :param twiterListener: TwiterListener al que se le pasan los tweets
+        :return: diccionario con el numero de lineas leidas, tweets escritos, segundos, tweets por segundo y las
+            metricas del listener (tiempos de decodificado, filtrado y escritura, y descartes)
+        """
+        self.instanteInicio = timeit.default_timer()
+        numeroLineas = 0
+        numeroTweetsInicial = twiterListener.numeroActualTweets
+        continuar = True
+        try:
+            for fichero in self.ficheros:
+                with self.abrirFichero(fichero) as ficheroTweets:
+                    for linea in ficheroTweets:
+                        linea = linea.strip()
+                        if not linea:
+                            continue
+                        if self.ritmoOriginal:
+                            self.esperarInstanteOriginal(linea)
+                        numeroLineas += 1
+                        if twiterListener.on_data(linea) is False:
+                            continuar = False
+                            break
+                if not continuar:
+                    break
+        finally:  # Se procesa lo que quede en la cola y se escribe aunque se haya lanzado una excepcion
+            twiterListener.detener()
+            instanteInicioVaciado = timeit.default_timer()
+            twiterListener.escritorTweets.vaciar()
+            twiterListener.anotarMetricas(segundosEscritura=timeit.default_timer() - instanteInicioVaciado)
+
+        segundos = timeit.default_timer() - self.instanteInicio
+        informe = dict(twiterListener.metricas)
+        informe["lineas"] = numeroLineas
+        informe["tweetsEscritos"] = twiterListener.numeroActualTweets - numeroTweetsInicial
+        informe["segundos"] = segundos
+        informe["lineasPorSegundo"] = numeroLineas / segundos if segundos > 0 else None
+        informe["tweetsEscritosPorSegundo"] = informe["tweetsEscritos"] / segundos if segundos > 0 else None
+        return informe
+
+    def abrirFichero(self, fichero):
+        """
+        Abre un fichero de tweets en texto plano o gzip si termina en .gz.
+
+        :param fichero: ruta del fichero
+        :return: el fichero abierto para leer
+        """
+        if fichero.endswith(".gz"):
+            return gzip.open(fichero, "rb")
+        return io.open(fichero, "rb")
+
+    def esperarInstanteOriginal(self, linea):
+        """
+        Espera hasta que haya pasado, desde el inicio de la reproduccion, el mismo tiempo que paso originalmente
+        entre el primer tweet y este. Las lineas sin created_at (mensajes de control) no esperan.
+
+        :param linea: tweet en JSON sin decodificar
+        """
+        fechaCreacion = ReproductorTweets.FECHACREACION_PATTERN.search(linea)
+        if not fechaCreacion:
+            return
+        try:
+            instanteTweet = calendar.timegm(
+                time.strptime(fechaCreacion.group(1), util.ParseadorTweetsAPandas.FORMATO_FECHA_TWITTER))
+        except ValueError:
+            return
+        if self.instantePrimerTweet is None:
+            self.instantePrimerTweet = instanteTweet
+        segundosAEsperar = (instanteTweet - self.instantePrimerTweet) - (timeit.default_timer() - self.instanteInicio)
+        if segundosAEsperar > 0:
+            time.sleep(segundosAEsperar)
+
+
 class TwiterListener(tweepy.StreamListener):
     """
     Listener de Twitter para escuchar sobre un determinado tema recibiendo tweets en streaming.
@@ -251,12 +625,23 @@ class TwiterListener(tweepy.StreamListener):
 
     Cada objeto tendra un atributo forzarParo que indicara si el programa tiene que parar/terminar por un problema
     que no se puede recuperar
+
+    Si numeroTrabajadores es mayor que 0, on_data solo mete el tweet recibido en una cola acotada de tamanyoCola
+    tweets y son los hilos trabajadores los que lo procesan (decodificar, filtrar, completar el texto y escribir).
+    Si la cola esta llena on_data espera a que haya hueco y se anota en las metricas de la cola
+    (ver obtenerMetricasCola). Antes de leer numeroActualTweets se tiene que llamar a detener para que se procesen
+    los tweets que queden en la cola.
+
+    Si hay hidratadorTweets, un hilo escribe los tweets truncados cuyo plazo de latencia ha vencido aunque no
+    lleguen mas tweets (ver hidratarPeriodicamente). Si falla, la excepcion se relanza en on_data.
     """
 
     LIMITE = -1
+    TAMANYO_COLA = 1000  # Numero maximo de tweets pendientes de procesar cuando se procesan en hilos trabajadores
 
     def __init__(self, escritorTweets, api, filtroTwiter, limite=LIMITE, numeroActualTweets=0,
-                 guardarTweetsEnteros=False):
+                 guardarTweetsEnteros=False, numeroTrabajadores=0, tamanyoCola=TAMANYO_COLA, hidratadorTweets=None,
+                 decodificacionRapida=False, rastreadorTendencias=None):
         """
         Crea el objeto
 
@@ -265,6 +650,15 @@ class TwiterListener(tweepy.StreamListener):
         :param limite: limite de numero de tweets no retweet que se desea. Por defecto es -1
         :param numeroActualTweets: numero actual que se han escrito en disco
         :param guardarTweetsEnteros: guarda los tweets enteros aparte en disco
+        :param numeroTrabajadores: numero de hilos que procesan los tweets. Con 0 (por defecto) se procesan en
+            on_data en el mismo hilo que lee de Twitter
+        :param tamanyoCola: numero maximo de tweets pendientes de procesar por los hilos trabajadores
+        :param hidratadorTweets: HidratadorTweets con el que completar el texto de los tweets truncados en lotes.
+            Si es None se pide el texto completo de cada tweet truncado en el momento con api.get_status
+        :param decodificacionRapida: True si se quieren descartar los retweets y mensajes de control sin decodificar
+            el JSON y decodificar el resto con el decodificador mas rapido instalado (ver esTweetOriginal)
+        :param rastreadorTendencias: util.RastreadorTendencias al que se anyaden los emoticonos, hashtags y menciones
+            de cada tweet no retweet con el texto completo. Si es None no se obtienen tendencias
         """
         self.escritorTweets = escritorTweets
         self.api = api
@@ -273,6 +667,34 @@ class TwiterListener(tweepy.StreamListener):
         self.numeroActualTweets = numeroActualTweets
         self.guardarTweetsEnteros = guardarTweetsEnteros
         self.forzarParo = False
+        self.hidratadorTweets = hidratadorTweets
+        self.decodificacionRapida = decodificacionRapida
+        self.rastreadorTendencias = rastreadorTendencias
+
+        self.cerrojo = threading.Lock()
+        self.colaDatos = None
+        self.trabajadores = list()
+        self.excepcionTrabajador = None  # Excepcion de un trabajador o del hilo de hidratacion que relanza on_data
+        self.metricas = Counter()  # Metricas del procesado (ver anotarMetricas)
+        self.numeroTweetsEscribiendose = 0  # Tweets que algun trabajador esta escribiendo ahora mismo
+        # Metricas de la cola
+        self.numeroDatosEncolados = 0
+        self.numeroEsperasColaLlena = 0
+        self.tiempoEsperaColaLlena = 0.0
+        self.maximoDatosEnCola = 0
+        if numeroTrabajadores > 0:
+            self.colaDatos = Queue.Queue(maxsize=tamanyoCola)
+            for numeroTrabajador in range(numeroTrabajadores):
+                trabajador = threading.Thread(target=self.trabajar, name="trabajador-%d" % numeroTrabajador)
+                trabajador.daemon = True
+                trabajador.start()
+                self.trabajadores.append(trabajador)
+        self.detenerHiloHidratacion = threading.Event()
+        self.hiloHidratacion = None
+        if hidratadorTweets is not None:
+            self.hiloHidratacion = threading.Thread(target=self.hidratarPeriodicamente, name="hidratacion")
+            self.hiloHidratacion.daemon = True
+            self.hiloHidratacion.start()
 
     def on_connect(self):
         """
@@ -282,8 +704,107 @@ class TwiterListener(tweepy.StreamListener):
 
     def on_data(self, dato):
         """
-        Metodo que sera llamado cada vez que se obtenga un tweet.
-        Si el tweet esta truncado, se obtiene el texto completo a traves de la api: api.get_status(datoJson["id"], tweet_mode="extended")
+        Metodo que sera llamado cada vez que se obtenga un tweet. Si hay hilos trabajadores el tweet se mete en la
+        cola para que sea procesado por ellos, en caso contrario se procesa directamente con procesarDato.
+
+        :param dato: Tweet
+        :return: True si se quiere continuar con la escucha y False en caso contrario
+
+        :throws TwiterExcepcion: Si no se puede escribir en disco y no se puede recuperar
+        :throws Exception: Si se produce otro error
+        """
+        if self.excepcionTrabajador is not None:  # Un trabajador ha fallado, se relanza la excepcion aqui
+            excepcion = self.excepcionTrabajador
+            self.excepcionTrabajador = None
+            raise excepcion
+        if self.colaDatos is None:
+            return self.procesarDato(dato)
+
+        if self.forzarParo:
+            return False
+
+        try:
+            self.colaDatos.put_nowait(dato)
+        except Queue.Full:  # La cola esta llena, se espera a que los trabajadores dejen hueco
+            instanteInicio = timeit.default_timer()
+            self.colaDatos.put(dato)
+            self.numeroEsperasColaLlena += 1
+            self.tiempoEsperaColaLlena += timeit.default_timer() - instanteInicio
+        self.numeroDatosEncolados += 1
+        self.maximoDatosEnCola = max(self.maximoDatosEnCola, self.colaDatos.qsize())
+        return True
+
+    def trabajar(self):
+        """
+        Bucle de cada hilo trabajador: saca tweets de la cola y los procesa con procesarDato hasta que saca un None.
+        Si se produce una excepcion se guarda para que on_data la relance.
+        """
+        while True:
+            dato = self.colaDatos.get()
+            try:
+                if dato is None:
+                    return
+                self.procesarDato(dato)
+            except Exception as e:
+                self.excepcionTrabajador = e
+            finally:
+                self.colaDatos.task_done()
+
+    def hidratarPeriodicamente(self):
+        """
+        Bucle del hilo de hidratacion: espera a que venza el plazo del tweet truncado mas antiguo y escribe los tweets
+        que el hidratador tenga listos, hasta que se llama a detener. Asi los tweets truncados no esperan mas de
+        latenciaMaxima (mas lo que tarde la peticion) aunque no lleguen mas tweets. Si se produce una excepcion se
+        guarda para que on_data la relance.
+        """
+        while not self.detenerHiloHidratacion.wait(self.hidratadorTweets.obtenerEspera()):
+            try:
+                for tweetListo in self.hidratadorTweets.obtenerListos():
+                    self.escribirTweetJson(tweetListo)
+            except Exception as e:
+                self.excepcionTrabajador = e
+
+    def detener(self):
+        """
+        Para los hilos trabajadores despues de que hayan procesado todos los tweets que quedan en la cola y el hilo
+        de hidratacion. Despues se escriben los tweets truncados que estaban esperando a que se completase su texto.
+        """
+        for _ in self.trabajadores:
+            self.colaDatos.put(None)
+        for trabajador in self.trabajadores:
+            trabajador.join()
+        self.trabajadores = list()
+        if self.hiloHidratacion is not None:
+            self.detenerHiloHidratacion.set()
+            self.hiloHidratacion.join()
+            self.hiloHidratacion = None
+
+        if self.hidratadorTweets is not None:
+            try:
+                for tweetListo in self.hidratadorTweets.vaciar():
+                    self.escribirTweetJson(tweetListo)
+            except util.TwiterExcepcion:  # Si el error es grave escribirTweetJson ya ha puesto forzarParo
+                pass
+
+    def obtenerMetricasCola(self):
+        """
+        Obtiene las metricas de la cola de tweets pendientes de procesar por los hilos trabajadores.
+
+        :return: diccionario con el numero de tweets encolados, el numero de veces y segundos que on_data ha tenido
+            que esperar por tener la cola llena, el maximo de tweets que ha habido en la cola y los que hay ahora
+        """
+        return {"encolados": self.numeroDatosEncolados,
+                "esperasColaLlena": self.numeroEsperasColaLlena,
+                "segundosEsperaColaLlena": self.tiempoEsperaColaLlena,
+                "maximoEnCola": self.maximoDatosEnCola,
+                "enCola": self.colaDatos.qsize() if self.colaDatos is not None else 0}
+
+    def procesarDato(self, dato):
+        """
+        Procesa un tweet recibido.
+        Si el tweet esta truncado, se obtiene el texto completo a traves de la api: si hay un hidratador de tweets
+        se espera a tener varios truncados para pedirlos juntos y, si no, se pide en el momento con
+        api.get_status(datoJson["id"], tweet_mode="extended").
         Cada 50 tweets se imprime un mensaje por pantalla.
 
         :param dato: Tweet
@@ -293,44 +814,137 @@ class TwiterListener(tweepy.StreamListener):
         :throws Exception: Si se produce otro error
         """
 
+        if self.limite != -1 and self.numeroActualTweets >= self.limite:  # Ya se ha llegado al limite
+            return False
+
         # seTieneQueParar = super(TwiterListener, self).on_data(dato)
-        datoJson = json.loads(dato)  # Se carga el dato en formato JSON
+        instanteInicio = timeit.default_timer()
+        if self.decodificacionRapida:
+            if not self.esTweetOriginal(dato):  # Retweet o mensaje de control, se descarta sin decodificarlo
+                if '"text":' in dato:
+                    self.anotarMetricas(descartadosRetweet=1)
+                else:
+                    self.anotarMetricas(descartadosControl=1)
+                return True
+            datoJson = jsonRapido.loads(dato)
+        else:
+            datoJson = json.loads(dato)  # Se carga el dato en formato JSON
+        self.anotarMetricas(segundosDecodificacion=timeit.default_timer() - instanteInicio)
 
+        tweetsListos = list()  # Tweets que se pueden filtrar y escribir
         if "text" in datoJson:
             if "retweeted_status" not in datoJson:  # Si es un retweet se elimina ya que contiene el mismo texto
 
                 if "truncated" in datoJson and datoJson[
                     "truncated"]:  # Si el texto esta truncado se obtiene el texto completo
-                    tweetExtendido = self.api.get_status(datoJson["id"], tweet_mode="extended")
-                    if tweetExtendido and "full_text" in tweetExtendido._json:
-                        datoJson["text"] = tweetExtendido._json["full_text"]
-
-                datoJsonFiltrado = self.filtroTwiter.filtrarTweetjson(
-                    datoJson)  # Se filtra el tweet y se queda con los datos en los que se este interesado
-
-                if datoJsonFiltrado:  # Se escribe el tweet en disco y se mira si se ha llegado al limite
-
-                    try:
-                        if self.guardarTweetsEnteros:
-                            self.escritorTweets.escribirTweet(datoJson)
-                        self.escritorTweets.escribirTweetFiltrado(datoJsonFiltrado)
-                        self.numeroActualTweets += 1
-
-                        if self.numeroActualTweets % 50 == 0:
-                            print "Se sigue escuchando"
-
-                        if self.limite != -1 and self.numeroActualTweets >= self.limite:
-                            self.forzarParo = True
-                            return False
-
-                    except util.TwiterExcepcion as e:  # Puede ser que no se pueda escribir el tweet o haya otro problema
-                        if e.terminarPrograma:
-                            self.forzarParo = True
-                            raise e
-                    except Exception as e:
-                        raise e
+                    if self.hidratadorTweets is not None:  # Se espera a completar varios a la vez
+                        tweetsListos.extend(self.hidratadorTweets.anyadir(datoJson))
+                    elif self.api is not None:
+                        tweetExtendido = self.api.get_status(datoJson["id"], tweet_mode="extended")
+                        if tweetExtendido and "full_text" in tweetExtendido._json:
+                            datoJson["text"] = tweetExtendido._json["full_text"]
+                        tweetsListos.append(datoJson)
+                    else:  # Sin api (por ejemplo al reproducir tweets grabados) se deja el texto truncado
+                        tweetsListos.append(datoJson)
+                else:
+                    tweetsListos.append(datoJson)
+            else:
+                self.anotarMetricas(descartadosRetweet=1)
+        else:
+            self.anotarMetricas(descartadosControl=1)
+
+        if self.hidratadorTweets is not None:  # Tweets truncados que llevan demasiado tiempo esperando
+            tweetsListos.extend(self.hidratadorTweets.obtenerListos())
+
+        continuar = True
+        for tweetListo in tweetsListos:
+            continuar = self.escribirTweetJson(tweetListo) and continuar
+        return continuar
+
+    def esTweetOriginal(self, dato):
+        """
+        Mira sin decodificar el JSON si el dato recibido es un tweet que no es retweet. Los mensajes de control
+        (delete, limit, warning...) no tienen la key "text" y los retweets tienen la key "retweeted_status". Como
+        las comillas dentro de los textos estan escapadas, estas keys solo pueden aparecer como keys del JSON.
+        Se asume, como hace Twitter, que "retweeted_status" solo aparece en el primer nivel del tweet.
+
+        :param dato: Tweet en formato JSON sin decodificar
+        :return: True si el dato es un tweet que no es retweet y False en caso contrario
+        """
+        return '"text":' in dato and '"retweeted_status":' not in dato
+
+    def escribirTweetJson(self, datoJson):
+        """
+        Filtra un tweet ya decodificado y con el texto completo, lo escribe en disco y mira si se ha llegado al
+        limite. Antes, si hay rastreador de tendencias, se anyaden a el los emoticonos, hashtags y menciones.
+
+        :param datoJson: Tweet en formato JSON
+        :return: True si se quiere continuar con la escucha y False en caso contrario
+
+        :throws TwiterExcepcion: Si no se puede escribir en disco y no se puede recuperar
+        :throws Exception: Si se produce otro error
+        """
+        if self.rastreadorTendencias is not None:
+            instanteInicio = timeit.default_timer()
+            self.rastreadorTendencias.anyadirTweet(datoJson)
+            self.anotarMetricas(segundosTendencias=timeit.default_timer() - instanteInicio)
+
+        instanteInicio = timeit.default_timer()
+        datoJsonFiltrado = self.filtroTwiter.filtrarTweetjson(
+            datoJson)  # Se filtra el tweet y se queda con los datos en los que se este interesado
+        self.anotarMetricas(segundosFiltrado=timeit.default_timer() - instanteInicio)
+
+        if datoJsonFiltrado:  # Se escribe el tweet en disco y se mira si se ha llegado al limite
+
+            with self.cerrojo:  # Se reserva el hueco para que varios trabajadores no se pasen del limite
+                if self.limite != -1 and self.numeroActualTweets + self.numeroTweetsEscribiendose >= self.limite:
+                    return False
+                self.numeroTweetsEscribiendose += 1
+            tweetEscrito = False
+            try:
+                instanteInicio = timeit.default_timer()
+                try:
+                    if self.guardarTweetsEnteros:
+                        self.escritorTweets.escribirTweet(datoJson)
+                    self.escritorTweets.escribirTweetFiltrado(datoJsonFiltrado)
+                    tweetEscrito = True
+                finally:
+                    self.anotarMetricas(segundosEscritura=timeit.default_timer() - instanteInicio)
+                    with self.cerrojo:
+                        self.numeroTweetsEscribiendose -= 1
+                        if tweetEscrito:
+                            self.numeroActualTweets += 1
+                        numeroActualTweets = self.numeroActualTweets
+
+                if numeroActualTweets % 50 == 0:
+                    print "Se sigue escuchando"
+
+                if self.limite != -1 and numeroActualTweets >= self.limite:
+                    self.forzarParo = True
+                    return False
+
+            except util.TwiterExcepcion as e:  # Puede ser que no se pueda escribir el tweet o haya otro problema
+                self.anotarMetricas(descartadosErrorEscritura=1)
+                if e.terminarPrograma:
+                    self.forzarParo = True
+                    raise e
+            except Exception as e:
+                raise e
+        else:
+            self.anotarMetricas(descartadosFiltro=1)
         return True
 
+    def anotarMetricas(self, **metricas):
+        """
+        Suma los valores a las metricas del procesado (segundos decodificando, filtrando y escribiendo, y numero de
+        tweets descartados por ser mensajes de control, retweets, quedar vacios al filtrar o no poder escribirse).
+        Se puede llamar desde varios hilos a la vez.
+
+        :param metricas: nombre de la metrica y valor a sumar
+        """
+        with self.cerrojo:
+            self.metricas.update(metricas)
+
     def on_error(self, status):
         print(status)
 
@@ -353,7 +967,7 @@ if __name__ == '__main__':
     """
     Si se llama a este programa, se parsea los parametros.
     
-    Despues se crean los objetos que manejaran la escritura de tweets en disco (en esta ocasion en Mongodb) y el filtro
+    Despues se crean los objetos que manejaran la escritura de tweets en disco (en Mongodb o en ficheros) y el filtro
     para las keys de los tweets. Por ultimo se crea la conexion con la API y se empieza a escuchar.  
     """
 
@@ -376,46 +990,124 @@ if __name__ == '__main__':
                         help="Limite de tweets que se escuchan y almacenan")
     parser.add_argument("-tt", "--temastweets", default=["madrid"], nargs='+',
                         help="Lista de temas en los que se esta interesado")
+    parser.add_argument("-tl", "--tamanyolote", default=util.MongodbEscritorTweets.TAMANYO_LOTE, type=int,
+                        help="Numero de tweets que se escriben juntos en Mongodb")
+    parser.add_argument("-iv", "--intervalovaciado", default=util.MongodbEscritorTweets.INTERVALO_VACIADO,
+                        type=float, help="Segundos maximos que un tweet puede estar pendiente de ser escrito")
+    parser.add_argument("-nt", "--numerotrabajadores", default=0, type=int,
+                        help="Numero de hilos que procesan los tweets")
+    parser.add_argument("-tc", "--tamanyocola", default=TwiterListener.TAMANYO_COLA, type=int,
+                        help="Numero maximo de tweets pendientes de ser procesados por los hilos")
+    parser.add_argument("-dr", "--decodificacionrapida", default=False, action='store_true',
+                        help="Descarta retweets y mensajes de control sin decodificar y utiliza ujson")
+    parser.add_argument("-rp", "--reproducir", nargs='+',
+                        help="Ficheros con tweets grabados que se procesan en lugar de escuchar a Twitter")
+    parser.add_argument("-ro", "--ritmooriginal", default=False, action='store_true',
+                        help="Reproduce los tweets grabados respetando los tiempos originales")
+    parser.add_argument("-lh", "--latenciahidratacion", default=HidratadorTweets.LATENCIA_MAXIMA, type=float,
+                        help="Segundos maximos que un tweet truncado espera a que se pida su texto completo")
+    parser.add_argument("-ft", "--ficherotendencias",
+                        help="Fichero JSON donde se guardan los emoticonos, hashtags y menciones mas frecuentes")
+    parser.add_argument("-de", "--directorioescritura",
+                        help="Directorio donde se escriben los tweets en ficheros en lugar de en Mongodb")
+    parser.add_argument("-ds", "--directoriospool",
+                        help="Directorio donde se guardan los tweets mientras Mongodb no responde")
+    parser.add_argument("-mbs", "--megabytesspool",
+                        default=util.MongodbEscritorTweets.BYTES_MAXIMOS_SPOOL // (1024 * 1024), type=int,
+                        help="Megabytes maximos que puede ocupar el spool")
+    parser.add_argument("-tss", "--segundosseleccionservidor", type=float,
+                        help="Segundos que se espera a Mongodb antes de dar una escritura por fallida")
 
     args = parser.parse_args()
 
-    # Se autentica usando los parametros pasado por parametro
-    auth = tweepy.OAuthHandler(args.consumerkey, args.consumersecret)
-    auth.set_access_token(args.token, args.secret)
-    api = tweepy.API(auth)
-
-    # Se crea el manejador de Mongodb con el que se obtendra la base de datos y las colecciones.
-    # Tambien se crea es escritor de los tweets en Mongodb y el filtro de las keys de los tweets
-    manejadorMongodb = util.ManejadorMongodb(mongodbHost=args.mongodbhost, mongodbPuerto=args.mongodbpuerto,
-                                             usuario=args.mongodbuser, password=args.mongodbcontrasenya)
-    mongodbEscritorTweets = util.MongodbEscritorTweets(manejadorMongodb,
-                                                       vaciarAnterioresColecciones=args.borraranteriorestweets)
+    # Se autentica usando los parametros pasado por parametro. Si se reproducen tweets grabados no se necesita
+    api = None
+    if not args.reproducir:
+        auth = tweepy.OAuthHandler(args.consumerkey, args.consumersecret)
+        auth.set_access_token(args.token, args.secret)
+        api = tweepy.API(auth)
+
+    # Se crea el escritor de los tweets en ficheros o en Mongodb. Para Mongodb se crea antes el manejador con el que se
+    # obtendra la base de datos y las colecciones. Tambien se crea el filtro de las keys de los tweets
+    if args.directorioescritura:
+        escritorTweets = util.FicheroEscritorTweets(args.directorioescritura,
+                                                    vaciarAnterioresColecciones=args.borraranteriorestweets)
+    else:
+        manejadorMongodb = util.ManejadorMongodb(mongodbHost=args.mongodbhost, mongodbPuerto=args.mongodbpuerto,
+                                                 usuario=args.mongodbuser, password=args.mongodbcontrasenya,
+                                                 segundosSeleccionServidor=args.segundosseleccionservidor)
+        escritorTweets = util.MongodbEscritorTweets(manejadorMongodb,
+                                                    vaciarAnterioresColecciones=args.borraranteriorestweets,
+                                                    tamanyoLote=args.tamanyolote,
+                                                    intervaloVaciado=args.intervalovaciado,
+                                                    directorioSpool=args.directoriospool,
+                                                    bytesMaximosSpool=args.megabytesspool * 1024 * 1024)
     filtroTwiter = FiltroTwiter(DICT_KEYS_TWEERS)
+    hidratadorTweets = HidratadorTweets(api, latenciaMaxima=args.latenciahidratacion) if api else None
+    rastreadorTendencias = None
+    if args.ficherotendencias:  # Se continua desde las tendencias guardadas si el fichero ya existe
+        rastreadorTendencias = util.RastreadorTendencias()
+        if os.path.exists(args.ficherotendencias):
+            rastreadorTendencias.cargarInstantanea(args.ficherotendencias)
+
+    if args.reproducir:  # Se procesan los tweets grabados y se muestra el informe con el rendimiento
+        twiterListener = TwiterListener(escritorTweets, api, filtroTwiter, limite=args.limitetweets,
+                                        guardarTweetsEnteros=args.guardartweetsenteros,
+                                        numeroTrabajadores=args.numerotrabajadores, tamanyoCola=args.tamanyocola,
+                                        decodificacionRapida=args.decodificacionrapida,
+                                        rastreadorTendencias=rastreadorTendencias)
+        try:
+            informe = ReproductorTweets(args.reproducir, ritmoOriginal=args.ritmooriginal).reproducir(twiterListener)
+            print json.dumps(informe, indent=4, sort_keys=True)
+        except KeyboardInterrupt:  # Se ha detenido por el usuario, reproducir ya ha procesado lo que quede en la cola
+            pass
+        except util.TwiterExcepcion as e:  # Se ha lanzado una excepcion del programa, se para y se escribe lo que quede
+            print e.mensaje
 
     numeroActualTweets = 0
-    para = False
+    para = bool(args.reproducir)  # Si se han reproducido tweets grabados no se escucha a Twitter
     # Puede ser que el listener lance alguna excepcion, por lo que se tiene que manejar.
     # Mientras que o bien no se tenga limite o no se haya alcanzado y no se tenga que parar, escucha.
     while (args.limitetweets < 0 or numeroActualTweets < args.limitetweets) and not para:
+        twiterListener = TwiterListener(escritorTweets, api, filtroTwiter, limite=args.limitetweets,
+                                        numeroActualTweets=numeroActualTweets,
+                                        guardarTweetsEnteros=args.guardartweetsenteros,
+                                        numeroTrabajadores=args.numerotrabajadores, tamanyoCola=args.tamanyocola,
+                                        hidratadorTweets=hidratadorTweets,
+                                        decodificacionRapida=args.decodificacionrapida,
+                                        rastreadorTendencias=rastreadorTendencias)
         try:
-            twiterListener = TwiterListener(mongodbEscritorTweets, api, filtroTwiter, limite=args.limitetweets,
-                                            numeroActualTweets=numeroActualTweets,
-                                            guardarTweetsEnteros=args.guardartweetsenteros)
             stream = tweepy.Stream(auth, twiterListener)
             stream.filter(track=args.temastweets)
-
-            numeroActualTweets = twiterListener.numeroActualTweets
-            para = twiterListener.forzarParo
         except httplib.IncompleteRead:  # Hay un problema con la conexion por lo que lanza de nuevo el listener
-            numeroActualTweets = twiterListener.numeroActualTweets
+            pass
         except KeyboardInterrupt:  # Se ha detenido por el usuario, por lo que se tiene que salir
             stream.disconnect()
-            numeroActualTweets = twiterListener.numeroActualTweets
-            para = True
+            twiterListener.forzarParo = True
         except util.TwiterExcepcion as e:  # Se ha lanzado una excepcion del programa por lo que mira si se tiene que parar o no
-            numeroActualTweets = twiterListener.numeroActualTweets
-            para = twiterListener.forzarParo
+            pass
         except Exception as e:  # Se ha lanzado una excepcion general, por lo que mira si se tiene que parar o no
             print e.message
-            numeroActualTweets = twiterListener.numeroActualTweets
-            para = twiterListener.forzarParo
+
+        # Se procesan los tweets que queden en la cola antes de obtener el numero de tweets
+        twiterListener.detener()
+        if args.numerotrabajadores > 0:
+            print "Metricas de la cola: %s" % twiterListener.obtenerMetricasCola()
+        numeroActualTweets = twiterListener.numeroActualTweets
+        para = twiterListener.forzarParo
+
+    # Se escriben los tweets que hayan quedado pendientes si se escribe por lotes
+    if isinstance(escritorTweets, util.MongodbEscritorTweets):
+        escritorTweets.detenerVaciado()
+    try:
+        escritorTweets.vaciar()
+    except util.TwiterExcepcion as e:
+        print e.mensaje
+    print "Tweets escritos: %d. Tweets duplicados: %d" % (escritorTweets.numeroTweetsEscritos,
+                                                          escritorTweets.numeroTweetsDuplicados)
+    if isinstance(escritorTweets, util.MongodbEscritorTweets) and escritorTweets.spool is not None:
+        escritorTweets.detenerDrenado()  # Lo que quede en el spool se cargara la siguiente vez
+        print "Metricas del spool: %s" % escritorTweets.obtenerMetricasSpool()
+
+    if rastreadorTendencias is not None:
+        rastreadorTendencias.guardarInstantanea(args.ficherotendencias)
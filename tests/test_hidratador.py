@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import unittest
+
+import tweepy
+
+from lector_tweets import HidratadorTweets, TwiterListener
+
+__author__ = "Enrique Rodriguez Moron"
+__doc__ = """
+Pruebas de HidratadorTweets y del hilo de hidratacion de TwiterListener con una API falsa que implementa
+statuses_lookup, por lo que no se hace ninguna peticion a Twitter.
+"""
+
+
+class EstadoFalso(object):
+    """
+    Imita un tweepy.Status: solo tiene el JSON del tweet extendido
+    """
+
+    def __init__(self, tweetJson):
+        self._json = tweetJson
+
+
+class ApiFalsa(object):
+    """
+    Imita tweepy.API.statuses_lookup devolviendo el full_text de los ids pedidos menos los de idsNoEncontrados.
+    Guarda los ids de cada peticion. Si fallar es True lanza tweepy.TweepError.
+    """
+
+    def __init__(self, idsNoEncontrados=(), fallar=False):
+        self.idsNoEncontrados = set(idsNoEncontrados)
+        self.fallar = fallar
+        self.peticiones = list()
+        self.cerrojo = threading.Lock()
+
+    def statuses_lookup(self, ids, tweet_mode=None):
+        with self.cerrojo:
+            self.peticiones.append(list(ids))
+        if self.fallar:
+            raise tweepy.TweepError("Rate limit exceeded")
+        return [EstadoFalso({"id": id, "full_text": "texto completo %d" % id})
+                for id in ids if id not in self.idsNoEncontrados]
+
+
+class ApiFalsaAntigua(ApiFalsa):
+    """
+    Imita la API de tweepy < 3.6: statuses_lookup no admite tweet_mode, pero la llamada interna _statuses_lookup,
+    que recibe los ids separados por comas, si
+    """
+
+    def statuses_lookup(self, ids):
+        raise AssertionError("statuses_lookup no admite tweet_mode")
+
+    def _statuses_lookup(self, ids, tweet_mode=None):
+        return ApiFalsa.statuses_lookup(self, [int(id) for id in ids.split(",")], tweet_mode)
+
+
+class FiltroFalso(object):
+    """
+    Filtro que deja el tweet tal cual
+    """
+
+    def filtrarTweetjson(self, tweetJson):
+        return tweetJson
+
+
+class EscritorFalso(object):
+    """
+    Escritor que guarda en memoria los tweets filtrados
+    """
+
+    def __init__(self):
+        self.tweetsFiltrados = list()
+
+    def escribirTweet(self, tweetJson):
+        pass
+
+    def escribirTweetFiltrado(self, tweetJson):
+        self.tweetsFiltrados.append(tweetJson)
+
+    def vaciar(self):
+        pass
+
+
+def crearTweetTruncado(id):
+    return {"id": id, "text": "texto truncado %d" % id, "truncated": True}
+
+
+class HidratadorTweetsTest(unittest.TestCase):
+
+    def testLotesDeHasta100(self):
+        api = ApiFalsa()
+        hidratador = HidratadorTweets(api, tamanyoLote=500, latenciaMaxima=60)
+        self.assertEqual(hidratador.tamanyoLote, 100)
+
+        listos = list()
+        for id in range(250):
+            listos.extend(hidratador.anyadir(crearTweetTruncado(id)))
+        self.assertEqual([len(ids) for ids in api.peticiones], [100, 100])
+        self.assertEqual(len(listos), 200)
+
+        listos.extend(hidratador.vaciar())
+        self.assertEqual([len(ids) for ids in api.peticiones], [100, 100, 50])
+        self.assertEqual(sorted(tweetJson["id"] for tweetJson in listos), list(range(250)))
+        self.assertEqual(hidratador.numeroPeticiones, 3)
+
+    def testCambiaTextPorFullText(self):
+        api = ApiFalsa(idsNoEncontrados=[2])
+        hidratador = HidratadorTweets(api, tamanyoLote=3, latenciaMaxima=60)
+        hidratador.anyadir(crearTweetTruncado(1))
+        hidratador.anyadir(crearTweetTruncado(2))
+        listos = hidratador.anyadir(crearTweetTruncado(3))
+
+        textos = dict((tweetJson["id"], tweetJson["text"]) for tweetJson in listos)
+        self.assertEqual(textos, {1: "texto completo 1", 2: "texto truncado 2", 3: "texto completo 3"})
+        self.assertEqual(hidratador.numeroTweetsHidratados, 2)
+        self.assertEqual(hidratador.numeroTweetsNoHidratados, 1)
+
+    def testPlazoVencido(self):
+        api = ApiFalsa()
+        hidratador = HidratadorTweets(api, tamanyoLote=100, latenciaMaxima=0.05)
+        self.assertEqual(hidratador.anyadir(crearTweetTruncado(1)), [])
+        self.assertEqual(hidratador.obtenerListos(), [])
+        self.assertGreater(hidratador.obtenerEspera(), 0)
+
+        time.sleep(0.06)
+        self.assertEqual(hidratador.obtenerEspera(), 0)
+        listos = hidratador.obtenerListos()
+        self.assertEqual([tweetJson["text"] for tweetJson in listos], ["texto completo 1"])
+        self.assertEqual(hidratador.obtenerEspera(), hidratador.latenciaMaxima)
+
+    def testTweepyAntiguo(self):
+        api = ApiFalsaAntigua()
+        hidratador = HidratadorTweets(api, tamanyoLote=2, latenciaMaxima=60)
+        self.assertFalse(hidratador.admiteTweetMode)
+        hidratador.anyadir(crearTweetTruncado(1))
+        listos = hidratador.anyadir(crearTweetTruncado(2))
+        self.assertEqual([tweetJson["text"] for tweetJson in listos], ["texto completo 1", "texto completo 2"])
+        self.assertEqual(api.peticiones, [[1, 2]])
+
+    def testFalloDejaTextoTruncado(self):
+        api = ApiFalsa(fallar=True)
+        hidratador = HidratadorTweets(api, tamanyoLote=2, latenciaMaxima=60)
+        hidratador.anyadir(crearTweetTruncado(1))
+        listos = hidratador.anyadir(crearTweetTruncado(2))
+
+        self.assertEqual([tweetJson["text"] for tweetJson in listos], ["texto truncado 1", "texto truncado 2"])
+        self.assertEqual(hidratador.numeroPeticiones, 0)
+        self.assertEqual(hidratador.numeroTweetsHidratados, 0)
+        self.assertEqual(hidratador.numeroTweetsNoHidratados, 2)
+
+
+class TwiterListenerHidratacionTest(unittest.TestCase):
+
+    def crearListener(self, api, latenciaMaxima, numeroTrabajadores=0):
+        escritorTweets = EscritorFalso()
+        hidratadorTweets = HidratadorTweets(api, latenciaMaxima=latenciaMaxima)
+        twiterListener = TwiterListener(escritorTweets, api, FiltroFalso(), hidratadorTweets=hidratadorTweets,
+                                        numeroTrabajadores=numeroTrabajadores)
+        self.addCleanup(twiterListener.detener)
+        return twiterListener, escritorTweets
+
+    def esperarTweets(self, escritorTweets, numeroTweets, segundos):
+        instanteLimite = time.time() + segundos
+        while len(escritorTweets.tweetsFiltrados) < numeroTweets and time.time() < instanteLimite:
+            time.sleep(0.01)
+
+    def comprobarEscritoSinMasTweets(self, numeroTrabajadores):
+        api = ApiFalsa()
+        twiterListener, escritorTweets = self.crearListener(api, 0.1, numeroTrabajadores)
+        twiterListener.on_data('{"id": 7, "text": "texto truncado 7", "truncated": true}')
+        self.assertEqual(escritorTweets.tweetsFiltrados, [])
+
+        # No llegan mas tweets: el hilo de hidratacion lo tiene que escribir al vencer el plazo
+        self.esperarTweets(escritorTweets, 1, 2)
+        self.assertEqual([tweetJson["text"] for tweetJson in escritorTweets.tweetsFiltrados], ["texto completo 7"])
+        self.assertEqual(api.peticiones, [[7]])
+
+    def testHiloEscribeAlVencerPlazo(self):
+        self.comprobarEscritoSinMasTweets(numeroTrabajadores=0)
+
+    def testHiloEscribeAlVencerPlazoConTrabajadores(self):
+        self.comprobarEscritoSinMasTweets(numeroTrabajadores=2)
+
+    def testHiloEscribeTruncadoSiFalla(self):
+        api = ApiFalsa(fallar=True)
+        twiterListener, escritorTweets = self.crearListener(api, 0.05)
+        twiterListener.on_data('{"id": 8, "text": "texto truncado 8", "truncated": true}')
+        self.esperarTweets(escritorTweets, 1, 2)
+        self.assertEqual([tweetJson["text"] for tweetJson in escritorTweets.tweetsFiltrados], ["texto truncado 8"])
+
+    def testDetenerEscribeLosPendientes(self):
+        api = ApiFalsa()
+        twiterListener, escritorTweets = self.crearListener(api, 60)
+        twiterListener.on_data('{"id": 9, "text": "texto truncado 9", "truncated": true}')
+        twiterListener.detener()
+        self.assertIsNone(twiterListener.hiloHidratacion)
+        self.assertEqual([tweetJson["text"] for tweetJson in escritorTweets.tweetsFiltrados], ["texto completo 9"])
+
+
+if __name__ == "__main__":
+    unittest.main()
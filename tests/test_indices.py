@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import datetime
+import os
+import unittest
+
+from util import ManejadorMongodb, MongodbParseadorTweetsAPandas
+
+__author__ = "Enrique Rodriguez Moron"
+__doc__ = """
+Pruebas de que las consultas de los filtros de MongodbParseadorTweetsAPandas.crearFiltro utilizan los indices de
+ManejadorMongodb.INDICES_TWEETFILTRADO, comprobadas con explain (ManejadorMongodb.obtenerIndicesConsulta).
+Necesitan un servidor de Mongodb, por defecto en localhost:27017 (se puede cambiar con las variables de entorno
+MONGODB_HOST y MONGODB_PUERTO). Si no responde, las pruebas se saltan. Se utiliza la base de datos BASEDATOS,
+que se borra al terminar.
+"""
+
+BASEDATOS = "pruebastweets"
+NUMERO_TWEETS = 500
+
+
+class IndicesConsultaTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.manejadorMongodb = ManejadorMongodb(os.environ.get("MONGODB_HOST", "localhost"),
+                                                int(os.environ.get("MONGODB_PUERTO", 27017)),
+                                                basedatosNombreTweets=BASEDATOS, segundosSeleccionServidor=1)
+        if not cls.manejadorMongodb.estaConectado():
+            raise unittest.SkipTest("No hay ningun servidor de Mongodb")
+
+        cls.manejadorMongodb.mongoCliente.drop_database(BASEDATOS)
+        fechaInicial = datetime.datetime(2018, 10, 4)
+        lenguajes = ["es", "en", "pt", "fr"]
+        hashtags = ["MadridCentral", "Madrid", "Trafico", "Contaminacion", "Bicicleta"]
+        tweets = [{"_id": id,
+                   ManejadorMongodb.CAMPO_FECHA: fechaInicial + datetime.timedelta(minutes=10 * id),
+                   "lang": lenguajes[id % len(lenguajes)],
+                   "entities": {"hashtags": [{"text": hashtags[id % len(hashtags)]},
+                                             {"text": hashtags[id * 7 % len(hashtags)]}]},
+                   "user": {"id": id % 50},
+                   "text": u"tweet %d" % id}
+                  for id in range(NUMERO_TWEETS)]
+        cls.manejadorMongodb.obtenerColeccionTweetsFiltrados().insert_many(tweets)
+        cls.manejadorMongodb.asegurarIndices()
+        cls.parseador = MongodbParseadorTweetsAPandas(cls.manejadorMongodb)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.manejadorMongodb.mongoCliente.drop_database(BASEDATOS)
+
+    def comprobarIndice(self, filtro, indice):
+        indices = self.manejadorMongodb.obtenerIndicesConsulta(filtro)
+        self.assertNotEqual(indices, [], "La consulta %s recorre toda la coleccion" % filtro)
+        self.assertIn(indice, indices)
+
+    def testFecha(self):
+        filtro = self.parseador.crearFiltro(fechaInicio=datetime.datetime(2018, 10, 5),
+                                            fechaFin=datetime.datetime(2018, 10, 6))
+        self.comprobarIndice(filtro, "fecha_1")
+
+    def testFechaSoloInicio(self):
+        self.comprobarIndice(self.parseador.crearFiltro(fechaInicio=datetime.datetime(2018, 10, 7)), "fecha_1")
+
+    def testLenguaje(self):
+        self.comprobarIndice(self.parseador.crearFiltro(lenguajes="pt"), "lang_1")
+        self.comprobarIndice(self.parseador.crearFiltro(lenguajes=["es", "en"]), "lang_1")
+
+    def testHashtag(self):
+        self.comprobarIndice(self.parseador.crearFiltro(hashtags="#MadridCentral"), "entities.hashtags.text_1")
+        self.comprobarIndice(self.parseador.crearFiltro(hashtags=["Madrid", "#Trafico"]), "entities.hashtags.text_1")
+
+    def testFiltroCompuesto(self):
+        filtro = self.parseador.crearFiltro(fechaInicio=datetime.datetime(2018, 10, 5),
+                                            fechaFin=datetime.datetime(2018, 10, 6), lenguajes="pt",
+                                            hashtags="#MadridCentral")
+        indices = self.manejadorMongodb.obtenerIndicesConsulta(filtro)
+        self.assertTrue(indices)
+        self.assertTrue(set(indices) <= {"fecha_1", "lang_1", "entities.hashtags.text_1"}, indices)
+
+    def testSinFiltroRecorreLaColeccion(self):
+        self.assertEqual(self.manejadorMongodb.obtenerIndicesConsulta({}), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
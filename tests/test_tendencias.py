@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+import random
+import unittest
+from collections import Counter
+
+from util import ContadorSpaceSaving, ParseadorTweetsAPandas, RastreadorTendencias
+
+__author__ = "Enrique Rodriguez Moron"
+__doc__ = """
+Pruebas de las garantias de ContadorSpaceSaving y RastreadorTendencias comparando con el recuento exacto de
+secuencias sinteticas, siendo N el numero de elementos anyadidos:
+    * Ningun elemento guardado tiene menos apariciones que las reales.
+    * Ningun elemento guardado tiene mas de N / capacidad apariciones de mas.
+    * Todos los elementos con mas de N / capacidad apariciones reales estan guardados.
+    * Lo anterior se sigue cumpliendo al fusionar contadores, con N la suma de los anyadidos.
+"""
+
+
+def generarZipf(numeroElementos, numeroDistintos, semilla, exponente=1.1):
+    """
+    Genera una secuencia de elementos cuya frecuencia sigue una ley de Zipf, como los hashtags de los tweets
+
+    :param numeroElementos: longitud de la secuencia
+    :param numeroDistintos: numero de elementos distintos
+    :param semilla: semilla del generador aleatorio
+    :param exponente: exponente de la ley de Zipf
+    :return: lista de elementos
+    """
+    aleatorio = random.Random(semilla)
+    pesos = [1.0 / (rango ** exponente) for rango in range(1, numeroDistintos + 1)]
+    elementos = ["e%d" % rango for rango in range(numeroDistintos)]
+    acumulados = list()
+    total = 0.0
+    for peso in pesos:
+        total += peso
+        acumulados.append(total)
+    secuencia = list()
+    for _ in range(numeroElementos):
+        valor = aleatorio.random() * total
+        inferior, superior = 0, len(acumulados) - 1
+        while inferior < superior:  # Busqueda binaria del elemento con ese peso acumulado
+            medio = (inferior + superior) // 2
+            if acumulados[medio] < valor:
+                inferior = medio + 1
+            else:
+                superior = medio
+        secuencia.append(elementos[inferior])
+    return secuencia
+
+
+def generarCreciente(numeroDistintos):
+    """
+    Genera una secuencia en la que el elemento i aparece i veces seguidas, de menos a mas frecuente. Es el peor
+    caso para Space-Saving porque los elementos frecuentes llegan cuando el contador ya esta lleno.
+
+    :param numeroDistintos: numero de elementos distintos
+    :return: lista de elementos
+    """
+    return ["e%d" % elemento for elemento in range(1, numeroDistintos + 1) for _ in range(elemento)]
+
+
+def comprobarGarantias(prueba, contador, reales):
+    """
+    Comprueba las garantias del contador frente al recuento exacto
+
+    :param prueba: unittest.TestCase con el que se comprueba
+    :param contador: ContadorSpaceSaving
+    :param reales: Counter con las apariciones reales
+    """
+    numeroAnyadidos = sum(reales.values())
+    prueba.assertEqual(contador.numeroAnyadidos, numeroAnyadidos)
+    prueba.assertLessEqual(len(contador.contadores), contador.capacidad)
+    cotaError = float(numeroAnyadidos) / contador.capacidad
+    prueba.assertLessEqual(contador.obtenerCotaError(), cotaError)
+
+    for elemento, apariciones in contador.masComunes():
+        error = contador.obtenerError(elemento)
+        prueba.assertGreaterEqual(apariciones, reales[elemento], elemento)  # No se cuenta de menos
+        prueba.assertLessEqual(apariciones - error, reales[elemento], elemento)
+        prueba.assertLessEqual(apariciones - reales[elemento], cotaError, elemento)
+        prueba.assertLessEqual(error, contador.obtenerCotaError(), elemento)
+
+    for elemento, apariciones in reales.items():
+        if apariciones > cotaError:  # Los elementos frecuentes estan guardados
+            prueba.assertIn(elemento, contador.contadores)
+        elif elemento not in contador.contadores:  # Y los que no estan caben en la cota
+            prueba.assertLessEqual(apariciones, contador.obtenerError(elemento))
+
+
+class ContadorSpaceSavingTest(unittest.TestCase):
+
+    def crearContador(self, secuencia, capacidad):
+        contador = ContadorSpaceSaving(capacidad)
+        for elemento in secuencia:
+            contador.anyadir(elemento)
+        return contador
+
+    def testSinDesbordar(self):
+        secuencia = generarZipf(2000, 30, semilla=1)
+        contador = self.crearContador(secuencia, 50)
+        self.assertEqual(contador.masComunes(), Counter(secuencia).most_common())
+        self.assertEqual(contador.obtenerCotaError(), 0)
+
+    def testZipf(self):
+        for capacidad in (10, 50, 200):
+            for semilla in range(3):
+                secuencia = generarZipf(20000, 2000, semilla)
+                comprobarGarantias(self, self.crearContador(secuencia, capacidad), Counter(secuencia))
+
+    def testCreciente(self):
+        for secuencia in (generarCreciente(150), list(reversed(generarCreciente(150)))):
+            comprobarGarantias(self, self.crearContador(secuencia, 20), Counter(secuencia))
+
+    def testCantidad(self):
+        aleatorio = random.Random(3)
+        contador = ContadorSpaceSaving(15)
+        reales = Counter()
+        for elemento in generarZipf(3000, 300, semilla=4):
+            cantidad = aleatorio.randint(1, 5)
+            contador.anyadir(elemento, cantidad)
+            reales[elemento] += cantidad
+        comprobarGarantias(self, contador, reales)
+
+    def testFusionar(self):
+        for capacidad in (10, 50):
+            for numeroPartes in (2, 5):
+                secuencia = generarZipf(20000, 1000, semilla=capacidad + numeroPartes)
+                # Cada parte tiene una distribucion distinta para que los contadores no coincidan
+                partes = [sorted(secuencia[parte::numeroPartes], key=lambda elemento, parte=parte:
+                                 int(elemento[1:]) * (parte + 1) % 7) for parte in range(numeroPartes)]
+                contadores = [self.crearContador(parte, capacidad) for parte in partes]
+                for contador, parte in zip(contadores, partes):
+                    comprobarGarantias(self, contador, Counter(parte))
+
+                fusionado = ContadorSpaceSaving(capacidad).fusionar(contadores)
+                comprobarGarantias(self, fusionado, Counter(secuencia))
+
+    def testFusionarCreciente(self):
+        contadores = [self.crearContador(generarCreciente(100), 10),
+                      self.crearContador(list(reversed(generarCreciente(60))), 10),
+                      self.crearContador(generarZipf(3000, 100, semilla=5), 10)]
+        reales = Counter(generarCreciente(100)) + Counter(generarCreciente(60)) + Counter(
+            generarZipf(3000, 100, semilla=5))
+        comprobarGarantias(self, ContadorSpaceSaving(10).fusionar(contadores), reales)
+
+    def testRestaurar(self):
+        secuencia = generarZipf(5000, 500, semilla=6)
+        contador = self.crearContador(secuencia, 30)
+        restaurado = ContadorSpaceSaving()
+        restaurado.restaurar(contador.instantanea())
+        self.assertEqual(restaurado.masComunes(), contador.masComunes())
+        restaurado.anyadir("nuevo")
+        comprobarGarantias(self, restaurado, Counter(secuencia + ["nuevo"]))
+
+
+class RastreadorTendenciasTest(unittest.TestCase):
+
+    HASHTAGS = ParseadorTweetsAPandas.NOMBRE_COLUMNA_HASHTAGS
+    MENCIONES = ParseadorTweetsAPandas.NOMBRE_COLUMNA_MENCIONES
+
+    def reproducir(self, capacidad, segundosCubo, ventanas, semilla):
+        """
+        Pasa al rastreador tweets sinteticos, algunos desordenados, y guarda el recuento exacto de cada cubo
+
+        :return: tupla (rastreador, {tipo: {inicio del cubo: Counter}})
+        """
+        aleatorio = random.Random(semilla)
+        hashtags = generarZipf(6000, 400, semilla)
+        menciones = generarZipf(6000, 300, semilla + 100)
+        rastreador = RastreadorTendencias(capacidad=capacidad, ventanas=ventanas, segundosCubo=segundosCubo)
+        reales = {self.HASHTAGS: dict(), self.MENCIONES: dict()}
+        instante = 1538733600.0
+        for hashtag, mencion in zip(hashtags, menciones):
+            instante += aleatorio.expovariate(2.0)
+            instanteTweet = instante - aleatorio.random() * segundosCubo if aleatorio.random() < 0.1 else instante
+            rastreador.anyadirTweet({"text": u"texto #%s y @%s" % (hashtag, mencion),
+                                     "timestamp_ms": "%d" % (instanteTweet * 1000)})
+            inicioCubo = int(instanteTweet // segundosCubo) * segundosCubo
+            reales[self.HASHTAGS].setdefault(inicioCubo, Counter())[u"#" + hashtag] += 1
+            reales[self.MENCIONES].setdefault(inicioCubo, Counter())[u"@" + mencion] += 1
+        return rastreador, reales
+
+    def testVentanas(self):
+        for capacidad, segundosCubo, ventanas in ((20, 60, (300, 900)), (50, 30, (120, 600))):
+            rastreador, reales = self.reproducir(capacidad, segundosCubo, ventanas, semilla=capacidad)
+            inicioUltimoCubo = max(reales[self.HASHTAGS])
+            for tipo in (self.HASHTAGS, self.MENCIONES):
+                for ventana in ventanas:
+                    realesVentana = Counter()
+                    for inicioCubo, realesCubo in reales[tipo].items():
+                        if inicioCubo > inicioUltimoCubo - ventana:
+                            realesVentana.update(realesCubo)
+                    contador = rastreador.obtenerContadorVentana(tipo, ventana)
+                    comprobarGarantias(self, contador, realesVentana)
+
+                    cotaError = float(sum(realesVentana.values())) / capacidad
+                    tendencias = dict(rastreador.obtenerTendencias(tipo, ventana, top=None))
+                    for elemento, apariciones in realesVentana.items():
+                        if apariciones > cotaError:
+                            self.assertIn(elemento, tendencias)
+                            self.assertGreaterEqual(tendencias[elemento], apariciones)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,10 +2,42 @@
 
 import pymongo
 import pandas as pd
+import numpy as np
 import dateutil.parser
+import dateutil.tz
+import datetime
 import re
 import string
-from collections import Counter
+import sys
+import bisect
+import threading
+import timeit
+import time
+import heapq
+import json
+import os
+import multiprocessing
+import mmap
+import struct
+import gzip
+import zlib
+import bson
+from bson import json_util
+from collections import defaultdict, deque, OrderedDict, Counter
+from itertools import chain, islice
+
+# pyarrow solo se necesita para la cache en Parquet de los tweets en pandas (ver ParseadorTweetsAPandas.guardarCache)
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+
+# zstandard solo se necesita para comprimir con zstd los segmentos de FicheroEscritorTweets. Si no esta se usa gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 __author__ = "Tatan Rufino"
 __doc__ = """
@@ -17,19 +49,43 @@ Clases:
     * UtilidadPatternTexto: Contiene la funcionalidad para parsear el texto. Entre las funcionalidades se puede
         encontrar: reemplazar emoticonos por texto, reemplazar menciones/hashtags/url en textos, contar
         numero de palabras, obtener todos los menciones/hashtags/urls de un texto...
+    * CacheCaracteristicasTexto: Cache LRU acotada de las caracteristicas del texto para no volver a calcularlas en
+        los textos repetidos.
     * ManejadorMongodb: Permite conectarse a Mongodb y obtener la base de datos y coleccions para almacenar los
         tweets.
     * EscritorTweets: Interfaz/clase que tendria que tener todas las clases que quieran escribir tweets en disco. 
-        Actualmente se utiliza Mongodb pero podria crearse otra clase para escribir los tweest en un fichero
-        heredando de esta clase.
+        Esta implementado para escribir en Mongodb y en ficheros locales.
     * MongodbEscritorTweets: Hereda EscritorTweets y permite escribir los tweets en Mongodb.
+    * FicheroEscritorTweets: Hereda EscritorTweets y permite escribir los tweets en segmentos NDJSON comprimidos en
+        un directorio local, sin Mongodb.
     * ParseadorTweetsAPandas: Interfaz/clase que tendria que tener todas las clases que quieran leer tweest desde
-        el disco. Actualmente, como pasa con EscritorTweets, solo esta implementado para leer desde Mongodb.
+        el disco. Esta implementado para leer desde Mongodb y desde un fichero .bson de mongodump.
     * MongodbParseadorTweetsAPandas: Hereda ParseadorTweetsAPandas y permite leer los tweets desde Mongodb y pasarlos
         a pandas.
+    * BsonParseadorTweetsAPandas: Hereda ParseadorTweetsAPandas y permite leer los tweets desde un fichero .bson de
+        mongodump y pasarlos a pandas, sin Mongodb.
     * AnalisisUtilidad: Utilidades para el analisis de los tweets una vez que se han almacenados. Se puede obtener 
         los elmentos totales en una serie pandas en los que cada elemento es una fila, asi como el numero de apariciones
         de elementos.
+    * AcumuladorAnalisis: Hace el mismo analisis que AnalisisUtilidad sobre los tweets leidos por trozos, sin tenerlos
+        todos en memoria.
+    * MongodbAnalisisUtilidad: Hace el mismo analisis que AnalisisUtilidad con agregaciones en Mongodb, sin leer los
+        tweets en pandas.
+    * ContadorSpaceSaving: Contador aproximado de los elementos mas frecuentes con memoria acotada.
+    * RastreadorTendencias: Obtiene los emoticonos, hashtags y menciones mas frecuentes en ventanas de tiempo
+        mientras se escuchan los tweets.
+
+Funciones:
+    * obtenerCaracterUnicode: Obtiene el caracter de un codepoint, tambien fuera del plano basico en las builds
+        estrechas de Python 2.
+    * obtenerCodepoint: Obtiene el codepoint de un caracter o de un par surrogado.
+    * construirClaseRangosUnicode: Construye el contenido de una clase de regex con rangos de codepoints.
+    * construirRegexRangosUnicode: Construye una regex que coincide con un caracter de rangos de codepoints.
+    * parsearFechaTwitter: Parsea la fecha de creacion (created_at) de un tweet en un datetime en UTC.
+    * parsearFechaConDateutil: Parsea con dateutil una fecha que no sigue el formato de Twitter.
+    * reemplazarFichero: Renombra un fichero sustituyendo el destino si ya existe, tambien en Windows.
+    * parsearRangoTweetsEnPandas: Lee, parsea y enriquece un rango de tweets en un proceso trabajador al leer los
+        tweets en paralelo.
 
 Testeado y versiones de librerias:
     * python 2.7.14
@@ -37,6 +93,8 @@ Testeado y versiones de librerias:
     * pymongo 3.6.0
     * pandas 0.21.0
     * python-dateutil 2.6.1
+    * pyarrow (opcional, solo para la cache de los tweets en pandas)
+    * zstandard (opcional, solo para comprimir con zstd los segmentos de FicheroEscritorTweets)
 """
 
 
@@ -51,6 +109,18 @@ class TwiterExcepcion(Exception):
                                              "esta levantada e intentelo de nuevo."
     # Mensaje tipo que avisa que el id esta duplicado en mondobd
     EXCEPTION_MENSAJE_ENTRADA_DUPLICADA_MONGODB = "El tweet ya esta almacenado."
+    # Mensaje tipo que avisa que no esta instalado pyarrow para utilizar la cache
+    EXCEPTION_MENSAJE_SIN_PYARROW = "Para utilizar la cache de los tweets se necesita pyarrow (pip install pyarrow)."
+    # Mensaje tipo que avisa que no existe un fichero
+    EXCEPTION_MENSAJE_NO_EXISTE_FICHERO = "No existe el fichero %s."
+    # Mensaje tipo que avisa que un fichero .bson no se puede leer
+    EXCEPTION_MENSAJE_FICHERO_BSON_CORRUPTO = "El fichero %s no es un fichero .bson valido o esta incompleto."
+    # Mensaje tipo que avisa que no esta instalado zstandard para comprimir con zstd
+    EXCEPTION_MENSAJE_SIN_ZSTANDARD = "Para comprimir con zstd se necesita zstandard (pip install zstandard)."
+    # Mensaje tipo que avisa que no se puede escribir en un directorio
+    EXCEPTION_MENSAJE_NO_ESCRITO_FICHERO = "No se puede escribir en el directorio %s."
+    # Mensaje tipo que avisa que el spool de tweets esta lleno
+    EXCEPTION_MENSAJE_SPOOL_LLENO = "El spool esta lleno, se descarta el tweet hasta que se pueda cargar en Mongodb."
 
     def __init__(self, mensaje, errores=None, terminarPrograma=False):
         """
@@ -66,6 +136,138 @@ class TwiterExcepcion(Exception):
         self.terminarPrograma = terminarPrograma
 
 
+# Primer codepoint de fuera del plano basico y primeros surrogados alto y bajo de los pares surrogados
+INICIO_PLANOS_ASTRALES = 0x10000
+INICIO_SURROGADOS_ALTOS = 0xD800
+INICIO_SURROGADOS_BAJOS = 0xDC00
+
+
+def obtenerCaracterUnicode(codepoint):
+    """
+    Obtiene el caracter unicode de un codepoint. En las builds estrechas de Python 2 (sys.maxunicode == 0xFFFF) los
+    codepoints de fuera del plano basico se obtienen como un par surrogado, es decir, como dos caracteres.
+
+    :param codepoint: codepoint del caracter
+    :return: caracter unicode
+    """
+    return (u"\\U%08x" % codepoint).encode("ascii").decode("unicode_escape")
+
+
+def obtenerCodepoint(caracter):
+    """
+    Obtiene el codepoint de un caracter unicode o de un par surrogado de una build estrecha.
+
+    :param caracter: caracter unicode o par surrogado
+    :return: codepoint del caracter
+    """
+    if len(caracter) == 2:
+        return INICIO_PLANOS_ASTRALES + ((ord(caracter[0]) - INICIO_SURROGADOS_ALTOS) << 10) + \
+               (ord(caracter[1]) - INICIO_SURROGADOS_BAJOS)
+    return ord(caracter)
+
+
+def construirClaseRangosUnicode(rangos):
+    """
+    Construye el contenido de una clase de regex ([...]) con los rangos de codepoints. En las builds estrechas un
+    caracter de fuera del plano basico son dos caracteres, asi que sus rangos se sustituyen por los de sus surrogados
+    altos: la clase coincide con el primer caracter del par. Los rangos no pueden tener caracteres ASCII, ya que no se
+    escapan.
+
+    :param rangos: lista de tuplas (inicio, fin) de codepoints, ambos incluidos
+    :return: contenido de la clase de regex
+    """
+    clase = list()
+    for inicio, fin in rangos:
+        if sys.maxunicode < fin:
+            if inicio < INICIO_PLANOS_ASTRALES:
+                clase.append(obtenerCaracterUnicode(inicio) + u"-" + obtenerCaracterUnicode(INICIO_PLANOS_ASTRALES - 1))
+                inicio = INICIO_PLANOS_ASTRALES
+            inicio = INICIO_SURROGADOS_ALTOS + ((inicio - INICIO_PLANOS_ASTRALES) >> 10)
+            fin = INICIO_SURROGADOS_ALTOS + ((fin - INICIO_PLANOS_ASTRALES) >> 10)
+        clase.append(obtenerCaracterUnicode(inicio) if inicio == fin else
+                     obtenerCaracterUnicode(inicio) + u"-" + obtenerCaracterUnicode(fin))
+    return u"".join(clase)
+
+
+def construirRegexRangosUnicode(rangos):
+    """
+    Construye una regex que coincide con un caracter de los rangos de codepoints. En las builds anchas y en Python 3
+    es una clase de regex; en las builds estrechas los caracteres de fuera del plano basico se buscan como pares
+    surrogados con una alternativa por cada surrogado alto.
+
+    :param rangos: lista de tuplas (inicio, fin) de codepoints, ambos incluidos
+    :return: regex sin grupos que captura, a la que se le puede anyadir un cuantificador
+    """
+    rangosBasicos = list()
+    pares = list()
+    for inicio, fin in rangos:
+        if fin <= sys.maxunicode:
+            rangosBasicos.append((inicio, fin))
+            continue
+        if inicio < INICIO_PLANOS_ASTRALES:
+            rangosBasicos.append((inicio, INICIO_PLANOS_ASTRALES - 1))
+            inicio = INICIO_PLANOS_ASTRALES
+        altoInicio, bajoInicio = divmod(inicio - INICIO_PLANOS_ASTRALES, 0x400)
+        altoFin, bajoFin = divmod(fin - INICIO_PLANOS_ASTRALES, 0x400)
+        for alto in range(altoInicio, altoFin + 1):
+            pares.append((alto, bajoInicio if alto == altoInicio else 0, bajoFin if alto == altoFin else 0x3FF))
+    alternativas = [u"[" + construirClaseRangosUnicode(rangosBasicos) + u"]"] if rangosBasicos else []
+    alternativas += [obtenerCaracterUnicode(INICIO_SURROGADOS_ALTOS + alto) + u"[" + construirClaseRangosUnicode(
+        [(INICIO_SURROGADOS_BAJOS + bajoInicio, INICIO_SURROGADOS_BAJOS + bajoFin)]) + u"]"
+                     for alto, bajoInicio, bajoFin in pares]
+    return alternativas[0] if not pares else u"(?:" + u"|".join(alternativas) + u")"
+
+
+def parsearFechaTwitter(fecha):
+    """
+    Parsea la fecha de creacion (created_at) de un tweet con el formato fijo de Twitter (ver
+    ParseadorTweetsAPandas.FORMATO_FECHA_TWITTER). Las fechas que no siguen el formato se parsean con dateutil.
+
+    :param fecha: fecha en formato texto
+    :return: la fecha en UTC y sin zona horaria o None si no se puede parsear
+    """
+    try:
+        return datetime.datetime.strptime(fecha, ParseadorTweetsAPandas.FORMATO_FECHA_TWITTER)
+    except (ValueError, TypeError):
+        return parsearFechaConDateutil(fecha)
+
+
+def parsearFechaConDateutil(fecha):
+    """
+    Parsea una fecha con dateutil. Se utiliza solo para las fechas que no siguen el formato de Twitter.
+
+    :param fecha: fecha en formato texto
+    :return: la fecha en UTC y sin zona horaria o None si no se puede parsear
+    """
+    if not fecha:
+        return None
+    try:
+        fechaParseada = dateutil.parser.parse(fecha)
+    except (ValueError, OverflowError, TypeError):
+        return None
+    if fechaParseada.tzinfo is not None:  # Se pasa a UTC para que coincida con las fechas de Twitter
+        fechaParseada = fechaParseada.astimezone(dateutil.tz.tzutc()).replace(tzinfo=None)
+    return fechaParseada
+
+
+def reemplazarFichero(origen, destino):
+    """
+    Renombra un fichero sustituyendo el destino si ya existe. Se utiliza para cambiar un fichero temporal ya escrito
+    por el definitivo. os.rename no sustituye el destino en Windows, por lo que se utiliza os.replace (Python 3.3+),
+    que es atomico en todos los sistemas. Sin os.replace (Python 2) en Windows se borra antes el destino, por lo que
+    durante un momento no existe ninguno de los dos; en el resto de sistemas os.rename ya lo sustituye atomicamente.
+
+    :param origen: ruta del fichero a renombrar
+    :param destino: ruta final del fichero
+    """
+    if hasattr(os, "replace"):
+        os.replace(origen, destino)
+        return
+    if os.name == "nt" and os.path.exists(destino):
+        os.remove(destino)
+    os.rename(origen, destino)
+
+
 class UtilidadPatternTexto(object):
     """
     Clase para tratar el texto. Para ello se utilizan pattern/regex.
@@ -75,6 +277,7 @@ class UtilidadPatternTexto(object):
         * reemplazarMencionesHashtagsUrls: reemplaza todas las menciones, hashtags y urls en el texto
         * reemplazarSignospuntuacion: reemplaza todos los signos de puntacion dados por string.punctuation en el texto
         * obtenerEmoticonosEnTexto: se obtiene en una lista todos los emoticonos en el texto
+        * esEmoticono: se comprueba si un caracter es de un emoticono buscando su codepoint en los rangos de emoticonos
         * obtenerMencionesEnTexto: se obtiene en una lista todas las menciones en el texto
         * obtenerHashtagsEnTexto: se obtiene en una lista todos los hashtags en el texto
         * obtenerUrlsEnTexto: se obtiene en una lista todas las urls en el texto
@@ -82,29 +285,52 @@ class UtilidadPatternTexto(object):
             se sustituyen todos los signos de puntuacion por espacios
         * contarNumeroPalabras: se cuentan el numero de palabras, esto es, caracteres seguidos y separados
             por espacio.
+        * obtenerCaracteristicasTexto: se obtienen de una vez el numero de caracteres y palabras, los emoticonos,
+            los hashtags y las menciones del texto. Si hay cache, se buscan antes en ella
+        * calcularCaracteristicasTexto: se calculan las caracteristicas del texto sin utilizar la cache
+        * obtenerTokensDeTipo: se obtiene en una lista todos los tokens de un tipo en el texto
+        * tokenizar: se recorre el texto una sola vez y se obtiene la lista de tokens con su tipo (emoticono,
+            mencion, hashtag, url, palabra, signo de puntuacion o espacio)
     """
 
-    # Pattern para emoticonos. Son en formato unicode
-    EMOTICONOS_PATTERN = re.compile(
-        u"(\ud83d[\ude00-\ude4f])|"  # emoticonos
-        u"(\ud83d[\u0000-\uddff])|"  # simbolos y pictogramas (2 de 2)
-        u"(\ud83d[\ude80-\udeff])|"  # trasporte y mapas
-        u"(\uD83E[\uDD00-\uDDFF])|"
-        u"(\ud83c[\udf00-\uffff])|"  # simbolos & pictogramas (1 de 2)
-        u"(\ud83c[\udde0-\uddff])|"  # flags (iOS)
-        u"([\u2934\u2935]\uFE0F?)|"
-        u"([\u3030\u303D]\uFE0F?)|"
-        u"([\u3297\u3299]\uFE0F?)|"
-        u"([\u203C\u2049]\uFE0F?)|"
-        u"([\u00A9\u00AE]\uFE0F?)|"
-        u"([\u2122\u2139]\uFE0F?)|"
-        u"(\uD83C\uDC04\uFE0F?)|"
-        u"(\uD83C\uDCCF\uFE0F?)|"
-        u"([\u0023\u002A\u0030-\u0039]\uFE0F?\u20E3)|"
-        u"(\u24C2\uFE0F?|[\u2B05-\u2B07\u2B1B\u2B1C\u2B50\u2B55]\uFE0F?)|"
-        u"([\u2600-\u26FF]\uFE0F?)|"
-        u"([\u2700-\u27BF]\uFE0F?)"
-        "+", flags=re.UNICODE)
+    # Rangos de codepoints de los emoticonos, ordenados y sin solaparse. Son los caracteres pictograficos de Unicode
+    # (Extended_Pictographic de emoji-data.txt) agrupados en rangos, mas todos los simbolos varios y dingbats
+    # (U+2600-U+27BF) y los modificadores de tono de piel, que tambien se cuentan como emoticono si van solos
+    RANGOS_EMOTICONOS = [
+        (0x00A9, 0x00A9), (0x00AE, 0x00AE), (0x203C, 0x203C), (0x2049, 0x2049), (0x2122, 0x2122), (0x2139, 0x2139),
+        (0x2194, 0x2199), (0x21A9, 0x21AA), (0x231A, 0x231B), (0x2328, 0x2328), (0x2388, 0x2388), (0x23CF, 0x23CF),
+        (0x23E9, 0x23F3), (0x23F8, 0x23FA), (0x24C2, 0x24C2), (0x25AA, 0x25AB), (0x25B6, 0x25B6), (0x25C0, 0x25C0),
+        (0x25FB, 0x25FE), (0x2600, 0x27BF), (0x2934, 0x2935), (0x2B05, 0x2B07), (0x2B1B, 0x2B1C), (0x2B50, 0x2B50),
+        (0x2B55, 0x2B55), (0x3030, 0x3030), (0x303D, 0x303D), (0x3297, 0x3297), (0x3299, 0x3299),
+        (0x1F000, 0x1F0FF), (0x1F10D, 0x1F10F), (0x1F12F, 0x1F12F), (0x1F16C, 0x1F171), (0x1F17E, 0x1F17F),
+        (0x1F18E, 0x1F18E), (0x1F191, 0x1F19A), (0x1F1AD, 0x1F1E5), (0x1F201, 0x1F20F), (0x1F21A, 0x1F21A),
+        (0x1F22F, 0x1F22F), (0x1F232, 0x1F23A), (0x1F23C, 0x1F23F), (0x1F249, 0x1F3FA), (0x1F3FB, 0x1F3FF),
+        (0x1F400, 0x1F53D), (0x1F546, 0x1F64F), (0x1F680, 0x1F6FF), (0x1F774, 0x1F77F), (0x1F7D5, 0x1F7FF),
+        (0x1F80C, 0x1F80F), (0x1F848, 0x1F84F), (0x1F85A, 0x1F85F), (0x1F888, 0x1F88F), (0x1F8AE, 0x1F8FF),
+        (0x1F90C, 0x1F93A), (0x1F93C, 0x1F945), (0x1F947, 0x1FAFF), (0x1FC00, 0x1FFFD)]
+    INICIOS_RANGOS_EMOTICONOS = [inicio for inicio, _ in RANGOS_EMOTICONOS]  # Para buscar con bisect
+    RANGO_MODIFICADORES = (0x1F3FB, 0x1F3FF)  # Modificadores de tono de piel
+    RANGO_INDICADORES_REGIONALES = (0x1F1E6, 0x1F1FF)  # Dos indicadores regionales seguidos forman una bandera
+    RANGO_ETIQUETAS = (0xE0020, 0xE007E)  # Etiquetas de las banderas de subdivisiones (Inglaterra, Escocia...)
+    FIN_ETIQUETAS = 0xE007F
+
+    # Regex para emoticonos, construida a partir de los rangos. Un emoticono es uno de:
+    #   1. Un keycap: "#", "*" o un digito, el selector de variacion opcional y U+20E3
+    #   2. Una bandera: dos indicadores regionales
+    #   3. Una secuencia de elementos unidos por ZWJ (U+200D). Cada elemento es un caracter de los rangos seguido
+    #       opcionalmente de un modificador de tono de piel, un selector de variacion y etiquetas
+    #   4. Un indicador regional suelto
+    INDICADOR_REGIONAL_REGEX = construirRegexRangosUnicode([RANGO_INDICADORES_REGIONALES])
+    ELEMENTO_EMOTICONO_REGEX = \
+        construirRegexRangosUnicode(RANGOS_EMOTICONOS) + \
+        construirRegexRangosUnicode([RANGO_MODIFICADORES]) + u"?[\uFE0E\uFE0F]?" + \
+        u"(?:" + construirRegexRangosUnicode([RANGO_ETIQUETAS]) + u"+" + obtenerCaracterUnicode(FIN_ETIQUETAS) + u")?"
+    EMOTICONOS_REGEX = \
+        u"(?:[#*0-9]\uFE0F?\u20E3|" + \
+        INDICADOR_REGIONAL_REGEX + INDICADOR_REGIONAL_REGEX + u"|" + \
+        ELEMENTO_EMOTICONO_REGEX + u"(?:\u200D" + ELEMENTO_EMOTICONO_REGEX + u")*|" + \
+        INDICADOR_REGIONAL_REGEX + u")"
+    EMOTICONOS_PATTERN = re.compile(EMOTICONOS_REGEX, flags=re.UNICODE)  # Pattern para emoticonos
 
     MENCIONES_REGEX = r"(?:@[\w_]+)"  # Regex para menciones
     HASHTAGS_REGEX = r"(?:\#+[\w_]+[\w\'_\-]*[\w_]+)"  # Regex para hashtags
@@ -116,16 +342,109 @@ class UtilidadPatternTexto(object):
     MENCIONES_HASHTAGS_URLS_PATTERN = re.compile(  # Pattern para menciones, hashtags y urls
         r"(" + MENCIONES_REGEX + "|" + HASHTAGS_REGEX + "|" + URLS_REGEX + ")", re.VERBOSE | re.IGNORECASE)
     SIGNOSPUNTUACION_PATTERN = re.compile('[%s]' % re.escape(string.punctuation))  # Pattern para signos de puntuacion
+    MENCIONES_O_HASHTAGS_PATTERN = re.compile(  # Pattern para menciones (grupo 1) o hashtags (grupo 2)
+        r"(" + MENCIONES_REGEX + ")|(" + HASHTAGS_REGEX + ")", re.VERBOSE | re.IGNORECASE)
+    MENCIONES_HASHTAGS_URLS_SIGNOSPUNTUACION_PATTERN = re.compile(  # Pattern para menciones, hashtags, urls y signos
+        r"(?:" + MENCIONES_REGEX + "|" + HASHTAGS_REGEX + "|" + URLS_REGEX + ")|[" + re.escape(string.punctuation) + "]",
+        re.VERBOSE | re.IGNORECASE)
+
+    # Tipos de token que devuelve tokenizar
+    TOKEN_EMOTICONO = "emoticono"
+    TOKEN_MENCION = "mencion"
+    TOKEN_HASHTAG = "hashtag"
+    TOKEN_URL = "url"
+    TOKEN_PALABRA = "palabra"
+    TOKEN_SIGNOPUNTUACION = "signopuntuacion"
+    TOKEN_ESPACIO = "espacio"
+
+    # Digito de una mencion, hashtag, url o palabra del tokenizador: no puede ser el de un keycap, que es un
+    # emoticono. El resultado es el mismo que si se quitan antes los emoticonos, como en limpiarTexto
+    TOKEN_DIGITO_REGEX = u"[0-9](?!\uFE0F?\u20E3)"
+    # Letra de las menciones y hashtags del tokenizador. TOKENS_PATTERN usa re.UNICODE para los espacios y las
+    # palabras, pero en Python 2 MENCIONES_PATTERN y HASHTAGS_PATTERN no, asi que su \w solo incluye letras ASCII y
+    # la mencion o el hashtag se corta en la primera letra acentuada. Se pone la misma clase para que el resultado no
+    # cambie (ver el parametro letrasUnicode de __init__). Con re.UNICODE, \w incluye algunos emoticonos (U+2139 y
+    # los numeros en circulo U+2776-U+2793), que se excluyen porque limpiarTexto los quita antes
+    TOKEN_LETRA_UNICODE_REGEX = u"(?:(?![0-9]\uFE0F?\u20E3)[^\\W\u2139\u2776-\u2793])"
+    TOKEN_LETRA_REGEX = TOKEN_LETRA_UNICODE_REGEX if sys.version_info[0] >= 3 else \
+        u"(?:[A-Za-z_]|" + TOKEN_DIGITO_REGEX + u")"
+    TOKEN_MENCIONES_REGEX = u"(?:@" + TOKEN_LETRA_REGEX + u"+)"  # MENCIONES_REGEX con esa letra
+    TOKEN_HASHTAGS_REGEX = u"(?:\\#+" + TOKEN_LETRA_REGEX + u"+(?:" + TOKEN_LETRA_REGEX + u"|['\\-])*" + \
+                           TOKEN_LETRA_REGEX + u"+)"  # HASHTAGS_REGEX con esa letra
+    # Regex para urls sin re.IGNORECASE: con re.IGNORECASE los rangos de emoticonos tambien se comparan sin
+    # mayusculas/minusculas y dejan de coincidir con EMOTICONOS_REGEX. Los digitos no van en [$-_] para que pasen
+    # por TOKEN_DIGITO_REGEX
+    TOKEN_URLS_REGEX = r"[hH][tT][tT][pP][sS]?://(?:[a-zA-Z]|" + TOKEN_DIGITO_REGEX + \
+                       r"|[$-/:-_@.&amp;+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
+    # Caracteres con los que puede empezar un emoticono. Una palabra no los incluye para que el emoticono sea otro
+    # token. Fuera del plano basico se excluye todo el bloque U+1F000-U+1FFFF: regex comprueba uno a uno los rangos
+    # de fuera del plano basico y con un solo rango cada caracter de palabra se comprueba el doble de rapido. Un
+    # caracter del bloque que no sea de un emoticono acaba en GRUPO_CARACTER y se une a la palabra
+    INICIOS_EMOTICONOS = construirClaseRangosUnicode(
+        [rango for rango in RANGOS_EMOTICONOS if rango[1] < INICIO_PLANOS_ASTRALES] + [(0x1F000, 0x1FFFF)])
+    # Grupo para un caracter suelto que no encaja en ningun otro tipo (por ejemplo, en una build estrecha, un
+    # surrogado alto que no forma un emoticono). tokenizar lo une a la palabra que tenga al lado
+    GRUPO_CARACTER = "caracter"
+    # Pattern con un grupo con nombre por cada tipo de token. Los espacios y las palabras, que son la mayoria de los
+    # tokens, van primero para no probar antes todas las alternativas de emoticonos. Una palabra no puede empezar
+    # ningun otro token, asi que el orden no cambia el resultado
+    TOKENS_PATTERN = re.compile(
+        u"(?P<" + TOKEN_ESPACIO + u">\\s+)|"
+        u"(?P<" + TOKEN_PALABRA + u">(?:[^\\s" + re.escape(string.punctuation) + u"hH0-9" + INICIOS_EMOTICONOS +
+        u"]|[hH](?![tT][tT][pP][sS]?://)|" + TOKEN_DIGITO_REGEX + u")+)|"
+        u"(?P<" + TOKEN_EMOTICONO + u">" + EMOTICONOS_REGEX + u")|"
+        u"(?P<" + TOKEN_URL + u">" + TOKEN_URLS_REGEX + u")|"
+        u"(?P<" + TOKEN_MENCION + u">" + TOKEN_MENCIONES_REGEX + u")|"
+        u"(?P<" + TOKEN_HASHTAG + u">" + TOKEN_HASHTAGS_REGEX + u")|"
+        u"(?P<" + TOKEN_SIGNOPUNTUACION + u">[" + re.escape(string.punctuation) + u"])|"
+        u"(?P<" + GRUPO_CARACTER + u">.)", flags=re.UNICODE)
+
+    def __init__(self, cacheCaracteristicasTexto=None, letrasUnicode=False, mencionesEnUrls=True):
+        """
+        Crea el objeto para tratar el texto. Por defecto los resultados son los de los pattern de siempre; los dos
+        ultimos parametros cambian ese comportamiento.
+
+        :param cacheCaracteristicasTexto: CacheCaracteristicasTexto donde guardar las caracteristicas de los textos
+            (ver obtenerCaracteristicasTexto). Se puede compartir entre varios objetos con los mismos parametros. Si
+            es None (por defecto) no se utiliza cache
+        :param letrasUnicode: si es True, las menciones y hashtags se buscan con re.UNICODE, por lo que en Python 2
+            incluyen letras acentuadas igual que en Python 3. Por defecto (False) en Python 2 se cortan en la primera
+            letra acentuada. No cambia nada en Python 3
+        :param mencionesEnUrls: si es False, las menciones dentro de una url forman parte de la url y no se devuelven
+            en obtenerMencionesEnTexto ni en obtenerCaracteristicasTexto. Por defecto (True) se devuelven
+        """
+        self.cacheCaracteristicasTexto = cacheCaracteristicasTexto
+        self.letrasUnicode = letrasUnicode
+        self.mencionesEnUrls = mencionesEnUrls
+        if letrasUnicode:
+            flags = re.VERBOSE | re.IGNORECASE | re.UNICODE
+            self.mencionesPattern = re.compile(UtilidadPatternTexto.MENCIONES_REGEX, flags)
+            self.hashtagsPattern = re.compile(UtilidadPatternTexto.HASHTAGS_REGEX, flags)
+            self.mencionesHashtagsUrlsPattern = re.compile(
+                UtilidadPatternTexto.MENCIONES_HASHTAGS_URLS_PATTERN.pattern, flags)
+            self.mencionesOHashtagsPattern = re.compile(
+                UtilidadPatternTexto.MENCIONES_O_HASHTAGS_PATTERN.pattern, flags)
+            # La letra del tokenizador pasa a ser \w, que con re.UNICODE incluye las letras acentuadas
+            self.tokensPattern = re.compile(UtilidadPatternTexto.TOKENS_PATTERN.pattern.replace(
+                UtilidadPatternTexto.TOKEN_LETRA_REGEX, UtilidadPatternTexto.TOKEN_LETRA_UNICODE_REGEX),
+                flags=re.UNICODE)
+        else:
+            self.mencionesPattern = UtilidadPatternTexto.MENCIONES_PATTERN
+            self.hashtagsPattern = UtilidadPatternTexto.HASHTAGS_PATTERN
+            self.mencionesHashtagsUrlsPattern = UtilidadPatternTexto.MENCIONES_HASHTAGS_URLS_PATTERN
+            self.mencionesOHashtagsPattern = UtilidadPatternTexto.MENCIONES_O_HASHTAGS_PATTERN
+            self.tokensPattern = UtilidadPatternTexto.TOKENS_PATTERN
 
     def reemplazarEmoticonos(self, texto, caracter=""):
         """
-        Reemplaza todos los emoticonos por los caracteres que se pasen por parametro.
+        Reemplaza todos los emoticonos por los caracteres que se pasen por parametro. Como en
+        obtenerEmoticonosEnTexto, se buscan directamente con EMOTICONOS_PATTERN.
 
         :param texto: Texto a ser parseado
         :param caracter: Caracter sustituto de cada emoticono
         :return: El texto con los emoticonos reemplazados
         """
-        return UtilidadPatternTexto.EMOTICONOS_PATTERN.sub(r"" + caracter, texto) if texto else None
+        return UtilidadPatternTexto.EMOTICONOS_PATTERN.sub(caracter, texto) if texto else None
 
     def reemplazarMencionesHashtagsUrls(self, texto, caracter=""):
         """
@@ -135,7 +454,7 @@ class UtilidadPatternTexto(object):
         :param caracter: Caracter sustituto de cada mencion, hashtag y url
         :return: El texto con las enciones, hashtags y urls reemplazados
         """
-        return UtilidadPatternTexto.MENCIONES_HASHTAGS_URLS_PATTERN.sub(r"" + caracter, texto) if texto else None
+        return self.mencionesHashtagsUrlsPattern.sub(r"" + caracter, texto) if texto else None
 
     def reemplazarSignospuntuacion(self, texto, caracter=""):
         """
@@ -149,22 +468,37 @@ class UtilidadPatternTexto(object):
 
     def obtenerEmoticonosEnTexto(self, texto):
         """
-        Obtiene todos los emoticonos del texto.
+        Obtiene todos los emoticonos del texto. Se buscan directamente con EMOTICONOS_PATTERN, que es mas rapido
+        que tokenizar todo el texto para un solo tipo de token.
 
         :param texto: Texto donde encontrar los emoticonos
         :return: Lista con todos los emoticonos del texto
         """
-        return [token for linea in UtilidadPatternTexto.EMOTICONOS_PATTERN.findall(texto) for token in linea if
-                token and len(token.strip()) > 0] if texto else []
+        return UtilidadPatternTexto.EMOTICONOS_PATTERN.findall(texto) if texto else []
+
+    def esEmoticono(self, caracter):
+        """
+        Comprueba si un caracter es de un emoticono buscando con bisect su codepoint en RANGOS_EMOTICONOS. No hace
+        falta recorrer los rangos ni depende de si la build de Python es estrecha o ancha.
+
+        :param caracter: caracter unicode o par surrogado de una build estrecha
+        :return: True si el caracter esta en los rangos de emoticonos y False en caso contrario
+        """
+        codepoint = obtenerCodepoint(caracter)
+        posicion = bisect.bisect_right(UtilidadPatternTexto.INICIOS_RANGOS_EMOTICONOS, codepoint) - 1
+        return posicion >= 0 and codepoint <= UtilidadPatternTexto.RANGOS_EMOTICONOS[posicion][1]
 
     def obtenerMencionesEnTexto(self, texto):
         """
-        Obtiene todas las menciones del texto.
+        Obtiene todas las menciones del texto. Se buscan directamente con su pattern salvo si mencionesEnUrls es
+        False, ya que entonces hace falta tokenizar para saber cuales estan dentro de una url.
 
         :param texto: Texto donde encontrar las menciones
         :return: Lista con todas las menciones del texto
         """
-        return [linea for linea in UtilidadPatternTexto.MENCIONES_PATTERN.findall(texto)]
+        if not self.mencionesEnUrls:
+            return self.obtenerTokensDeTipo(texto, UtilidadPatternTexto.TOKEN_MENCION)
+        return [linea for linea in self.mencionesPattern.findall(texto)]
 
     def obtenerHashtagsEnTexto(self, texto):
         """
@@ -173,7 +507,7 @@ class UtilidadPatternTexto(object):
         :param texto: Texto donde encontrar los hashtags
         :return: Lista con todos los hashtags del texto
         """
-        return [linea for linea in UtilidadPatternTexto.HASHTAGS_PATTERN.findall(texto)]
+        return [linea for linea in self.hashtagsPattern.findall(texto)]
 
     def obtenerUrlsEnTexto(self, texto):
         """
@@ -210,6 +544,218 @@ class UtilidadPatternTexto(object):
         """
         return len(texto.split()) if texto else 0
 
+    def obtenerCaracteristicasTexto(self, texto):
+        """
+        Obtiene de una vez el numero de caracteres, el numero de palabras, los emoticonos, los hashtags, las
+        menciones y las urls del texto. El resultado es el mismo que el de aplicar por separado
+        obtenerEmoticonosEnTexto, reemplazarEmoticonos, limpiarTexto, contarNumeroPalabras, obtenerHashtagsEnTexto,
+        obtenerMencionesEnTexto y obtenerUrlsEnTexto pero el texto se recorre tres veces en lugar de nueve (ver
+        calcularCaracteristicasTexto).
+
+        Si hay cache, las caracteristicas se buscan antes en ella y solo se calculan (ver calcularCaracteristicasTexto)
+        si el texto no esta. Las listas devueltas son siempre nuevas, por lo que se pueden modificar sin cambiar la
+        cache.
+
+        :param texto: Texto del que se quieren obtener las caracteristicas
+        :return: tupla (numero de caracteres, numero de palabras, lista de emoticonos, lista de hashtags,
+            lista de menciones, lista de urls)
+        """
+        if not texto or self.cacheCaracteristicasTexto is None:
+            return self.calcularCaracteristicasTexto(texto)
+        caracteristicas = self.cacheCaracteristicasTexto.obtener(texto)
+        if caracteristicas is None:
+            caracteristicas = self.calcularCaracteristicasTexto(texto)
+            self.cacheCaracteristicasTexto.guardar(texto, caracteristicas)
+        numeroCaracteres, numeroPalabras, emoticonos, hashtags, menciones, urls = caracteristicas
+        return numeroCaracteres, numeroPalabras, list(emoticonos), list(hashtags), list(menciones), list(urls)
+
+    def calcularCaracteristicasTexto(self, texto):
+        """
+        Calcula el numero de caracteres, el numero de palabras, los emoticonos, los hashtags, las menciones y las urls
+        del texto sin utilizar la cache (ver obtenerCaracteristicasTexto). El texto se recorre:
+            1. Una vez con tokenizar, que da los emoticonos, el numero de caracteres y el numero de palabras
+            2. Una vez con menciones y hashtags juntos, ya que en los tokens no estan las menciones dentro de una url.
+                Como ningun hashtag contiene "@" y ninguna mencion contiene "#", el resultado es el mismo que el de las
+                dos pasadas por separado
+            3. Una vez con el pattern de urls, que tampoco tienen por que ser tokens (una url que empieza dentro de
+                una mencion)
+        Si mencionesEnUrls es False, las menciones, hashtags y urls tambien se sacan de los tokens.
+
+        :param texto: Texto del que se quieren calcular las caracteristicas
+        :return: tupla (numero de caracteres, numero de palabras, lista de emoticonos, lista de hashtags,
+            lista de menciones, lista de urls)
+        """
+        if not texto:
+            return 0, 0, [], [], [], []
+
+        emoticonos = list()
+        hashtags = list()
+        menciones = list()
+        urls = list()
+        numeroCaracteresSinEmoticonos = 0
+        numeroPalabras = 0
+        for tipo, token in self.tokenizar(texto):
+            if tipo == UtilidadPatternTexto.TOKEN_EMOTICONO:
+                emoticonos.append(token)
+                continue
+            numeroCaracteresSinEmoticonos += len(token)
+            if tipo == UtilidadPatternTexto.TOKEN_PALABRA:
+                numeroPalabras += 1
+            elif self.mencionesEnUrls:
+                continue
+            elif tipo == UtilidadPatternTexto.TOKEN_HASHTAG:
+                hashtags.append(token)
+            elif tipo == UtilidadPatternTexto.TOKEN_MENCION:
+                menciones.append(token)
+            elif tipo == UtilidadPatternTexto.TOKEN_URL:
+                urls.append(token)
+
+        if self.mencionesEnUrls:
+            for mencionOHashtag in self.mencionesOHashtagsPattern.finditer(texto):
+                if mencionOHashtag.group(1):
+                    menciones.append(mencionOHashtag.group(1))
+                else:
+                    hashtags.append(mencionOHashtag.group(2))
+            urls = UtilidadPatternTexto.URLS_PATTERN.findall(texto)
+
+        numeroCaracteres = numeroCaracteresSinEmoticonos + len(
+            emoticonos) if numeroCaracteresSinEmoticonos else len(texto)
+
+        return numeroCaracteres, numeroPalabras, emoticonos, hashtags, menciones, urls
+
+    def obtenerTokensDeTipo(self, texto, tipo):
+        """
+        Obtiene todos los tokens de un tipo del texto.
+
+        :param texto: Texto donde encontrar los tokens
+        :param tipo: Tipo de token, uno de los UtilidadPatternTexto.TOKEN_*
+        :return: Lista con todos los tokens del tipo dado
+        """
+        return [token for tipoToken, token in self.tokenizar(texto) if tipoToken == tipo] if texto else []
+
+    def tokenizar(self, texto):
+        """
+        Recorre el texto una sola vez con TOKENS_PATTERN y lo divide en tokens con su tipo. La concatenacion de los
+        tokens es el texto original, de modo que cualquier reemplazo se obtiene uniendo los tokens. Los trozos de
+        palabra seguidos (por ejemplo una "h" que no empieza una url) se unen en un solo token de palabra, asi cada
+        token de palabra es una palabra de limpiarTexto. Los emoticonos son los de obtenerEmoticonosEnTexto.
+
+        Las menciones y hashtags son los de sus pattern (con letrasUnicode, los de re.UNICODE), pero una mencion
+        dentro de una url forma parte del token de la url.
+
+        :param texto: Texto a tokenizar
+        :return: Lista de tuplas (tipo, token) con tipo uno de los UtilidadPatternTexto.TOKEN_*
+        """
+        tokens = list()
+        if not texto:
+            return tokens
+        tipoAnterior = None
+        for token in self.tokensPattern.finditer(texto):
+            tipo = token.lastgroup
+            if tipo == UtilidadPatternTexto.GRUPO_CARACTER:
+                tipo = UtilidadPatternTexto.TOKEN_PALABRA
+            if tipo == UtilidadPatternTexto.TOKEN_PALABRA and tipoAnterior == UtilidadPatternTexto.TOKEN_PALABRA:
+                tokens[-1] = (tipo, tokens[-1][1] + token.group())
+            else:
+                tokens.append((tipo, token.group()))
+            tipoAnterior = tipo
+        return tokens
+
+
+class CacheCaracteristicasTexto(object):
+    """
+    Cache LRU acotada de las caracteristicas del texto (ver UtilidadPatternTexto.obtenerCaracteristicasTexto). En los
+    streams muchos tweets tienen exactamente el mismo texto (bots, retweets sin comentario...), y con la cache sus
+    caracteristicas solo se calculan la primera vez. La clave es el propio texto: el diccionario lo busca por su hash,
+    que Python calcula una vez por texto, y solo compara los textos con el mismo hash, por lo que dos textos distintos
+    nunca comparten caracteristicas. Se puede utilizar desde varios hilos.
+
+    Metodos disponibles:
+        * obtener: obtiene las caracteristicas guardadas de un texto y lo marca como el mas reciente.
+        * guardar: guarda las caracteristicas de un texto, sacando el menos reciente si la cache esta llena.
+        * obtenerEstadisticas: obtiene los aciertos, los fallos, la tasa de aciertos y el tamanyo de la cache.
+        * vaciar: borra todos los textos guardados y las estadisticas.
+    """
+
+    CAPACIDAD = 100000  # Numero maximo de textos que se guardan
+    # Mueve un texto al final del OrderedDict (el mas reciente). Solo existe a partir de Python 3.2
+    MOVER_AL_FINAL = getattr(OrderedDict, "move_to_end", None)
+
+    def __init__(self, capacidad=CAPACIDAD):
+        """
+        Crea la cache vacia.
+
+        :param capacidad: numero maximo de textos que se guardan
+        """
+        self.capacidad = capacidad
+        self.caracteristicas = OrderedDict()  # texto -> caracteristicas, del menos al mas reciente
+        self.aciertos = 0
+        self.fallos = 0
+        self.cerrojo = threading.Lock()
+
+    def obtener(self, texto):
+        """
+        Obtiene las caracteristicas guardadas de un texto y lo marca como el mas reciente.
+
+        :param texto: texto del tweet
+        :return: tupla de caracteristicas con tuplas en lugar de listas, o None si el texto no esta guardado
+        """
+        with self.cerrojo:
+            caracteristicas = self.caracteristicas.get(texto)
+            if caracteristicas is None:
+                self.fallos += 1
+                return None
+            if CacheCaracteristicasTexto.MOVER_AL_FINAL is not None:
+                CacheCaracteristicasTexto.MOVER_AL_FINAL(self.caracteristicas, texto)
+            else:  # OrderedDict de Python 2 no tiene move_to_end
+                del self.caracteristicas[texto]
+                self.caracteristicas[texto] = caracteristicas
+            self.aciertos += 1
+            return caracteristicas
+
+    def guardar(self, texto, caracteristicas):
+        """
+        Guarda las caracteristicas de un texto. Las listas se guardan como tuplas para que no se puedan modificar.
+        Si la cache esta llena se saca el texto menos reciente. Si el texto ya esta guardado no se hace nada.
+
+        :param texto: texto del tweet
+        :param caracteristicas: tupla (numero de caracteres, numero de palabras, lista de emoticonos, lista de
+            hashtags, lista de menciones, lista de urls)
+        """
+        numeroCaracteres, numeroPalabras, emoticonos, hashtags, menciones, urls = caracteristicas
+        caracteristicas = (numeroCaracteres, numeroPalabras, tuple(emoticonos), tuple(hashtags), tuple(menciones),
+                           tuple(urls))
+        with self.cerrojo:
+            if texto in self.caracteristicas:  # Otro hilo ya lo ha guardado
+                return
+            self.caracteristicas[texto] = caracteristicas
+            if len(self.caracteristicas) > self.capacidad:
+                self.caracteristicas.popitem(last=False)
+
+    def obtenerEstadisticas(self):
+        """
+        Obtiene las estadisticas de la cache.
+
+        :return: diccionario con los aciertos, los fallos, la tasa de aciertos (None si no se ha buscado ningun
+            texto), el numero de textos guardados y la capacidad
+        """
+        with self.cerrojo:
+            busquedas = self.aciertos + self.fallos
+            return {"aciertos": self.aciertos,
+                    "fallos": self.fallos,
+                    "tasaAciertos": float(self.aciertos) / busquedas if busquedas else None,
+                    "tamanyo": len(self.caracteristicas),
+                    "capacidad": self.capacidad}
+
+    def vaciar(self):
+        """
+        Borra todos los textos guardados y las estadisticas.
+        """
+        with self.cerrojo:
+            self.caracteristicas.clear()
+            self.aciertos = 0
+            self.fallos = 0
+
 
 class ManejadorMongodb(object):
     """
@@ -218,15 +764,35 @@ class ManejadorMongodb(object):
     Metodos disponibles:
         * obtenerColeccionTweets: obtiene la coleccion para guardar tweets no parseados
         * obtenerColeccionTweetsFiltrados: obtiene la coleccion para guardar tweets parseados
+        * obtenerParametrosConexion: obtiene los parametros para crear otro manejador igual
+        * estaConectado: comprueba si Mongodb responde
+        * asegurarIndices: crea los indices de la coleccion de tweets parseados que no existan
+        * completarFechas: guarda la fecha de creacion en datetime en los tweets que no la tienen
+        * obtenerIndicesConsulta: obtiene con explain los indices que utiliza Mongodb para un filtro
+
+    La coleccion de tweets parseados tiene indices (ver INDICES_TWEETFILTRADO) para las consultas por fecha de
+    creacion, lenguaje, hashtag y usuario, de modo que no se tenga que recorrer toda la coleccion. Como created_at es
+    un texto que no se puede ordenar, los escritores guardan tambien la fecha en datetime en el campo CAMPO_FECHA.
     """
 
     BASEDATOS_NOMBRE_TWEETS = "tweetsfinal"  # Nombre de la base de datos
     COLECCION_NOMBRE_TWEET = "tweet"  # Nombre de la coleccion para guardar tweets no parseados
     COLECCION_NOMBRE_TWEETFILTRADO = "tweetfiltrado"  # Nombre de la coleccion para guardar tweets parseados
+    CAMPO_FECHA = "fecha"  # Campo con la fecha de creacion (created_at) en datetime (UTC)
+    CAMPO_LENGUAJE = "lang"
+    CAMPO_HASHTAGS = "entities.hashtags.text"
+    CAMPO_USUARIO = "user.id"
+    # Indices de la coleccion de tweets parseados, ademas del de _id. Cada uno es la lista de (campo, orden)
+    INDICES_TWEETFILTRADO = ([(CAMPO_FECHA, pymongo.ASCENDING)],
+                             [(CAMPO_LENGUAJE, pymongo.ASCENDING)],
+                             [(CAMPO_HASHTAGS, pymongo.ASCENDING)],
+                             [(CAMPO_USUARIO, pymongo.ASCENDING)])
+    TAMANYO_LOTE_FECHAS = 1000  # Numero de tweets que se actualizan juntos al completar las fechas
 
     def __init__(self, mongodbHost, mongodbPuerto, usuario=None, password=None,
                  basedatosNombreTweets=BASEDATOS_NOMBRE_TWEETS, coleccionNombreTweet=COLECCION_NOMBRE_TWEET,
-                 coleccionNombreTweetsFiltrado=COLECCION_NOMBRE_TWEETFILTRADO):
+                 coleccionNombreTweetsFiltrado=COLECCION_NOMBRE_TWEETFILTRADO, mongoCliente=None,
+                 segundosSeleccionServidor=None):
         """
         Crea el objeto para manejar el Mongodb. Lanzara una excepcion si no se puede conectar.
 
@@ -237,16 +803,54 @@ class ManejadorMongodb(object):
         :param basedatosNombreTweets: Nombre de la base de datos para almacenar los tweets
         :param coleccionNombreTweet: Nombre de la coleccion para almacenar los tweets no parseados
         :param coleccionNombreTweetsFiltrado: Nombre de la coleccion para almacenar los tweets parseados
+        :param mongoCliente: cliente de Mongodb ya creado (por ejemplo de mongomock para medir el rendimiento sin
+            servidor). Si se pasa no se utilizan ni el host, ni el puerto, ni el usuario y password
+        :param segundosSeleccionServidor: segundos que se espera a Mongodb antes de dar una operacion por fallida
+            (serverSelectionTimeoutMS). Si es None (por defecto) se utiliza el de pymongo (30 segundos)
         """
-        if usuario and password:
+        # Parametros para crear otro manejador igual, por ejemplo en otro proceso (ver obtenerParametrosConexion).
+        # Un cliente ya creado no se puede pasar a otro proceso
+        self.parametrosConexion = None if mongoCliente is not None else {
+            "mongodbHost": mongodbHost, "mongodbPuerto": mongodbPuerto, "usuario": usuario, "password": password,
+            "basedatosNombreTweets": basedatosNombreTweets, "coleccionNombreTweet": coleccionNombreTweet,
+            "coleccionNombreTweetsFiltrado": coleccionNombreTweetsFiltrado,
+            "segundosSeleccionServidor": segundosSeleccionServidor}
+        opcionesCliente = dict()
+        if segundosSeleccionServidor is not None:
+            opcionesCliente["serverSelectionTimeoutMS"] = int(segundosSeleccionServidor * 1000)
+        if mongoCliente is not None:
+            self.mongoCliente = mongoCliente
+        elif usuario and password:
             self.mongoCliente = pymongo.MongoClient(
-                'mongodb://%s:%s@%s:%d' % (usuario, password, mongodbHost, mongodbPuerto))
+                'mongodb://%s:%s@%s:%d' % (usuario, password, mongodbHost, mongodbPuerto), **opcionesCliente)
         else:
-            self.mongoCliente = pymongo.MongoClient('mongodb://%s:%d' % (mongodbHost, mongodbPuerto))
+            self.mongoCliente = pymongo.MongoClient('mongodb://%s:%d' % (mongodbHost, mongodbPuerto),
+                                                    **opcionesCliente)
         self.bbddTweets = self.mongoCliente[basedatosNombreTweets]
         self.coleccionNombreTweet = coleccionNombreTweet
         self.coleccionNombreTweetsFiltrado = coleccionNombreTweetsFiltrado
 
+    def obtenerParametrosConexion(self):
+        """
+        Obtiene los parametros con los que crear otro manejador igual, por ejemplo en otro proceso, ya que un
+        cliente de Mongodb no se puede compartir entre procesos.
+
+        :return: diccionario con los parametros de ManejadorMongodb o None si se ha creado con un cliente ya creado
+        """
+        return self.parametrosConexion
+
+    def estaConectado(self):
+        """
+        Comprueba si Mongodb responde con el comando ping. Si no responde tarda como mucho segundosSeleccionServidor.
+
+        :return: True si Mongodb responde y False en caso contrario
+        """
+        try:
+            self.mongoCliente.admin.command("ping")
+            return True
+        except pymongo.errors.ConnectionFailure:
+            return False
+
     def obtenerColeccionTweets(self):
         """
         Obtiene la coleccion para almacenar los tweest no parseados.
@@ -263,6 +867,80 @@ class ManejadorMongodb(object):
         """
         return self.bbddTweets[self.coleccionNombreTweetsFiltrado]
 
+    def asegurarIndices(self):
+        """
+        Crea los indices de INDICES_TWEETFILTRADO en la coleccion de tweets parseados. Los que ya existen no se
+        vuelven a crear, por lo que se puede llamar cada vez que se arranca. Los indices se crean en segundo plano
+        para no bloquear la coleccion si ya tiene muchos tweets.
+        Lanzara una excepcion para terminar el programa si no se puede conectar a Mongodb.
+
+        :return: lista con los nombres de los indices
+        """
+        coleccion = self.obtenerColeccionTweetsFiltrados()
+        try:
+            return [coleccion.create_index(indice, background=True)
+                    for indice in ManejadorMongodb.INDICES_TWEETFILTRADO]
+        except pymongo.errors.ConnectionFailure:
+            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_CONECTADO_MONGODB, terminarPrograma=True)
+
+    def completarFechas(self, tamanyoLote=TAMANYO_LOTE_FECHAS):
+        """
+        Guarda la fecha de creacion en datetime (ver CAMPO_FECHA) en los tweets parseados que no la tienen, por
+        ejemplo los escritos antes de que se guardase o los restaurados de un dump. Solo se leen el _id y created_at
+        de esos tweets y se actualizan en lotes de tamanyoLote.
+        Lanzara una excepcion para terminar el programa si no se puede conectar a Mongodb.
+
+        :param tamanyoLote: numero de tweets que se actualizan juntos
+        :return: numero de tweets actualizados
+        """
+        coleccion = self.obtenerColeccionTweetsFiltrados()
+        numeroTweets = 0
+        try:
+            tweets = coleccion.find({ManejadorMongodb.CAMPO_FECHA: {"$exists": False}, "created_at": {"$exists": True}},
+                                    projection={"created_at": True}).batch_size(tamanyoLote)
+            while True:
+                lote = list(islice(tweets, tamanyoLote))
+                if not lote:
+                    return numeroTweets
+                actualizaciones = list()
+                for tweet in lote:
+                    fecha = parsearFechaTwitter(tweet["created_at"])
+                    if fecha is not None:
+                        actualizaciones.append(pymongo.UpdateOne(
+                            {"_id": tweet["_id"]}, {"$set": {ManejadorMongodb.CAMPO_FECHA: fecha}}))
+                if actualizaciones:
+                    numeroTweets += coleccion.bulk_write(actualizaciones, ordered=False).modified_count
+        except pymongo.errors.ConnectionFailure:
+            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_CONECTADO_MONGODB, terminarPrograma=True)
+
+    def obtenerIndicesConsulta(self, filtro):
+        """
+        Obtiene con explain los indices que utiliza Mongodb en el plan ganador de una consulta de tweets parseados,
+        para comprobar que una consulta no recorre toda la coleccion.
+        Lanzara una excepcion para terminar el programa si no se puede conectar a Mongodb.
+
+        :param filtro: filtro de Mongodb de la consulta
+        :return: lista con los nombres de los indices utilizados, vacia si se recorre toda la coleccion (COLLSCAN),
+            o None si el cliente no tiene explain (por ejemplo mongomock)
+        """
+        cursor = self.obtenerColeccionTweetsFiltrados().find(filtro)
+        if not hasattr(cursor, "explain"):
+            return None
+        try:
+            plan = cursor.explain()
+        except pymongo.errors.ConnectionFailure:
+            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_CONECTADO_MONGODB, terminarPrograma=True)
+
+        indices = list()
+        etapas = [plan.get("queryPlanner", {}).get("winningPlan", {})]
+        while etapas:  # Se recorren todas las etapas del plan, que pueden tener una etapa hija o varias
+            etapa = etapas.pop()
+            if "indexName" in etapa and etapa["indexName"] not in indices:
+                indices.append(etapa["indexName"])
+            etapas.extend(etapa[campo] for campo in ("inputStage", "queryPlan") if campo in etapa)
+            etapas.extend(etapa.get("inputStages", []))
+        return indices
+
 
 class EscritorTweets(object):
     """
@@ -272,6 +950,9 @@ class EscritorTweets(object):
         * escribirTweet: escribe un tweet en formato JSON no parseados
         * escribirTweetFiltrado: escribe un tweet en formato JSON parseado
         * borrarContenido: borra todos los tweest almacenados
+        * vaciar: escribe en disco los tweets que esten pendientes de ser escritos
+        * ponerId: poner el id en el tweet JSON para ser utilizado como id del documento
+        * ponerFecha: poner la fecha de creacion en datetime en el tweet JSON para poder indexarla
     """
 
     def escribirTweet(self, tweetJson):
@@ -296,31 +977,156 @@ class EscritorTweets(object):
         """
         pass
 
+    def vaciar(self):
+        """
+        Escribe en disco los tweets que esten pendientes de ser escritos. Se tiene que llamar antes de terminar el
+        programa si el escritor guarda los tweets en memoria antes de escribirlos.
+        """
+        pass
+
+    def ponerId(self, tweetJson):
+        """
+        Se crea un nuevo campo en el tweet llamado _id con el valor del id del tweet para que sea utilizado como id
+        del documento.
+
+        :param tweetJson: tweet en formato JSON con el id
+        :return: el tweet con un nuevo campo _id
+        """
+        if "id" in tweetJson:
+            tweetJson["_id"] = tweetJson["id"]
+        return tweetJson
+
+    def ponerFecha(self, tweetJson):
+        """
+        Se crea un nuevo campo en el tweet (ver ManejadorMongodb.CAMPO_FECHA) con la fecha de creacion (created_at)
+        en datetime (UTC). Al contrario que el texto de created_at, se puede ordenar y buscar por rangos con un
+        indice. Si el tweet ya la tiene o no se puede parsear created_at no se cambia.
+
+        :param tweetJson: tweet en formato JSON con la fecha de creacion
+        :return: el tweet con un nuevo campo con la fecha
+        """
+        if "created_at" in tweetJson and ManejadorMongodb.CAMPO_FECHA not in tweetJson:
+            fecha = parsearFechaTwitter(tweetJson["created_at"])
+            if fecha is not None:
+                tweetJson[ManejadorMongodb.CAMPO_FECHA] = fecha
+        return tweetJson
+
 
 class MongodbEscritorTweets(EscritorTweets):
     """
     Clase para escribir tweets en Mongodb y que hereda de EscritorTweets. El _id del documento sera el id del tweet.
+    Ademas se guarda la fecha de creacion en datetime (ver ponerFecha) y, al crear el escritor, se aseguran los
+    indices de la coleccion de tweets parseados (ver ManejadorMongodb.asegurarIndices). Si Mongodb no responde al
+    crear el escritor y hay spool, los indices se crean despues desde el hilo de drenado.
+
+    Si tamanyoLote es mayor que 1 los tweets se guardan en memoria y se escriben en lotes con insert_many (no
+    ordenado) cuando se llega a tamanyoLote tweets pendientes en una coleccion o cuando han pasado intervaloVaciado
+    segundos desde el ultimo vaciado. El tiempo se comprueba cada vez que se escribe un tweet y, para que los tweets
+    no se queden en memoria cuando dejan de llegar, tambien desde un hilo de vaciado (ver vaciarPeriodicamente). Si
+    un vaciado del hilo falla, la excepcion se lanza en la siguiente escritura. Si un lote no se escribe porque
+    Mongodb no responde y no hay spool, el lote y los que no se han intentado escribir vuelven a estar pendientes,
+    por lo que se escriben en el siguiente vaciado; con cualquier otro error el lote que falla se pierde (volveria a
+    fallar) pero no los siguientes. Antes de terminar se tiene que llamar a vaciar y a detenerVaciado. Los tweets
+    duplicados de un lote no impiden que se escriba el resto: se cuentan en numeroTweetsDuplicados y sus ids se
+    devuelven en vaciar. Se puede escribir desde varios hilos a la vez.
+
+    Si se indica un directorio de spool, cuando Mongodb no responde los tweets no se pierden ni se para el programa:
+    se escriben en segmentos en el directorio con un FicheroEscritorTweets y, mientras Mongodb siga caido, los
+    siguientes tweets van directamente al spool sin esperar a Mongodb. Un hilo de drenado comprueba cada
+    intervaloDrenado segundos si Mongodb responde y, si es asi, carga los segmentos del spool en lotes y los borra.
+    Solo se drena desde ese hilo, por lo que los hilos que escriben no esperan a que se cargue el spool. Cuando el
+    spool se queda vacio se vuelve a escribir en Mongodb. Si el spool llega a bytesMaximosSpool los tweets
+    se descartan con una excepcion "leve". Los tweets del spool que no se hayan cargado al terminar se quedan en el
+    directorio y se cargan la siguiente vez. Para que un Mongodb caido se detecte rapido, el manejador se puede crear
+    con segundosSeleccionServidor.
 
     Metodos disponibles:
         * escribirTweet: escribe un tweet en formato JSON no parseados
         * escribirTweetFiltrado: escribe un tweet en formato JSON parseado
         * escribir: escribe un tweet en una coleccion
+        * vaciar: escribe en Mongodb todos los tweets pendientes
+        * devolverLotesPendientes: vuelve a poner como pendientes los lotes que no se han escrito
+        * vaciarPeriodicamente: bucle del hilo de vaciado
+        * detenerVaciado: para el hilo de vaciado
+        * escribirLote: escribe un lote de tweets en una coleccion con insert_many
+        * escribirLoteOEnSpool: escribe un lote de tweets en Mongodb o, si no responde, en el spool
+        * asegurarIndices: crea los indices de la coleccion de tweets parseados si Mongodb responde
+        * escribirEnSpool: escribe tweets en el spool
+        * drenarSpool: carga en Mongodb los segmentos del spool
+        * drenarSpoolPeriodicamente: bucle del hilo de drenado
+        * detenerDrenado: para el hilo de drenado
+        * anotarMetricasSpool: suma valores a las metricas del spool
+        * obtenerMetricasSpool: obtiene las metricas del spool
+        * contarTweets: actualiza los contadores de tweets escritos y duplicados
         * borrarContenido: borra todos los tweest almacenados
-        * ponerId: poner el id en el tweet JSON para ser utilizado como id del documento
     """
 
-    def __init__(self, manejadorMongodb, vaciarAnterioresColecciones=False):
+    TAMANYO_LOTE = 1  # Numero de tweets por lote. Con 1 se escribe cada tweet en el momento
+    INTERVALO_VACIADO = 5.0  # Segundos maximos que un tweet puede estar pendiente de ser escrito
+    CODIGO_ERROR_CLAVE_DUPLICADA = 11000  # Codigo de error de Mongodb cuando el _id esta duplicado
+    BYTES_MAXIMOS_SPOOL = 1024 * 1024 * 1024  # Bytes maximos que puede ocupar el spool en el disco
+    INTERVALO_DRENADO = 5.0  # Segundos entre comprobaciones del hilo de drenado
+    TAMANYO_LOTE_DRENADO = 1000  # Numero de tweets del spool que se escriben juntos en Mongodb
+
+    def __init__(self, manejadorMongodb, vaciarAnterioresColecciones=False, tamanyoLote=TAMANYO_LOTE,
+                 intervaloVaciado=INTERVALO_VACIADO, directorioSpool=None, bytesMaximosSpool=BYTES_MAXIMOS_SPOOL,
+                 intervaloDrenado=INTERVALO_DRENADO, crearIndices=True):
         """
         Crea el objeto para escribir tweets en Mongodb. Lanzara una excepcion si no se puede conectar.
         El _id del documento sera el id del tweet.
 
         :param manejadorMongodb: manejador de Mongodb para obtener las colecciones
         :param vaciarAnterioresColecciones: True si se quiere borrar todo el contenido, False en caso contrario
+        :param tamanyoLote: numero de tweets pendientes en una coleccion a partir del cual se escriben. Con 1 (por
+            defecto) cada tweet se escribe en el momento con insert_one
+        :param intervaloVaciado: segundos a partir de los cuales se escriben los tweets pendientes
+        :param directorioSpool: directorio donde se escriben los tweets mientras Mongodb no responde. Si es None (por
+            defecto) no hay spool y se lanza una excepcion para terminar el programa si Mongodb no responde
+        :param bytesMaximosSpool: bytes maximos que puede ocupar el spool en el disco
+        :param intervaloDrenado: segundos entre comprobaciones del hilo de drenado
+        :param crearIndices: True (por defecto) para asegurar los indices de la coleccion de tweets parseados
         """
         self.manejadorMongodb = manejadorMongodb
+        self.tamanyoLote = tamanyoLote
+        self.intervaloVaciado = intervaloVaciado
+        self.tweetsPendientes = defaultdict(list)  # Nombre completo de la coleccion -> tweets pendientes
+        self.colecciones = dict()  # Nombre completo de la coleccion -> coleccion
+        self.instanteUltimoVaciado = timeit.default_timer()
+        self.numeroTweetsEscritos = 0
+        self.numeroTweetsDuplicados = 0
+        self.cerrojo = threading.Lock()  # Permite escribir desde varios hilos a la vez
         if vaciarAnterioresColecciones:
             self.borrarContenido()
 
+        self.excepcionVaciado = None  # Excepcion del hilo de vaciado que se lanza en la siguiente escritura
+        self.detenerHiloVaciado = threading.Event()
+        self.hiloVaciado = None
+        if self.tamanyoLote > 1:
+            self.hiloVaciado = threading.Thread(target=self.vaciarPeriodicamente)
+            self.hiloVaciado.daemon = True
+            self.hiloVaciado.start()
+
+        self.bytesMaximosSpool = bytesMaximosSpool
+        self.intervaloDrenado = intervaloDrenado
+        self.mongodbCaido = False  # Mientras sea True los tweets se escriben directamente en el spool
+        self.metricasSpool = Counter()
+        self.cerrojoSpool = threading.RLock()  # Para cambiar mongodbCaido, las metricas y escribir en el spool
+        self.cerrojoDrenado = threading.Lock()  # Solo se drena el spool desde un hilo a la vez
+        self.detenerHiloDrenado = threading.Event()
+        self.spool = None
+        self.hiloDrenado = None
+        self.indicesAsegurados = not crearIndices
+        if directorioSpool is not None:
+            # Con SINCRONIZACION_INTERVALO como mucho se pierde el ultimo segundo del spool si se para el programa
+            self.spool = FicheroEscritorTweets(
+                directorioSpool, compresion=FicheroEscritorTweets.COMPRESION_GZIP,
+                politicaSincronizacion=FicheroEscritorTweets.SINCRONIZACION_INTERVALO)
+        self.asegurarIndices()
+        if self.spool is not None:
+            self.hiloDrenado = threading.Thread(target=self.drenarSpoolPeriodicamente)
+            self.hiloDrenado.daemon = True
+            self.hiloDrenado.start()
+
     def escribirTweet(self, tweetJson):
         """
         Escribe un tweet no parseado en Mongodb. El _id del documento sera el id del tweet.
@@ -346,161 +1152,1037 @@ class MongodbEscritorTweets(EscritorTweets):
         Escribe un tweet parseado o no en Mongodb.
         Lanzara una excepcion "leve" si el id esta repetido y una para terminar el programa si no se puede conectar.
 
+        Si se escribe por lotes, el tweet se guarda como pendiente y solo se escribe cuando se vacian los tweets
+        pendientes.
+
         :param tweetJson: tweet en formato JSON para ser guardado
         :param coleccion: coleccion de Mongodb donde ser almacenado el tweet
         """
+        if self.excepcionVaciado is not None:  # El hilo de vaciado no ha podido escribir los tweets pendientes
+            excepcion, self.excepcionVaciado = self.excepcionVaciado, None
+            raise excepcion
+
+        tweetJson = self.ponerFecha(self.ponerId(tweetJson))
+        if self.mongodbCaido and self.escribirEnSpool([tweetJson], coleccion, soloSiCaido=True):
+            return  # No se espera a Mongodb mientras siga caido
+
+        if self.tamanyoLote > 1:
+            with self.cerrojo:
+                self.colecciones[coleccion.full_name] = coleccion
+                tweetsPendientesColeccion = self.tweetsPendientes[coleccion.full_name]
+                tweetsPendientesColeccion.append(tweetJson)
+                tieneQueVaciar = len(tweetsPendientesColeccion) >= self.tamanyoLote or \
+                    timeit.default_timer() - self.instanteUltimoVaciado >= self.intervaloVaciado
+            if tieneQueVaciar:
+                self.vaciar()
+            return
+
         try:
-            tweetJson = self.ponerId(tweetJson)
             coleccion.insert_one(tweetJson)
+            self.contarTweets(escritos=1)
         except pymongo.errors.DuplicateKeyError:
+            self.contarTweets(duplicados=1)
             raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_ENTRADA_DUPLICADA_MONGODB, terminarPrograma=False)
-        except pymongo.errors.ServerSelectionTimeoutError:
-            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_CONECTADO_MONGODB, terminarPrograma=True)
+        except pymongo.errors.ConnectionFailure:
+            if self.spool is None:
+                raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_CONECTADO_MONGODB, terminarPrograma=True)
+            self.escribirEnSpool([tweetJson], coleccion)
 
-    def borrarContenido(self):
+    def vaciar(self):
         """
-        Borra el contenido de ambas colecciones en Mongodb: tweets parseados y no parseados. Si hay algun problema
-        lanzara una excepcion para terminar el programa.
+        Escribe en Mongodb todos los tweets pendientes, un lote por coleccion. Si hay spool, ademas se cierran sus
+        segmentos, por lo que los tweets que sigan en el spool quedan completos en el disco. El spool no se carga
+        aqui sino desde el hilo de drenado, para no parar al hilo que escribe mientras se carga.
+        Lanzara una excepcion para terminar el programa si no se puede conectar y no hay spool; entonces los lotes
+        no escritos vuelven a estar pendientes (ver devolverLotesPendientes). Si un lote tiene errores que no son de
+        duplicado se escriben los demas lotes y despues se lanza la excepcion "leve".
+
+        :return: lista con los ids de los tweets que no se han escrito por estar duplicados
+        """
+        with self.cerrojo:  # Se sacan los lotes y se escriben sin el cerrojo para no bloquear a otros hilos
+            lotes = [(self.colecciones[nombreColeccion], tweets) for nombreColeccion, tweets in
+                     self.tweetsPendientes.items() if tweets]
+            self.tweetsPendientes = defaultdict(list)
+            self.instanteUltimoVaciado = timeit.default_timer()
+
+        idsDuplicados = list()
+        excepcionLeve = None
+        for posicion, (coleccion, tweets) in enumerate(lotes):
+            try:
+                idsDuplicados.extend(self.escribirLoteOEnSpool(tweets, coleccion))
+            except TwiterExcepcion as e:
+                if e.terminarPrograma:  # Mongodb no responde: no se pierde ningun lote
+                    self.devolverLotesPendientes(lotes[posicion:])
+                    raise e
+                excepcionLeve = e
+            except Exception:  # El lote volveria a fallar, pero los siguientes no se han intentado escribir
+                self.devolverLotesPendientes(lotes[posicion + 1:])
+                raise
+        if self.spool is not None:
+            self.spool.vaciar()
+        if excepcionLeve is not None:
+            raise excepcionLeve
+        return idsDuplicados
+
+    def devolverLotesPendientes(self, lotes):
+        """
+        Vuelve a poner como pendientes los lotes que ha sacado vaciar y no se han escrito. Van delante de los
+        tweets que se hayan escrito mientras tanto para mantener el orden. Si Mongodb sigue sin responder, los
+        tweets pendientes crecen hasta que se para el programa o se vuelve a escribir.
+
+        :param lotes: lista de tuplas (coleccion, tweets)
+        """
+        with self.cerrojo:
+            for coleccion, tweets in lotes:
+                self.colecciones[coleccion.full_name] = coleccion
+                self.tweetsPendientes[coleccion.full_name] = tweets + self.tweetsPendientes[coleccion.full_name]
+
+    def vaciarPeriodicamente(self):
+        """
+        Bucle del hilo de vaciado: escribe los tweets pendientes cuando han pasado intervaloVaciado segundos desde
+        el ultimo vaciado, aunque no se escriban mas tweets, hasta que se llama a detenerVaciado. Asi ningun tweet
+        esta pendiente mas de intervaloVaciado segundos (mas lo que tarde en escribirse). Si el vaciado lanza
+        cualquier excepcion (no solo TwiterExcepcion, tambien por ejemplo un OperationFailure de pymongo), se guarda
+        para lanzarla en la siguiente escritura, ya que el hilo no puede parar el programa y no tiene que morir.
+        """
+        espera = self.intervaloVaciado
+        while not self.detenerHiloVaciado.wait(espera):
+            with self.cerrojo:
+                hayPendientes = any(self.tweetsPendientes.values())
+                espera = self.intervaloVaciado - (timeit.default_timer() - self.instanteUltimoVaciado)
+            if espera > 0:  # Se ha vaciado hace poco desde otro hilo
+                continue
+            espera = self.intervaloVaciado
+            if hayPendientes:
+                try:
+                    self.vaciar()
+                except Exception as e:
+                    self.excepcionVaciado = e
+
+    def detenerVaciado(self):
+        """
+        Para el hilo de vaciado. Los tweets que queden pendientes se tienen que escribir llamando a vaciar.
+        """
+        if self.hiloVaciado is not None:
+            self.detenerHiloVaciado.set()
+            self.hiloVaciado.join()
+            self.hiloVaciado = None
+
+    def escribirLote(self, tweets, coleccion):
+        """
+        Escribe un lote de tweets en una coleccion con insert_many no ordenado, por lo que un tweet duplicado no
+        impide que se escriban el resto. Lanzara una excepcion "leve" si algun tweet no se ha escrito por un error
+        distinto a estar duplicado y una para terminar el programa si no se puede conectar.
+
+        :param tweets: lista de tweets en formato JSON con el _id ya puesto
+        :param coleccion: coleccion de Mongodb donde ser almacenados los tweets
+        :return: lista con los ids de los tweets que no se han escrito por estar duplicados
         """
         try:
-            coleccionTweet = self.manejadorMongodb.obtenerColeccionTweets()
-            coleccionTweet.drop()
-            coleccionTweet = self.manejadorMongodb.obtenerColeccionTweetsFiltrados()
-            coleccionTweet.drop()
-        except pymongo.errors.ServerSelectionTimeoutError:
+            coleccion.insert_many(tweets, ordered=False)
+            self.contarTweets(escritos=len(tweets))
+            return []
+        except pymongo.errors.BulkWriteError as e:
+            erroresEscritura = e.details.get("writeErrors", [])
+            idsDuplicados = [tweets[error["index"]].get("_id") for error in erroresEscritura if
+                             error.get("code") == MongodbEscritorTweets.CODIGO_ERROR_CLAVE_DUPLICADA]
+            self.contarTweets(escritos=e.details.get("nInserted", 0), duplicados=len(idsDuplicados))
+            if len(idsDuplicados) < len(erroresEscritura):  # Hay errores que no son por estar duplicado
+                raise TwiterExcepcion(str(e), errores=erroresEscritura, terminarPrograma=False)
+            return idsDuplicados
+        except pymongo.errors.ConnectionFailure:
             raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_CONECTADO_MONGODB, terminarPrograma=True)
 
-    def ponerId(self, tweetJson):
+    def escribirLoteOEnSpool(self, tweets, coleccion):
         """
-        Se crea un nuevo campo en el tweet llamado _id con el valor del id del tweet para que sea utilizado como id
-        del documento.
+        Escribe un lote de tweets en Mongodb con escribirLote o, si Mongodb no responde y hay spool, en el spool.
 
-        :param tweetJson: tweet en formato JSON con el id
-        :return: el tweet con un nuevo campo _id
+        :param tweets: lista de tweets en formato JSON con el _id ya puesto
+        :param coleccion: coleccion de Mongodb donde ser almacenados los tweets
+        :return: lista con los ids de los tweets que no se han escrito por estar duplicados
         """
-        if "id" in tweetJson:
-            tweetJson["_id"] = tweetJson["id"]
-        return tweetJson
-
+        if self.mongodbCaido and self.escribirEnSpool(tweets, coleccion, soloSiCaido=True):
+            return []
+        try:
+            return self.escribirLote(tweets, coleccion)
+        except TwiterExcepcion as e:
+            if not e.terminarPrograma or self.spool is None:
+                raise e
+            # Si el lote se ha escrito a medias, los tweets ya escritos seran duplicados al cargar el spool
+            self.escribirEnSpool(tweets, coleccion)
+            return []
+
+    def asegurarIndices(self):
+        """
+        Asegura los indices de la coleccion de tweets parseados con ManejadorMongodb.asegurarIndices si todavia no
+        se ha hecho. Si Mongodb no responde y hay spool no se para el programa: se volvera a intentar desde el hilo
+        de drenado.
+        Lanzara una excepcion para terminar el programa si no se puede conectar y no hay spool.
+        """
+        if self.indicesAsegurados:
+            return
+        try:
+            self.manejadorMongodb.asegurarIndices()
+            self.indicesAsegurados = True
+        except TwiterExcepcion as e:
+            if self.spool is None:
+                raise e
 
-class ParseadorTweetsAPandas(object):
-    """
-    Interfaz que tendrian que heredar todas las clases que se quieran utilizar para leer tweets en disco.
-    Solo se utilizaran los tweets parseados.
+    def escribirEnSpool(self, tweets, coleccion, soloSiCaido=False):
+        """
+        Escribe tweets en el spool porque Mongodb no responde y marca Mongodb como caido para que los siguientes
+        tweets se escriban directamente en el spool. Lanzara una excepcion "leve" si el spool ha llegado a
+        bytesMaximosSpool y una para terminar el programa si no se puede escribir en el disco.
+
+        :param tweets: lista de tweets en formato JSON con el _id ya puesto
+        :param coleccion: coleccion de Mongodb donde se tendrian que haber escrito los tweets
+        :param soloSiCaido: True si solo se escriben cuando Mongodb sigue marcado como caido, porque no se ha
+            intentado escribir en Mongodb. Por defecto es False (ha fallado la escritura en Mongodb)
+        :return: True si se han escrito en el spool y False si Mongodb ya no esta marcado como caido
+        """
+        tipo = FicheroEscritorTweets.TIPO_TWEET if coleccion.full_name == \
+            self.manejadorMongodb.obtenerColeccionTweets().full_name else FicheroEscritorTweets.TIPO_TWEETFILTRADO
+        with self.cerrojoSpool:
+            if soloSiCaido and not self.mongodbCaido:  # El drenado lo ha desmarcado mientras tanto
+                return False
+            if not self.mongodbCaido:
+                self.mongodbCaido = True
+                self.anotarMetricasSpool(caidas=1)
+            if self.spool.obtenerBytes() >= self.bytesMaximosSpool:
+                self.anotarMetricasSpool(tweetsDescartados=len(tweets))
+                raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_SPOOL_LLENO, terminarPrograma=False)
+            for tweet in tweets:
+                self.spool.escribir(tweet, tipo)
+            self.anotarMetricasSpool(tweetsSpool=len(tweets))
+        return True
 
-    Metodos disponibles:
-        * pasearTodosTweetsFiltradoEnPandas: parsea todos los tweets almacenados y los convierte en pandas.
-            Se obtiene usuarios, texto, fecha de creacion, localizacion del texto (no del usuario) y lenguaje.
-        * anyadirHoraMinuto: anyade la hora y el minuto al pandas en distintas columnas
-        * anyadirEmoticonosHashtagsMenciones: anyade los emoticonos, hashtags y menciones del texto en pandas a
-            partir del texto. Estos seran listas de emoticonos, hashtags y menciones.
-    """
+    def drenarSpool(self):
+        """
+        Si Mongodb responde, cierra los segmentos abiertos del spool, vuelve a escribir los tweets nuevos en Mongodb y
+        carga los segmentos del spool en lotes de TAMANYO_LOTE_DRENADO tweets, borrandolos segun se cargan. Si Mongodb
+        deja de responder se para, el resto de segmentos se queda en el spool y, como falla la escritura de los
+        tweets nuevos, se vuelve a escribir en el spool. Los tweets duplicados (por ejemplo de un lote que se escribio
+        a medias) se saltan. Si ya se esta drenando desde otro hilo no se espera a que termine.
 
-    # Nombre de las columnas del pandas
-    NOMBRE_COLUMNA_USUARIO = "usuario"
-    NOMBRE_COLUMNA_FECHACREACION = "fecha_creacion"
-    NOMBRE_COLUMNA_TEXTO = "texto"
-    NOMBRE_COLUMNA_LOCALIZACION = "localizacion"
-    NOMBRE_COLUMNA_NUMEROPALABRAS = "numero_palabras"
-    NOMBRE_COLUMNA_NUMEROCARACTERES = "numero_caracteres"
-    NOMBRE_COLUMNA_HORA = "hora"
-    NOMBRE_COLUMNA_MINUTO = "minuto"
-    NOMBRE_COLUMNA_LENGUAJE = "lenguaje"
-    NOMBRE_COLUMNA_EMOTICONOS = "emoticonos"
-    NOMBRE_COLUMNA_HASHTAGS = "hashtags"
-    NOMBRE_COLUMNA_MENCIONES = "menciones"
+        :return: numero de tweets cargados en Mongodb
+        """
+        numeroTweets = 0
+        if not self.cerrojoDrenado.acquire(False):  # Ya se esta drenando, no se bloquea a este hilo
+            return numeroTweets
+        try:
+            if self.spool.estaVacio() or not self.manejadorMongodb.estaConectado():
+                return numeroTweets
+            instanteInicio = timeit.default_timer()
+            with self.cerrojoSpool:
+                self.spool.vaciar()
+                self.mongodbCaido = False
+            colecciones = {FicheroEscritorTweets.TIPO_TWEET: self.manejadorMongodb.obtenerColeccionTweets(),
+                           FicheroEscritorTweets.TIPO_TWEETFILTRADO:
+                               self.manejadorMongodb.obtenerColeccionTweetsFiltrados()}
+            try:
+                for tipo, coleccion in colecciones.items():
+                    for segmento in self.spool.obtenerSegmentos(tipo, soloCerrados=True):
+                        tweets = self.spool.iterarTweetsSegmento(segmento)
+                        while True:
+                            # Los tweets del spool escritos por versiones anteriores no tienen la fecha
+                            lote = [self.ponerFecha(tweet) for tweet in
+                                    islice(tweets, MongodbEscritorTweets.TAMANYO_LOTE_DRENADO)]
+                            if not lote:
+                                break
+                            try:
+                                self.escribirLote(lote, coleccion)
+                            except TwiterExcepcion as e:
+                                if e.terminarPrograma:
+                                    raise e
+                                self.anotarMetricasSpool(erroresDrenado=1)  # Tweets que Mongodb no acepta
+                            numeroTweets += len(lote)
+                            self.anotarMetricasSpool(tweetsDrenados=len(lote))
+                        self.spool.borrarSegmento(segmento)
+            except TwiterExcepcion:  # Mongodb ha dejado de responder, se seguira en el siguiente drenado
+                pass
+            finally:
+                self.anotarMetricasSpool(segundosDrenado=timeit.default_timer() - instanteInicio)
+        finally:
+            self.cerrojoDrenado.release()
+        return numeroTweets
+
+    def drenarSpoolPeriodicamente(self):
+        """
+        Bucle del hilo de drenado: cada intervaloDrenado segundos intenta cargar el spool en Mongodb con drenarSpool
+        hasta que se llama a detenerDrenado. Si los indices no se pudieron asegurar al crear el escritor, tambien se
+        intenta con asegurarIndices.
+        """
+        while not self.detenerHiloDrenado.wait(self.intervaloDrenado):
+            try:
+                self.asegurarIndices()
+                self.drenarSpool()
+            except Exception:  # El hilo no puede morir, se intentara en el siguiente drenado
+                self.anotarMetricasSpool(erroresDrenado=1)
+
+    def detenerDrenado(self):
+        """
+        Para el hilo de drenado. Los tweets que queden en el spool se cargaran la siguiente vez.
+        """
+        if self.hiloDrenado is not None:
+            self.detenerHiloDrenado.set()
+            self.hiloDrenado.join()
+            self.hiloDrenado = None
 
-    def pasearTodosTweetsFiltradoEnPandas(self):
+    def anotarMetricasSpool(self, **metricas):
         """
-        Parsea todos los tweets almacenados y los convierte en pandas.
-        Se obtiene usuarios, texto, fecha de creacion, localizacion del texto (no del usuario) y lenguaje
-        Se crea un nuevo campo en el tweet llamado _id con el valor del id del tweet para que sea utilizado como id
-        del documento.
+        Suma los valores a las metricas del spool. Se puede llamar desde varios hilos a la vez.
 
-        Ademas, se anyade el numero de caracteres y palabras en el texto. Para ello, se eliminan todos los emoticonos,
-        menciones, hashtags y urls, se calcula el numero de palabras en este texto y luego se anyade por cada
-        emoticonos, mencion, hashtag y url.
+        :param metricas: nombre de la metrica y valor a sumar
+        """
+        with self.cerrojoSpool:
+            self.metricasSpool.update(metricas)
 
-        El pandas se guarda en la variable local pdTweetsFiltrado.
+    def obtenerMetricasSpool(self):
         """
-        pass
+        Obtiene las metricas del spool: numero de caidas de Mongodb, tweets escritos en el spool, tweets cargados
+        en Mongodb, tweets descartados por tener el spool lleno, errores al cargar, segundos cargando, bytes que
+        ocupa el spool y si Mongodb sigue caido.
 
-    def anyadirHoraMinuto(self):
+        :return: diccionario con las metricas o None si no hay spool
         """
-        Anyade la hora del tweet y el minuto de la creacion del tweet en el pandas pdTweetsFiltrado.
+        if self.spool is None:
+            return None
+        with self.cerrojoSpool:
+            metricas = dict(self.metricasSpool)
+        metricas["bytesSpool"] = self.spool.obtenerBytes()
+        metricas["mongodbCaido"] = self.mongodbCaido
+        return metricas
+
+    def contarTweets(self, escritos=0, duplicados=0):
         """
-        if len(self.pdTweetsFiltrado) > 0:
-            self.pdTweetsFiltrado[ParseadorTweetsAPandas.NOMBRE_COLUMNA_HORA] = self.pdTweetsFiltrado[
-                ParseadorTweetsAPandas.NOMBRE_COLUMNA_FECHACREACION].apply(
-                lambda fecha: dateutil.parser.parse(fecha).hour if fecha else None)
+        Actualiza los contadores de tweets escritos y duplicados. Se puede llamar desde varios hilos a la vez.
 
-            self.pdTweetsFiltrado[ParseadorTweetsAPandas.NOMBRE_COLUMNA_MINUTO] = self.pdTweetsFiltrado[
-                ParseadorTweetsAPandas.NOMBRE_COLUMNA_FECHACREACION].apply(
-                lambda fecha: dateutil.parser.parse(fecha).minute if fecha else None)
+        :param escritos: numero de tweets escritos a sumar
+        :param duplicados: numero de tweets duplicados a sumar
+        """
+        with self.cerrojo:
+            self.numeroTweetsEscritos += escritos
+            self.numeroTweetsDuplicados += duplicados
 
-    def anyadirEmoticonosHashtagsMenciones(self):
+    def borrarContenido(self):
         """
-        Anyade la los emoticonos, hashtags y menciones que contiene el texto en el pandas pdTweetsFiltrado. Estos son
-        listas.
+        Borra el contenido de ambas colecciones en Mongodb: tweets parseados y no parseados. Si hay algun problema
+        lanzara una excepcion para terminar el programa.
         """
-        if len(self.pdTweetsFiltrado) > 0:
-            utilidadPatternTexto = UtilidadPatternTexto()
+        try:
+            coleccionTweet = self.manejadorMongodb.obtenerColeccionTweets()
+            coleccionTweet.drop()
+            coleccionTweet = self.manejadorMongodb.obtenerColeccionTweetsFiltrados()
+            coleccionTweet.drop()
+        except pymongo.errors.ServerSelectionTimeoutError:
+            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_CONECTADO_MONGODB, terminarPrograma=True)
 
-            self.pdTweetsFiltrado[ParseadorTweetsAPandas.NOMBRE_COLUMNA_EMOTICONOS] = self.pdTweetsFiltrado[
-                ParseadorTweetsAPandas.NOMBRE_COLUMNA_TEXTO].apply(
-                lambda texto: utilidadPatternTexto.obtenerEmoticonosEnTexto(texto) if texto in texto else [])
 
-            self.pdTweetsFiltrado[ParseadorTweetsAPandas.NOMBRE_COLUMNA_HASHTAGS] = self.pdTweetsFiltrado[
-                ParseadorTweetsAPandas.NOMBRE_COLUMNA_TEXTO].apply(
-                lambda texto: utilidadPatternTexto.obtenerHashtagsEnTexto(texto) if texto in texto else [])
+class FicheroEscritorTweets(EscritorTweets):
+    """
+    Clase para escribir tweets en ficheros locales y que hereda de EscritorTweets, por lo que se puede utilizar en
+    lugar de MongodbEscritorTweets sin depender de una base de datos. Como en Mongodb, el _id del tweet sera su id.
 
-            self.pdTweetsFiltrado[ParseadorTweetsAPandas.NOMBRE_COLUMNA_MENCIONES] = self.pdTweetsFiltrado[
-                ParseadorTweetsAPandas.NOMBRE_COLUMNA_TEXTO].apply(
-                lambda texto: utilidadPatternTexto.obtenerMencionesEnTexto(texto) if texto in texto else [])
+    Los tweets no parseados y los parseados se anyaden a segmentos distintos: ficheros NDJSON (un tweet en JSON por
+    linea) comprimidos con gzip o con zstd si esta instalado zstandard. Los tipos que no son JSON (fechas, ObjectId)
+    se escriben en JSON extendido de Mongodb con bson.json_util, por lo que los tweets se leen igual que se
+    escribieron. Un segmento se cierra y se empieza otro cuando se han escrito tamanyoSegmento bytes sin comprimir,
+    cuando han pasado segundosSegmento desde que se abrio o al vaciar. El tamanyo y el tiempo se comprueban cada vez
+    que se escribe un tweet.
 
+    Los segmentos cerrados se apuntan en un manifiesto (manifiesto.json en el directorio) con el numero de tweets,
+    los bytes, el menor y el mayor id y el instante de apertura y cierre. Con politicaSincronizacion se elige cuando
+    se fuerza la escritura en el disco con fsync (ver POLITICAS_SINCRONIZACION).
 
-class MongodbParseadorTweetsAPandas(ParseadorTweetsAPandas):
-    """
-    Clase que hereda de ParseadorTweetsAPandas y que lee los tweets parseados en Mongodb y los convierte en panda.
+    Los tweets de los segmentos se pueden leer con iterarTweets, incluidos los del segmento que estaba abierto si el
+    programa se paro sin cerrarlo (hasta la ultima sincronizacion), y cargar mas tarde en otro escritor, por ejemplo
+    en Mongodb, con volcarEn. Se puede escribir desde varios hilos a la vez.
 
     Metodos disponibles:
-        * pasearTodosTweetsFiltradoEnPandas: parsea todos los tweets almacenados en Mongodb y los convierte en pandas.
-        * parsearTweet: parsea un tweet individual y lo covierte un diccionario con los key-valores del panda.
+        * escribirTweet: escribe un tweet en formato JSON no parseados
+        * escribirTweetFiltrado: escribe un tweet en formato JSON parseado
+        * escribir: escribe un tweet en el segmento abierto de un tipo
+        * vaciar: cierra los segmentos abiertos y los apunta en el manifiesto
+        * sincronizar: fuerza la escritura en el disco del segmento abierto de un tipo
+        * abrirSegmento: abre un segmento nuevo de un tipo
+        * cerrarSegmento: cierra el segmento abierto de un tipo y lo apunta en el manifiesto
+        * leerManifiesto: lee los segmentos cerrados apuntados en el manifiesto
+        * guardarManifiesto: guarda el manifiesto
+        * obtenerSegmentos: obtiene los ficheros de los segmentos de un tipo ordenados
+        * obtenerBytes: obtiene los bytes que ocupan los segmentos
+        * estaVacio: comprueba si no hay ningun segmento
+        * borrarSegmento: borra un segmento cerrado y lo quita del manifiesto
+        * iterarTweets: generador que devuelve los tweets de los segmentos de un tipo
+        * iterarTweetsSegmento: generador que devuelve los tweets de un segmento
+        * iterarLineas: generador que devuelve las lineas de un segmento
+        * volcarEn: escribe los tweets de los segmentos en otro escritor
+        * borrarContenido: borra todos los segmentos y el manifiesto
     """
 
-    def __init__(self, manejadorMongodb):
+    TIPO_TWEET = ManejadorMongodb.COLECCION_NOMBRE_TWEET  # Tipo de los segmentos de tweets no parseados
+    TIPO_TWEETFILTRADO = ManejadorMongodb.COLECCION_NOMBRE_TWEETFILTRADO  # Tipo de los segmentos de tweets parseados
+    TAMANYO_SEGMENTO = 64 * 1024 * 1024  # Bytes sin comprimir a partir de los que se cierra un segmento
+    SEGUNDOS_SEGMENTO = 3600.0  # Segundos a partir de los que se cierra un segmento
+    COMPRESION_GZIP = "gzip"
+    COMPRESION_ZSTD = "zstd"
+    # Extension de los segmentos de cada compresion
+    EXTENSIONES = {COMPRESION_GZIP: ".ndjson.gz", COMPRESION_ZSTD: ".ndjson.zst"}
+    # Politicas de sincronizacion: nunca se hace fsync (lo decide el sistema operativo), se hace al cerrar cada
+    # segmento o, ademas, cada intervaloSincronizacion segundos en el segmento abierto
+    SINCRONIZACION_NUNCA = "nunca"
+    SINCRONIZACION_SEGMENTO = "segmento"
+    SINCRONIZACION_INTERVALO = "intervalo"
+    POLITICAS_SINCRONIZACION = (SINCRONIZACION_NUNCA, SINCRONIZACION_SEGMENTO, SINCRONIZACION_INTERVALO)
+    INTERVALO_SINCRONIZACION = 1.0  # Segundos entre sincronizaciones con SINCRONIZACION_INTERVALO
+    FICHERO_MANIFIESTO = "manifiesto.json"
+    # Nombre de los segmentos: tipo, numero de segmento y extension
+    NOMBRE_SEGMENTO_PATTERN = re.compile(r"^(.+)-(\d+)(\.ndjson\.(?:gz|zst))$")
+    TAMANYO_LECTURA = 1024 * 1024  # Bytes comprimidos que se leen de una vez al leer un segmento
+    # Las fechas se leen sin zona horaria (en UTC), igual que las devuelve pymongo
+    OPCIONES_JSON = json_util.JSONOptions(tz_aware=False)
+
+    def __init__(self, directorio, vaciarAnterioresColecciones=False, compresion=None,
+                 tamanyoSegmento=TAMANYO_SEGMENTO, segundosSegmento=SEGUNDOS_SEGMENTO,
+                 politicaSincronizacion=SINCRONIZACION_SEGMENTO, intervaloSincronizacion=INTERVALO_SINCRONIZACION):
         """
-        Crea el objeto para convertir los tweets parseados almacenados en Mongodb (JSON) en pandas
+        Crea el objeto para escribir tweets en segmentos de un directorio. Si el directorio no existe se crea. Si ya
+        tiene segmentos se continua con la numeracion.
+        Lanzara una excepcion para terminar el programa si se pide zstd y no esta instalado zstandard.
+
+        :param directorio: directorio donde se escriben los segmentos y el manifiesto
+        :param vaciarAnterioresColecciones: True si se quieren borrar los segmentos anteriores
+        :param compresion: COMPRESION_GZIP o COMPRESION_ZSTD. Si es None (por defecto) se utiliza zstd si esta
+            instalado zstandard y si no gzip
+        :param tamanyoSegmento: bytes sin comprimir a partir de los que se cierra un segmento
+        :param segundosSegmento: segundos a partir de los que se cierra un segmento
+        :param politicaSincronizacion: cuando se hace fsync (ver POLITICAS_SINCRONIZACION). Por defecto al cerrar
+            cada segmento
+        :param intervaloSincronizacion: segundos entre sincronizaciones con SINCRONIZACION_INTERVALO
+        """
+        if compresion is None:
+            compresion = FicheroEscritorTweets.COMPRESION_ZSTD if zstandard is not None else \
+                FicheroEscritorTweets.COMPRESION_GZIP
+        if compresion == FicheroEscritorTweets.COMPRESION_ZSTD and zstandard is None:
+            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_SIN_ZSTANDARD, terminarPrograma=True)
+        if politicaSincronizacion not in FicheroEscritorTweets.POLITICAS_SINCRONIZACION:
+            raise ValueError("politicaSincronizacion tiene que ser una de %s" %
+                             (FicheroEscritorTweets.POLITICAS_SINCRONIZACION,))
+        self.directorio = directorio
+        self.compresion = compresion
+        self.tamanyoSegmento = tamanyoSegmento
+        self.segundosSegmento = segundosSegmento
+        self.politicaSincronizacion = politicaSincronizacion
+        self.intervaloSincronizacion = intervaloSincronizacion
+        self.segmentosAbiertos = dict()  # Tipo -> diccionario con el fichero, el compresor y los datos del segmento
+        self.numeroTweetsEscritos = 0
+        self.numeroTweetsDuplicados = 0  # Los ficheros no detectan duplicados, se mantiene por compatibilidad
+        self.cerrojo = threading.RLock()  # Permite escribir desde varios hilos a la vez
+        if not os.path.isdir(directorio):
+            os.makedirs(directorio)
+        self.manifiesto = self.leerManifiesto()
+        numerosSegmento = [int(FicheroEscritorTweets.NOMBRE_SEGMENTO_PATTERN.match(nombre).group(2)) for nombre in
+                           os.listdir(directorio) if FicheroEscritorTweets.NOMBRE_SEGMENTO_PATTERN.match(nombre)]
+        self.siguienteNumeroSegmento = max(numerosSegmento) + 1 if numerosSegmento else 1
+        # Bytes de los segmentos cerrados en el directorio, esten o no en el manifiesto (ver obtenerBytes). Se
+        # actualizan al cerrar y borrar segmentos para no tener que recorrer el directorio en cada escritura
+        self.bytesSegmentosCerrados = sum(
+            os.path.getsize(segmento) for tipo in (FicheroEscritorTweets.TIPO_TWEET,
+                                                   FicheroEscritorTweets.TIPO_TWEETFILTRADO)
+            for segmento in self.obtenerSegmentos(tipo))
+        if vaciarAnterioresColecciones:
+            self.borrarContenido()
 
-        :param manejadorMongodb: manejador de Mongodb para obtener las colecciones
+    def escribirTweet(self, tweetJson):
         """
-        self.manejadorMongodb = manejadorMongodb
-        self.pdTweetsFiltrado = pd.DataFrame()
+        Escribe un tweet no parseado en el segmento abierto de tweets no parseados.
 
-    def pasearTodosTweetsFiltradoEnPandas(self):
+        :param tweetJson: tweet en formato JSON no parseado para ser guardado
         """
-        Lee todos los tweets parseados almacenados en Mongodb y los convierte en Pandas. Se almacenara en la
-        variable del objeto pdTweetsFiltrado.
-        Lanzara una excepcion para terminar el programa si no se puede conectar a Mongodb.
+        self.escribir(tweetJson, FicheroEscritorTweets.TIPO_TWEET)
+
+    def escribirTweetFiltrado(self, tweetJson):
         """
-        try:
-            tweets = self.manejadorMongodb.obtenerColeccionTweetsFiltrados().find({})
-            for tweet in tweets:
-                self.pdTweetsFiltrado = self.pdTweetsFiltrado.append(
-                    pd.Series(self.parsearTweet(tweet), name=tweet["id_str"]))
-        except pymongo.errors.ServerSelectionTimeoutError:
-            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_CONECTADO_MONGODB, terminarPrograma=True)
+        Escribe un tweet parseado en el segmento abierto de tweets parseados.
 
-    def parsearTweet(self, tweet):
+        :param tweetJson: tweet en formato JSON parseado para ser guardado
         """
-        Pasa a diccionario el tweet para ser almacenado en pandas.
+        self.escribir(tweetJson, FicheroEscritorTweets.TIPO_TWEETFILTRADO)
 
-        Ademas, se anyade el numero de caracteres y palabras en el texto. Para ello, se eliminan todos los emoticonos,
+    def escribir(self, tweetJson, tipo):
+        """
+        Escribe un tweet como una linea de JSON en el segmento abierto de un tipo. Si no hay segmento abierto se abre
+        uno. Si despues de escribir el segmento ha llegado a tamanyoSegmento bytes o a segundosSegmento segundos se
+        cierra.
+        Lanzara una excepcion para terminar el programa si no se puede escribir en el fichero.
+
+        :param tweetJson: tweet en formato JSON para ser guardado
+        :param tipo: tipo de segmento (TIPO_TWEET o TIPO_TWEETFILTRADO)
+        """
+        linea = json.dumps(self.ponerId(tweetJson), default=json_util.default)
+        if not isinstance(linea, bytes):
+            linea = linea.encode("utf-8")
+        linea += b"\n"
+        with self.cerrojo:
+            try:
+                segmento = self.segmentosAbiertos.get(tipo) or self.abrirSegmento(tipo)
+                segmento["compresor"].write(linea)
+                segmento["numeroTweets"] += 1
+                segmento["bytesSinComprimir"] += len(linea)
+                if "_id" in tweetJson:
+                    segmento["primerId"] = tweetJson["_id"] if segmento["primerId"] is None else min(
+                        segmento["primerId"], tweetJson["_id"])
+                    segmento["ultimoId"] = tweetJson["_id"] if segmento["ultimoId"] is None else max(
+                        segmento["ultimoId"], tweetJson["_id"])
+                self.numeroTweetsEscritos += 1
+
+                instante = time.time()
+                if segmento["bytesSinComprimir"] >= self.tamanyoSegmento or \
+                        instante - segmento["instanteInicio"] >= self.segundosSegmento:
+                    self.cerrarSegmento(tipo)
+                elif self.politicaSincronizacion == FicheroEscritorTweets.SINCRONIZACION_INTERVALO and \
+                        instante - segmento["instanteSincronizacion"] >= self.intervaloSincronizacion:
+                    self.sincronizar(tipo)
+            except (IOError, OSError) as e:
+                raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_ESCRITO_FICHERO % self.directorio,
+                                      errores=str(e), terminarPrograma=True)
+
+    def vaciar(self):
+        """
+        Cierra los segmentos abiertos, por lo que todos los tweets escritos quedan en segmentos completos y apuntados
+        en el manifiesto. Los siguientes tweets se escriben en segmentos nuevos.
+        Lanzara una excepcion para terminar el programa si no se puede escribir en el fichero.
+
+        :return: lista vacia, ya que los ficheros no detectan tweets duplicados
+        """
+        with self.cerrojo:
+            try:
+                for tipo in list(self.segmentosAbiertos):
+                    self.cerrarSegmento(tipo)
+            except (IOError, OSError) as e:
+                raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_ESCRITO_FICHERO % self.directorio,
+                                      errores=str(e), terminarPrograma=True)
+        return []
+
+    def sincronizar(self, tipo, forzarDisco=True):
+        """
+        Escribe en el fichero lo que tenga el compresor del segmento abierto de un tipo de forma que se pueda leer
+        aunque el segmento no se cierre y, si forzarDisco es True, fuerza la escritura en el disco con fsync.
+
+        :param tipo: tipo de segmento
+        :param forzarDisco: True (por defecto) para hacer fsync
+        """
+        with self.cerrojo:
+            segmento = self.segmentosAbiertos.get(tipo)
+            if segmento is None:
+                return
+            if self.compresion == FicheroEscritorTweets.COMPRESION_ZSTD:
+                segmento["compresor"].flush(zstandard.FLUSH_BLOCK)
+            else:
+                segmento["compresor"].flush()  # Por defecto con Z_SYNC_FLUSH
+            segmento["fichero"].flush()
+            if forzarDisco:
+                os.fsync(segmento["fichero"].fileno())
+                segmento["instanteSincronizacion"] = time.time()
+
+    def abrirSegmento(self, tipo):
+        """
+        Abre un segmento nuevo de un tipo con el siguiente numero de segmento.
+
+        :param tipo: tipo de segmento
+        :return: diccionario con el fichero, el compresor y los datos del segmento
+        """
+        nombre = "%s-%06d%s" % (tipo, self.siguienteNumeroSegmento, FicheroEscritorTweets.EXTENSIONES[self.compresion])
+        self.siguienteNumeroSegmento += 1
+        fichero = open(os.path.join(self.directorio, nombre), "wb")
+        if self.compresion == FicheroEscritorTweets.COMPRESION_ZSTD:
+            compresor = zstandard.ZstdCompressor().stream_writer(fichero)
+        else:
+            compresor = gzip.GzipFile(filename="", mode="wb", fileobj=fichero)
+        instante = time.time()
+        segmento = {"nombre": nombre, "fichero": fichero, "compresor": compresor, "numeroTweets": 0,
+                    "bytesSinComprimir": 0, "primerId": None, "ultimoId": None, "instanteInicio": instante,
+                    "instanteSincronizacion": instante}
+        self.segmentosAbiertos[tipo] = segmento
+        return segmento
+
+    def cerrarSegmento(self, tipo):
+        """
+        Cierra el segmento abierto de un tipo y lo apunta en el manifiesto. Con SINCRONIZACION_SEGMENTO o
+        SINCRONIZACION_INTERVALO se hace fsync del segmento y del manifiesto.
+
+        :param tipo: tipo de segmento
+        """
+        with self.cerrojo:
+            segmento = self.segmentosAbiertos.pop(tipo, None)
+            if segmento is None:
+                return
+            if self.compresion == FicheroEscritorTweets.COMPRESION_ZSTD:
+                segmento["compresor"].flush(zstandard.FLUSH_FRAME)
+            else:
+                segmento["compresor"].close()  # Escribe el final del gzip sin cerrar el fichero
+            segmento["fichero"].flush()
+            if self.politicaSincronizacion != FicheroEscritorTweets.SINCRONIZACION_NUNCA:
+                os.fsync(segmento["fichero"].fileno())
+            segmento["fichero"].close()
+
+            bytesSegmento = os.path.getsize(os.path.join(self.directorio, segmento["nombre"]))
+            self.bytesSegmentosCerrados += bytesSegmento
+            self.manifiesto.append({"fichero": segmento["nombre"],
+                                    "tipo": tipo,
+                                    "compresion": self.compresion,
+                                    "numeroTweets": segmento["numeroTweets"],
+                                    "bytes": bytesSegmento,
+                                    "bytesSinComprimir": segmento["bytesSinComprimir"],
+                                    "primerId": segmento["primerId"],
+                                    "ultimoId": segmento["ultimoId"],
+                                    "instanteInicio": segmento["instanteInicio"],
+                                    "instanteFin": time.time()})
+            self.guardarManifiesto()
+
+    def leerManifiesto(self):
+        """
+        Lee los segmentos cerrados apuntados en el manifiesto del directorio.
+
+        :return: lista con un diccionario por segmento cerrado o una lista vacia si no hay manifiesto
+        """
+        ficheroManifiesto = os.path.join(self.directorio, FicheroEscritorTweets.FICHERO_MANIFIESTO)
+        if not os.path.exists(ficheroManifiesto):
+            return list()
+        with open(ficheroManifiesto, "r") as fichero:
+            return json.load(fichero)["segmentos"]
+
+    def guardarManifiesto(self):
+        """
+        Guarda el manifiesto. Se escribe primero en un fichero temporal para no dejarlo a medias si el programa se
+        para.
+        """
+        ficheroManifiesto = os.path.join(self.directorio, FicheroEscritorTweets.FICHERO_MANIFIESTO)
+        ficheroTemporal = ficheroManifiesto + ".tmp"
+        with open(ficheroTemporal, "w") as fichero:
+            json.dump({"segmentos": self.manifiesto}, fichero, indent=1)
+            fichero.flush()
+            if self.politicaSincronizacion != FicheroEscritorTweets.SINCRONIZACION_NUNCA:
+                os.fsync(fichero.fileno())
+        reemplazarFichero(ficheroTemporal, ficheroManifiesto)
+
+    def obtenerSegmentos(self, tipo, soloCerrados=False):
+        """
+        Obtiene los ficheros de los segmentos de un tipo que hay en el directorio ordenados por numero de segmento,
+        esten o no en el manifiesto.
+
+        :param tipo: tipo de segmento
+        :param soloCerrados: True para no incluir el segmento abierto. Por defecto es False
+        :return: lista con las rutas de los segmentos
+        """
+        with self.cerrojo:
+            nombresAbiertos = set(segmento["nombre"] for segmento in self.segmentosAbiertos.values()) \
+                if soloCerrados else set()
+            segmentos = list()
+            for nombre in os.listdir(self.directorio):
+                nombreSegmento = FicheroEscritorTweets.NOMBRE_SEGMENTO_PATTERN.match(nombre)
+                if nombreSegmento and nombreSegmento.group(1) == tipo and nombre not in nombresAbiertos:
+                    segmentos.append((int(nombreSegmento.group(2)), os.path.join(self.directorio, nombre)))
+        return [segmento for _, segmento in sorted(segmentos)]
+
+    def obtenerBytes(self):
+        """
+        Obtiene los bytes que ocupan los segmentos en el disco: los cerrados segun su tamanyo en el directorio,
+        incluidos los que no estan en el manifiesto porque el programa se paro sin cerrarlos, y los abiertos segun
+        lo que se ha escrito en el fichero.
+
+        :return: numero de bytes
+        """
+        with self.cerrojo:
+            return self.bytesSegmentosCerrados + sum(
+                segmento["fichero"].tell() for segmento in self.segmentosAbiertos.values())
+
+    def estaVacio(self):
+        """
+        Comprueba si no hay ningun segmento, ni abierto ni cerrado.
+
+        :return: True si no hay segmentos y False en caso contrario
+        """
+        with self.cerrojo:
+            return not self.segmentosAbiertos and not self.obtenerSegmentos(FicheroEscritorTweets.TIPO_TWEET) and \
+                not self.obtenerSegmentos(FicheroEscritorTweets.TIPO_TWEETFILTRADO)
+
+    def borrarSegmento(self, segmento):
+        """
+        Borra un segmento cerrado y lo quita del manifiesto, por ejemplo despues de cargar sus tweets en Mongodb.
+
+        :param segmento: ruta del segmento
+        """
+        with self.cerrojo:
+            nombre = os.path.basename(segmento)
+            self.bytesSegmentosCerrados -= os.path.getsize(segmento)
+            os.remove(segmento)
+            self.manifiesto = [entrada for entrada in self.manifiesto if entrada["fichero"] != nombre]
+            self.guardarManifiesto()
+
+    def iterarTweets(self, tipo=TIPO_TWEETFILTRADO):
+        """
+        Generador que devuelve los tweets de todos los segmentos de un tipo en el orden en el que se escribieron.
+        Del segmento abierto o de un segmento que no se cerro porque el programa se paro se devuelven los tweets
+        hasta donde se pueda leer.
+
+        :param tipo: tipo de segmento. Por defecto los tweets parseados
+        :return: generador de tweets en formato JSON
+        """
+        with self.cerrojo:  # Lo que haya escrito del segmento abierto tiene que estar en el fichero
+            self.sincronizar(tipo, forzarDisco=False)
+        for segmento in self.obtenerSegmentos(tipo):
+            for tweet in self.iterarTweetsSegmento(segmento):
+                yield tweet
+
+    def iterarTweetsSegmento(self, segmento):
+        """
+        Generador que devuelve los tweets de un segmento. Si el segmento esta incompleto se devuelven los tweets
+        hasta donde se pueda leer.
+
+        :param segmento: ruta del segmento
+        :return: generador de tweets en formato JSON
+        """
+        for linea in self.iterarLineas(segmento):
+            yield json.loads(linea.decode("utf-8"), object_hook=lambda documento: json_util.object_hook(
+                documento, FicheroEscritorTweets.OPCIONES_JSON))
+
+    def iterarLineas(self, segmento):
+        """
+        Generador que devuelve las lineas completas de un segmento. Si el segmento esta incompleto (no se cerro) se
+        devuelven las lineas hasta donde se pueda descomprimir.
+
+        :param segmento: ruta del segmento
+        :return: generador de lineas en bytes sin el salto de linea
+        """
+        # Se descomprime con un objeto de descompresion en lugar de abrir el fichero comprimido porque este devuelve
+        # todo lo que se puede descomprimir sin dar error aunque el segmento este incompleto
+        if segmento.endswith(FicheroEscritorTweets.EXTENSIONES[FicheroEscritorTweets.COMPRESION_ZSTD]):
+            if zstandard is None:
+                raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_SIN_ZSTANDARD, terminarPrograma=True)
+            descompresor = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            descompresor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # Con cabecera de gzip
+        with open(segmento, "rb") as fichero:
+            resto = b""
+            while True:
+                datosComprimidos = fichero.read(FicheroEscritorTweets.TAMANYO_LECTURA)
+                if not datosComprimidos:
+                    return  # Si queda resto es una ultima linea incompleta
+                try:
+                    datos = descompresor.decompress(datosComprimidos)
+                except (zlib.error, zstandard.ZstdError if zstandard is not None else zlib.error):
+                    return  # El segmento esta corrupto a partir de aqui
+                lineas = (resto + datos).split(b"\n")
+                resto = lineas.pop()
+                for linea in lineas:
+                    if linea:
+                        yield linea
+
+    def volcarEn(self, escritorTweets, tipos=(TIPO_TWEET, TIPO_TWEETFILTRADO)):
+        """
+        Escribe los tweets de los segmentos en otro escritor, por ejemplo para cargarlos en Mongodb con un
+        MongodbEscritorTweets por lotes. Los tweets que el otro escritor no escribe por estar duplicados se saltan.
+        Al terminar se vacia el otro escritor.
+
+        :param escritorTweets: escritor en el que se escriben los tweets
+        :param tipos: tipos de segmento que se escriben. Por defecto todos
+        :return: numero de tweets leidos de los segmentos
+        """
+        numeroTweets = 0
+        for tipo in tipos:
+            escribir = escritorTweets.escribirTweet if tipo == FicheroEscritorTweets.TIPO_TWEET else \
+                escritorTweets.escribirTweetFiltrado
+            for tweet in self.iterarTweets(tipo):
+                try:
+                    escribir(tweet)
+                except TwiterExcepcion as e:
+                    if e.terminarPrograma:
+                        raise e
+                numeroTweets += 1
+        escritorTweets.vaciar()
+        return numeroTweets
+
+    def borrarContenido(self):
+        """
+        Borra todos los segmentos, abiertos o cerrados, y el manifiesto.
+        """
+        with self.cerrojo:
+            for segmento in self.segmentosAbiertos.values():
+                segmento["fichero"].close()
+            self.segmentosAbiertos = dict()
+            for tipo in (FicheroEscritorTweets.TIPO_TWEET, FicheroEscritorTweets.TIPO_TWEETFILTRADO):
+                for segmento in self.obtenerSegmentos(tipo):
+                    os.remove(segmento)
+            self.bytesSegmentosCerrados = 0
+            self.manifiesto = list()
+            self.guardarManifiesto()
+
+
+class ParseadorTweetsAPandas(object):
+    """
+    Interfaz que tendrian que heredar todas las clases que se quieran utilizar para leer tweets en disco.
+    Solo se utilizaran los tweets parseados.
+
+    Metodos disponibles:
+        * pasearTodosTweetsFiltradoEnPandas: parsea todos los tweets almacenados y los convierte en pandas.
+            Se obtiene usuarios, texto, fecha de creacion, localizacion del texto (no del usuario) y lenguaje.
+        * anyadirHoraMinuto: anyade la fecha (datetime64), la hora y el minuto al pandas en distintas columnas
+        * parsearFechaConDateutil: parsea una fecha que no sigue el formato de Twitter
+        * anyadirEmoticonosHashtagsMenciones: anyade los emoticonos, hashtags y menciones del texto en pandas a
+            partir del texto. Estos seran listas de emoticonos, hashtags y menciones.
+        * anyadirCaracteristicasTexto: anyade de una vez el numero de caracteres y palabras, y los emoticonos,
+            hashtags y menciones recorriendo cada texto una unica vez.
+        * completarConTexto: obtiene una columna de entidades, sacando del texto las de los tweets sin entidades.
+        * enriquecerComo: anyade a unos tweets nuevos las mismas columnas calculadas que tiene otro pandas.
+        * guardarCache: guarda el pandas en un fichero Parquet junto con la coleccion y la marca de agua.
+        * leerCache: lee un pandas guardado con guardarCache.
+        * convertirTweetsEnPandas: convierte un iterable de tweets en pandas creando el pandas una unica vez.
+        * parsearTweet: parsea un tweet individual y lo covierte un diccionario con los key-valores del panda.
+        * obtenerEntidadesTweet: obtiene los hashtags, menciones y urls de las entidades del tweet.
+    """
+
+    # Nombre de las columnas del pandas
+    NOMBRE_COLUMNA_USUARIO = "usuario"
+    NOMBRE_COLUMNA_FECHACREACION = "fecha_creacion"
+    NOMBRE_COLUMNA_FECHA = "fecha"  # Fecha de creacion en formato datetime64 (UTC)
+    NOMBRE_COLUMNA_TEXTO = "texto"
+    NOMBRE_COLUMNA_LOCALIZACION = "localizacion"
+    NOMBRE_COLUMNA_NUMEROPALABRAS = "numero_palabras"
+    NOMBRE_COLUMNA_NUMEROCARACTERES = "numero_caracteres"
+    NOMBRE_COLUMNA_HORA = "hora"
+    NOMBRE_COLUMNA_MINUTO = "minuto"
+    NOMBRE_COLUMNA_LENGUAJE = "lenguaje"
+    NOMBRE_COLUMNA_EMOTICONOS = "emoticonos"
+    NOMBRE_COLUMNA_HASHTAGS = "hashtags"
+    NOMBRE_COLUMNA_MENCIONES = "menciones"
+    NOMBRE_COLUMNA_URLS = "urls"
+
+    # Formato de la fecha de creacion (created_at) de los tweets. Siempre esta en UTC
+    FORMATO_FECHA_TWITTER = "%a %b %d %H:%M:%S +0000 %Y"
+
+    # Columnas cuyos valores son listas
+    COLUMNAS_LISTA = (NOMBRE_COLUMNA_EMOTICONOS, NOMBRE_COLUMNA_HASHTAGS, NOMBRE_COLUMNA_MENCIONES, NOMBRE_COLUMNA_URLS)
+    # Columnas que se crean con las entidades que Twitter ya ha sacado del texto (ver obtenerEntidadesTweet):
+    # (columna, entidad, campo de la entidad, prefijo). Los hashtags y las menciones llevan el prefijo para que sean
+    # iguales que los que se obtienen del texto
+    ENTIDADES_COLUMNAS = ((NOMBRE_COLUMNA_HASHTAGS, "hashtags", "text", u"#"),
+                          (NOMBRE_COLUMNA_MENCIONES, "user_mentions", "screen_name", u"@"),
+                          (NOMBRE_COLUMNA_URLS, "urls", "expanded_url", u""))
+    # Key de los metadatos del fichero Parquet de la cache donde se guardan la coleccion y la marca de agua
+    METADATOS_CACHE = b"tweetanalysis"
+
+    # UtilidadPatternTexto con el que se parsean y enriquecen los tweets. Las clases hijas crean el suyo con la
+    # CacheCaracteristicasTexto que se les indique, asi parsearTweet y anyadirCaracteristicasTexto comparten la cache
+    utilidadPatternTexto = UtilidadPatternTexto()
+
+    def pasearTodosTweetsFiltradoEnPandas(self):
+        """
+        Parsea todos los tweets almacenados y los convierte en pandas.
+        Se obtiene usuarios, texto, fecha de creacion, localizacion del texto (no del usuario) y lenguaje
+        Se crea un nuevo campo en el tweet llamado _id con el valor del id del tweet para que sea utilizado como id
+        del documento.
+
+        Ademas, se anyade el numero de caracteres y palabras en el texto. Para ello, se eliminan todos los emoticonos,
+        menciones, hashtags y urls, se calcula el numero de palabras en este texto y luego se anyade por cada
+        emoticonos, mencion, hashtag y url.
+
+        El pandas se guarda en la variable local pdTweetsFiltrado.
+        """
+        pass
+
+    def anyadirHoraMinuto(self, pdTweets=None):
+        """
+        Anyade la hora del tweet y el minuto de la creacion del tweet en el pandas pdTweetsFiltrado.
+
+        Las fechas se convierten una unica vez a datetime64 (UTC) con pd.to_datetime y el formato fijo de Twitter
+        (ver FORMATO_FECHA_TWITTER), y se guardan en la columna NOMBRE_COLUMNA_FECHA. La hora y el minuto se obtienen
+        de esta columna. Solo las fechas que no siguen el formato de Twitter se parsean con dateutil.
+
+        :param pdTweets: pandas al que anyadir las columnas. Si es None se utiliza pdTweetsFiltrado
+        :return: el pandas con las nuevas columnas
+        """
+        if pdTweets is None:
+            pdTweets = self.pdTweetsFiltrado
+        if len(pdTweets) > 0:
+            fechasCreacion = pdTweets[ParseadorTweetsAPandas.NOMBRE_COLUMNA_FECHACREACION]
+            fechas = pd.to_datetime(fechasCreacion, format=ParseadorTweetsAPandas.FORMATO_FECHA_TWITTER,
+                                    errors="coerce")
+
+            fechasNoParseadas = fechas.isnull() & fechasCreacion.notnull()
+            if fechasNoParseadas.any():  # Fechas que no siguen el formato de Twitter
+                fechas[fechasNoParseadas] = pd.to_datetime(
+                    fechasCreacion[fechasNoParseadas].apply(self.parsearFechaConDateutil))
+
+            pdTweets[ParseadorTweetsAPandas.NOMBRE_COLUMNA_FECHA] = fechas
+            pdTweets[ParseadorTweetsAPandas.NOMBRE_COLUMNA_HORA] = fechas.dt.hour
+            pdTweets[ParseadorTweetsAPandas.NOMBRE_COLUMNA_MINUTO] = fechas.dt.minute
+        return pdTweets
+
+    def parsearFechaConDateutil(self, fecha):
+        """
+        Parsea una fecha con dateutil. Se utiliza solo para las fechas que no siguen el formato de Twitter.
+
+        :param fecha: fecha en formato texto
+        :return: la fecha en UTC y sin zona horaria o None si no se puede parsear
+        """
+        return parsearFechaConDateutil(fecha)
+
+    def anyadirEmoticonosHashtagsMenciones(self):
+        """
+        Anyade la los emoticonos, hashtags y menciones que contiene el texto en el pandas pdTweetsFiltrado. Estos son
+        listas. Si ya se han anyadido con anyadirCaracteristicasTexto no se vuelve a recorrer el texto. Las columnas
+        de hashtags y menciones que crea parsearTweet con las entidades pueden estar incompletas, por lo que solo se
+        mira la de emoticonos.
+        """
+        if len(self.pdTweetsFiltrado) > 0 and \
+                ParseadorTweetsAPandas.NOMBRE_COLUMNA_EMOTICONOS not in self.pdTweetsFiltrado.columns:
+            self.anyadirCaracteristicasTexto()
+
+    def anyadirCaracteristicasTexto(self, pdTweets=None):
+        """
+        Anyade de una vez el numero de caracteres, el numero de palabras, los emoticonos, los hashtags, las menciones
+        y las urls del texto de todos los tweets. Cada texto se recorre una unica vez con
+        UtilidadPatternTexto.obtenerCaracteristicasTexto y las columnas se crean al final.
+
+        Los hashtags, las menciones y las urls de los tweets con entidades (ver parsearTweet) son los que Twitter ya
+        ha sacado del texto. Solo se utilizan los del texto en los tweets sin entidades (ver completarConTexto).
+
+        :param pdTweets: pandas al que anyadir las columnas. Si es None se utiliza pdTweetsFiltrado
+        :return: el pandas con las nuevas columnas
+        """
+        if pdTweets is None:
+            pdTweets = self.pdTweetsFiltrado
+        if len(pdTweets) > 0:
+            caracteristicas = [self.utilidadPatternTexto.obtenerCaracteristicasTexto(texto) for texto in
+                               pdTweets[ParseadorTweetsAPandas.NOMBRE_COLUMNA_TEXTO]]
+            numeroCaracteres, numeroPalabras, emoticonos, hashtags, menciones, urls = zip(*caracteristicas)
+            hashtags = self.completarConTexto(pdTweets, ParseadorTweetsAPandas.NOMBRE_COLUMNA_HASHTAGS, hashtags)
+            menciones = self.completarConTexto(pdTweets, ParseadorTweetsAPandas.NOMBRE_COLUMNA_MENCIONES, menciones)
+            urls = self.completarConTexto(pdTweets, ParseadorTweetsAPandas.NOMBRE_COLUMNA_URLS, urls)
+
+            pdTweets[ParseadorTweetsAPandas.NOMBRE_COLUMNA_NUMEROCARACTERES] = pd.Series(
+                numeroCaracteres, index=pdTweets.index)
+            pdTweets[ParseadorTweetsAPandas.NOMBRE_COLUMNA_NUMEROPALABRAS] = pd.Series(
+                numeroPalabras, index=pdTweets.index)
+            # Se crean las series como object para que pandas no intente convertir las listas en columnas
+            pdTweets[ParseadorTweetsAPandas.NOMBRE_COLUMNA_EMOTICONOS] = pd.Series(
+                emoticonos, index=pdTweets.index, dtype=object)
+            pdTweets[ParseadorTweetsAPandas.NOMBRE_COLUMNA_HASHTAGS] = pd.Series(
+                hashtags, index=pdTweets.index, dtype=object)
+            pdTweets[ParseadorTweetsAPandas.NOMBRE_COLUMNA_MENCIONES] = pd.Series(
+                menciones, index=pdTweets.index, dtype=object)
+            pdTweets[ParseadorTweetsAPandas.NOMBRE_COLUMNA_URLS] = pd.Series(urls, index=pdTweets.index, dtype=object)
+        return pdTweets
+
+    def completarConTexto(self, pdTweets, columna, elementosTexto):
+        """
+        Obtiene los valores de una columna de entidades. Los tweets que tienen la lista de entidades en la columna
+        (ver obtenerEntidadesTweet) la mantienen y los que no (None o no existe la columna) utilizan la del texto.
+
+        :param pdTweets: pandas con los tweets
+        :param columna: columna de entidades (ver ENTIDADES_COLUMNAS)
+        :param elementosTexto: lista de los elementos del texto de cada tweet, en el orden del pandas
+        :return: lista con la lista de elementos de cada tweet
+        """
+        if columna not in pdTweets.columns:
+            return list(elementosTexto)
+        return [entidades if isinstance(entidades, list) else elementos
+                for entidades, elementos in zip(pdTweets[columna], elementosTexto)]
+
+    def enriquecerComo(self, pdTweets, pdReferencia):
+        """
+        Anyade a unos tweets nuevos las caracteristicas del texto y, si el pandas de referencia ya tiene la fecha,
+        la fecha, la hora y el minuto. Asi los tweets nuevos se pueden juntar con los de referencia y todas las
+        filas tienen las mismas columnas calculadas.
+
+        :param pdTweets: pandas con los tweets nuevos
+        :param pdReferencia: pandas con el que se van a juntar los tweets nuevos
+        :return: el pandas de los tweets nuevos con las nuevas columnas
+        """
+        pdTweets = self.anyadirCaracteristicasTexto(pdTweets)
+        if ParseadorTweetsAPandas.NOMBRE_COLUMNA_FECHA in pdReferencia.columns:
+            pdTweets = self.anyadirHoraMinuto(pdTweets)
+        return pdTweets
+
+    def guardarCache(self, fichero, clave, marcaAgua, pdTweets=None):
+        """
+        Guarda el pandas en un fichero Parquet, con las columnas de listas como listas de Parquet. En los metadatos
+        del fichero se guardan la clave (de que tweets es el pandas, por ejemplo la coleccion) y la marca de agua
+        (el mayor _id de los tweets del pandas). Se escribe primero en un fichero temporal para no dejar la cache
+        a medias si el programa se para.
+        Lanzara una excepcion para terminar el programa si no esta instalado pyarrow.
+
+        :param fichero: ruta del fichero Parquet
+        :param clave: clave de los tweets del pandas
+        :param marcaAgua: mayor _id de los tweets del pandas
+        :param pdTweets: pandas a guardar. Si es None se utiliza pdTweetsFiltrado
+        """
+        if pyarrow is None:
+            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_SIN_PYARROW, terminarPrograma=True)
+        if pdTweets is None:
+            pdTweets = self.pdTweetsFiltrado
+        tabla = pyarrow.Table.from_pandas(pdTweets, preserve_index=True)
+        metadatos = dict(tabla.schema.metadata or {})
+        metadatos[ParseadorTweetsAPandas.METADATOS_CACHE] = json.dumps({"clave": clave, "marcaAgua": marcaAgua})
+        tabla = tabla.replace_schema_metadata(metadatos)
+        ficheroTemporal = fichero + ".tmp"
+        pq.write_table(tabla, ficheroTemporal)
+        reemplazarFichero(ficheroTemporal, fichero)
+
+    def leerCache(self, fichero):
+        """
+        Lee un pandas guardado con guardarCache. El fichero se lee mapeandolo en memoria. Las columnas de listas
+        se convierten de nuevo en listas de Python.
+        Lanzara una excepcion para terminar el programa si no esta instalado pyarrow.
+
+        :param fichero: ruta del fichero Parquet
+        :return: tupla (pandas, clave, marca de agua) o None si no existe el fichero
+        """
+        if pyarrow is None:
+            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_SIN_PYARROW, terminarPrograma=True)
+        if not os.path.exists(fichero):
+            return None
+        tabla = pq.read_table(fichero, memory_map=True)
+        metadatos = json.loads(tabla.schema.metadata[ParseadorTweetsAPandas.METADATOS_CACHE])
+        pdTweets = tabla.to_pandas()
+        for columna in ParseadorTweetsAPandas.COLUMNAS_LISTA:
+            if columna in pdTweets.columns:  # pyarrow las convierte en arrays de numpy
+                pdTweets[columna] = pd.Series(tabla.column(columna).to_pylist(), index=pdTweets.index, dtype=object)
+        return pdTweets, metadatos["clave"], metadatos["marcaAgua"]
+
+    def convertirTweetsEnPandas(self, tweets):
+        """
+        Convierte los tweets en un pandas. Los valores de cada tweet parseado se guardan en una lista por columna y
+        el pandas se crea al final de una sola vez. El indice del pandas es el id_str del tweet. No se calculan las
+        caracteristicas del texto, que se anyaden despues para todos los tweets con anyadirCaracteristicasTexto.
+
+        :param tweets: iterable con los tweets en formato JSON
+        :return: pandas con una fila por tweet
+        """
+        columnas = defaultdict(list)
+        indice = list()
+        for tweet in tweets:
+            # parsearTweet siempre da las mismas keys
+            for nombreColumna, valor in self.parsearTweet(tweet, calcularCaracteristicasTexto=False).items():
+                columnas[nombreColumna].append(valor)
+            indice.append(tweet["id_str"])
+        return pd.DataFrame(columnas, index=indice)
+
+    def parsearTweet(self, tweet, calcularCaracteristicasTexto=True):
+        """
+        Pasa a diccionario el tweet para ser almacenado en pandas.
+
+        Ademas, se anyade el numero de caracteres y palabras en el texto. Para ello, se eliminan todos los emoticonos,
         menciones, hashtags y urls, se calcula el numero de palabras en este texto y luego se anyade por cada
         emoticonos, mencion, hashtag y url. Para obtener el numer de caracteres se eliman los emoticonos, se obtiene
         la longitud y luego se anyade la cantidad de emoticonos en el texto.
 
+        Los hashtags, las menciones y las urls se obtienen de las entidades del tweet (ver obtenerEntidadesTweet). Si
+        el tweet no las tiene, su valor es None y anyadirCaracteristicasTexto los obtendra del texto.
+
         :param tweet: tweet en formato JSON para convertir en un diccionario para ser almacenado en pandas
+        :param calcularCaracteristicasTexto: True si se quiere calcular el numero de caracteres y palabras. False si
+            se van a calcular despues para todos los tweets a la vez con anyadirCaracteristicasTexto
         :return: diccionario con las keys de los nombres de columnas del panda y los valores del tweet.
         """
         tweetEnPdFormato = dict()
@@ -512,38 +2194,623 @@ class MongodbParseadorTweetsAPandas(ParseadorTweetsAPandas):
         tweetEnPdFormato[ParseadorTweetsAPandas.NOMBRE_COLUMNA_LOCALIZACION] = tweet["place"][
             "full_name"] if "place" in tweet and tweet["place"] and "full_name" in tweet["place"] else None
 
-        numeroCaracteres = 0
-        numeroPalabras = 0
-        if "text" in tweet:  # Si hay texto en el tweet
-            texto = tweet["text"]
-            utilidadPatternTexto = UtilidadPatternTexto()
-            textoSinEmoticonos = utilidadPatternTexto.reemplazarEmoticonos(texto)
-            emoticonosEnElTexto = utilidadPatternTexto.obtenerEmoticonosEnTexto(texto)
-            numeroCaracteres = len(textoSinEmoticonos) + len(emoticonosEnElTexto) if textoSinEmoticonos else len(texto)
-            numeroPalabras = utilidadPatternTexto.contarNumeroPalabras(utilidadPatternTexto.limpiarTexto(texto))
+        if calcularCaracteristicasTexto:
+            numeroCaracteres = 0
+            numeroPalabras = 0
+            if "text" in tweet:  # Si hay texto en el tweet
+                numeroCaracteres, numeroPalabras = self.utilidadPatternTexto.obtenerCaracteristicasTexto(
+                    tweet["text"])[:2]
 
-        tweetEnPdFormato[ParseadorTweetsAPandas.NOMBRE_COLUMNA_NUMEROCARACTERES] = numeroCaracteres
-        tweetEnPdFormato[ParseadorTweetsAPandas.NOMBRE_COLUMNA_NUMEROPALABRAS] = numeroPalabras
+            tweetEnPdFormato[ParseadorTweetsAPandas.NOMBRE_COLUMNA_NUMEROCARACTERES] = numeroCaracteres
+            tweetEnPdFormato[ParseadorTweetsAPandas.NOMBRE_COLUMNA_NUMEROPALABRAS] = numeroPalabras
 
         tweetEnPdFormato[ParseadorTweetsAPandas.NOMBRE_COLUMNA_LENGUAJE] = tweet["lang"] if "lang" in tweet else None
+        tweetEnPdFormato.update(self.obtenerEntidadesTweet(tweet))
 
         return tweetEnPdFormato
 
+    def obtenerEntidadesTweet(self, tweet):
+        """
+        Obtiene los hashtags, las menciones y las urls de las entidades que Twitter ya ha sacado del texto del tweet
+        (ver ENTIDADES_COLUMNAS), por lo que no hay que buscarlos en el texto. Las menciones tienen el nombre del
+        usuario tal y como esta en Twitter y las urls son las expandidas. Las entidades de los tweets truncados son
+        las del texto truncado aunque el texto se haya completado despues, por lo que no se utilizan.
+
+        :param tweet: tweet en formato JSON
+        :return: diccionario con las keys de los nombres de columnas y la lista de entidades del tweet, o None si el
+            tweet no tiene esas entidades
+        """
+        entidades = tweet.get("entities") if not tweet.get("truncated") else None
+        entidadesTweet = dict()
+        for columna, entidad, campo, prefijo in ParseadorTweetsAPandas.ENTIDADES_COLUMNAS:
+            if isinstance(entidades, dict) and isinstance(entidades.get(entidad), list):
+                entidadesTweet[columna] = [prefijo + elemento[campo] for elemento in entidades[entidad]
+                                           if isinstance(elemento, dict) and elemento.get(campo)]
+            else:
+                entidadesTweet[columna] = None
+        return entidadesTweet
+
+
+class MongodbParseadorTweetsAPandas(ParseadorTweetsAPandas):
+    """
+    Clase que hereda de ParseadorTweetsAPandas y que lee los tweets parseados en Mongodb y los convierte en panda.
+
+    Si se indica un directorio de cache, el pandas ya enriquecido se guarda en un fichero Parquet por coleccion
+    (ver guardarCache) junto con el mayor _id leido (marca de agua). Las siguientes veces se lee el fichero y solo se
+    piden a Mongodb, se parsean y se enriquecen los tweets nuevos (ver refrescar). Con refrescar tambien se pueden
+    anyadir los tweets que se van escribiendo mientras se analiza, sin volver a leer todos.
+
+    Metodos disponibles:
+        * pasearTodosTweetsFiltradoEnPandas: parsea todos los tweets almacenados en Mongodb y los convierte en pandas.
+        * refrescar: anyade a pdTweetsFiltrado solo los tweets nuevos desde la ultima lectura.
+        * iterarTweetsFiltradoEnPandas: generador que lee los tweets en trozos de pandas ya enriquecidos.
+        * obtenerTweetsEnPandas: lee de Mongodb los tweets de un filtro y los convierte en pandas enriquecido.
+        * obtenerTweetsEnPandasPorFecha: lee los tweets creados en una ventana de tiempo.
+        * obtenerTweetsEnPandasPorLenguaje: lee los tweets de uno o varios lenguajes.
+        * obtenerTweetsEnPandasPorHashtag: lee los tweets con uno o varios hashtags.
+        * crearFiltro: crea el filtro de Mongodb de una ventana de tiempo, lenguajes y hashtags.
+        * obtenerTweetsEnPandasEnParalelo: lee los tweets de un filtro repartidos por rangos de _id en varios
+            procesos.
+        * obtenerLimitesRangosId: obtiene los _id que separan los tweets en rangos con el mismo numero de tweets.
+        * actualizarCache: guarda pdTweetsFiltrado en la cache, por ejemplo despues de anyadir la hora y el minuto.
+        * obtenerFicheroCache: obtiene la ruta del fichero de la cache de la coleccion.
+        * obtenerMarcaAgua: obtiene el mayor _id de los tweets de un pandas.
+        * obtenerIds: obtiene el _id de los tweets de un pandas.
+        * obtenerIdsRecientes: obtiene los _id dentro del margen de refresco de la marca de agua.
+        * obtenerMargenId: obtiene el margen de refresco en ids.
+    """
+
+    # Numero de documentos que se piden a Mongodb en cada viaje del cursor
+    TAMANYO_LOTE_CURSOR = 1000
+    # Campos del tweet que se leen de Mongodb. Son los unicos que utiliza parsearTweet
+    PROYECCION_CAMPOS_TWEET = {"id_str": True,
+                               "user.name": True,
+                               "created_at": True,
+                               "text": True,
+                               "place.full_name": True,
+                               "lang": True,
+                               "truncated": True,
+                               "entities.hashtags.text": True,
+                               "entities.user_mentions.screen_name": True,
+                               "entities.urls.expanded_url": True}
+    # Numero de procesos que leen y parsean los tweets (ver obtenerTweetsEnPandasEnParalelo)
+    NUMERO_PROCESOS = 1
+    # Numero de tweets de cada trozo al leer los tweets por trozos (ver iterarTweetsFiltradoEnPandas)
+    TAMANYO_TROZO = 100000
+    # Segundos antes de la marca de agua desde los que se vuelven a pedir tweets al refrescar (ver refrescar)
+    MARGEN_REFRESCO = 60
+    # Bits que hay que desplazar un id de tweet para obtener los milisegundos de su creacion (ids snowflake)
+    DESPLAZAMIENTO_MILISEGUNDOS_ID = 22
+
+    def __init__(self, manejadorMongodb, tamanyoLote=TAMANYO_LOTE_CURSOR, directorioCache=None,
+                 margenRefresco=MARGEN_REFRESCO, numeroProcesos=NUMERO_PROCESOS, cacheCaracteristicasTexto=None):
+        """
+        Crea el objeto para convertir los tweets parseados almacenados en Mongodb (JSON) en pandas
+
+        :param manejadorMongodb: manejador de Mongodb para obtener las colecciones
+        :param tamanyoLote: numero de documentos que se piden a Mongodb en cada viaje del cursor
+        :param directorioCache: directorio donde guardar el pandas en Parquet. Si es None (por defecto) no se
+            utiliza cache. Necesita pyarrow
+        :param margenRefresco: segundos antes de la marca de agua desde los que se vuelven a pedir los tweets al
+            refrescar, por si se han escrito desordenados
+        :param numeroProcesos: numero de procesos que leen, parsean y enriquecen los tweets. Con 1 (por defecto) se
+            hace en este proceso. Si el manejador se ha creado con un cliente ya creado (por ejemplo de mongomock)
+            siempre se hace en este proceso
+        :param cacheCaracteristicasTexto: CacheCaracteristicasTexto con la que no volver a calcular las
+            caracteristicas de los textos repetidos. Si es None (por defecto) no se utiliza cache. Con varios procesos
+            cada uno utiliza su propia cache de la misma capacidad
+        """
+        self.manejadorMongodb = manejadorMongodb
+        self.tamanyoLote = tamanyoLote
+        self.directorioCache = directorioCache
+        self.margenRefresco = margenRefresco
+        self.numeroProcesos = numeroProcesos
+        self.utilidadPatternTexto = UtilidadPatternTexto(cacheCaracteristicasTexto)
+        self.marcaAgua = None  # Mayor _id de los tweets en pdTweetsFiltrado
+        self.idsRecientes = set()  # _id de los tweets en pdTweetsFiltrado dentro del margen de la marca de agua
+        self.pdTweetsFiltrado = pd.DataFrame()
+
+    def pasearTodosTweetsFiltradoEnPandas(self):
+        """
+        Lee todos los tweets parseados almacenados en Mongodb y los convierte en Pandas. Se almacenara en la
+        variable del objeto pdTweetsFiltrado.
+
+        Solo se leen de Mongodb los campos que utiliza parsearTweet (ver PROYECCION_CAMPOS_TWEET) y el cursor se
+        recorre en lotes de tamanyoLote documentos. Los valores de cada tweet se van anyadiendo a listas por columna
+        y el pandas se crea una unica vez al final, por lo que el tiempo de carga crece linealmente con el numero
+        de tweets. Despues se anyaden las caracteristicas del texto con anyadirCaracteristicasTexto, por lo que el
+        pandas ya tendra los emoticonos, hashtags, menciones y urls.
+
+        Si hay directorio de cache y existe la cache de la coleccion, se lee la cache y solo se leen de Mongodb los
+        tweets nuevos con refrescar. Despues se guarda de nuevo la cache. Las caches a las que les falta alguna de las
+        COLUMNAS_LISTA (guardadas por versiones anteriores) no se utilizan.
+        Lanzara una excepcion para terminar el programa si no se puede conectar a Mongodb.
+        """
+        if self.directorioCache is not None:
+            cache = self.leerCache(self.obtenerFicheroCache())
+            if cache is not None and cache[1] == self.manejadorMongodb.obtenerColeccionTweetsFiltrados().full_name \
+                    and cache[2] is not None and all(columna in cache[0].columns
+                                                     for columna in ParseadorTweetsAPandas.COLUMNAS_LISTA):
+                self.pdTweetsFiltrado, _, self.marcaAgua = cache
+                self.idsRecientes = self.obtenerIdsRecientes(self.obtenerIds(self.pdTweetsFiltrado))
+                self.refrescar()
+                return
+
+        self.pdTweetsFiltrado = self.obtenerTweetsEnPandas({})
+        self.marcaAgua = self.obtenerMarcaAgua(self.pdTweetsFiltrado)
+        self.idsRecientes = self.obtenerIdsRecientes(self.obtenerIds(self.pdTweetsFiltrado))
+        self.actualizarCache()
+
+    def refrescar(self):
+        """
+        Anyade a pdTweetsFiltrado los tweets que se han escrito en Mongodb desde la ultima lectura, por lo que el
+        tiempo depende del numero de tweets nuevos y no del total. Se leen los tweets con _id mayor que la marca de
+        agua menos un margen de margenRefresco segundos: los escritores no escriben los tweets exactamente en orden
+        de id (lotes, hilos trabajadores, tweets truncados que esperan a completarse), por lo que un tweet con un id
+        algo menor que la marca de agua puede llegar despues. El id de los tweets lleva en los bits altos los
+        milisegundos en los que se crearon (ver DESPLAZAMIENTO_MILISEGUNDOS_ID), por lo que el margen se puede pasar
+        a ids. Los tweets del margen que ya estaban en pdTweetsFiltrado se descartan.
+
+        Los tweets nuevos se enriquecen con las mismas columnas que pdTweetsFiltrado (ver enriquecerComo). Si hay
+        directorio de cache, se guarda de nuevo la cache.
+        Lanzara una excepcion para terminar el programa si no se puede conectar a Mongodb.
+
+        :return: numero de tweets nuevos
+        """
+        filtro = dict()
+        if self.marcaAgua is not None:
+            filtro = {"_id": {"$gt": self.marcaAgua - self.obtenerMargenId()}}
+        pdTweetsNuevos = self.obtenerTweetsEnPandas(filtro, enriquecer=False)
+        idsNuevos = self.obtenerIds(pdTweetsNuevos)
+        if self.idsRecientes:  # Se descartan los que ya se habian leido
+            idsRecientes = np.fromiter(self.idsRecientes, dtype=np.int64, count=len(self.idsRecientes))
+            noLeidos = ~np.in1d(idsNuevos, idsRecientes)
+            pdTweetsNuevos = pdTweetsNuevos[noLeidos]
+            idsNuevos = idsNuevos[noLeidos]
+        if len(pdTweetsNuevos) == 0:
+            return 0
+
+        pdTweetsNuevos = self.enriquecerComo(pdTweetsNuevos, self.pdTweetsFiltrado)
+        if len(self.pdTweetsFiltrado) > 0:
+            self.pdTweetsFiltrado = pd.concat([self.pdTweetsFiltrado, pdTweetsNuevos])
+        else:
+            self.pdTweetsFiltrado = pdTweetsNuevos
+        marcaAguaNuevos = int(idsNuevos.max())
+        self.marcaAgua = marcaAguaNuevos if self.marcaAgua is None else max(self.marcaAgua, marcaAguaNuevos)
+        self.idsRecientes = self.obtenerIdsRecientes(np.concatenate(
+            [np.fromiter(self.idsRecientes, dtype=np.int64, count=len(self.idsRecientes)), idsNuevos]))
+        self.actualizarCache()
+        return len(pdTweetsNuevos)
+
+    def iterarTweetsFiltradoEnPandas(self, tamanyoTrozo=TAMANYO_TROZO, filtro=None, conHoraMinuto=True):
+        """
+        Generador que lee los tweets parseados de Mongodb y devuelve pandas de tamanyoTrozo tweets como mucho, ya
+        enriquecidos con las caracteristicas del texto y, si conHoraMinuto es True, con la fecha, la hora y el
+        minuto. Como solo hay un trozo en memoria a la vez, sirve para colecciones que no caben en memoria. Para
+        analizar los trozos se puede utilizar AcumuladorAnalisis.
+        Lanzara una excepcion para terminar el programa si no se puede conectar a Mongodb.
+
+        :param tamanyoTrozo: numero maximo de tweets de cada trozo
+        :param filtro: filtro de Mongodb de los tweets a leer. Por defecto se leen todos
+        :param conHoraMinuto: True (por defecto) para anyadir la fecha, la hora y el minuto a cada trozo
+        :return: generador de pandas
+        """
+        try:
+            tweets = self.manejadorMongodb.obtenerColeccionTweetsFiltrados().find(
+                filtro or {}, projection=MongodbParseadorTweetsAPandas.PROYECCION_CAMPOS_TWEET).batch_size(
+                min(self.tamanyoLote, tamanyoTrozo))
+            while True:
+                pdTrozo = self.convertirTweetsEnPandas(islice(tweets, tamanyoTrozo))
+                if len(pdTrozo) == 0:
+                    return
+                pdTrozo = self.anyadirCaracteristicasTexto(pdTrozo)
+                if conHoraMinuto:
+                    pdTrozo = self.anyadirHoraMinuto(pdTrozo)
+                yield pdTrozo
+        except pymongo.errors.ServerSelectionTimeoutError:
+            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_CONECTADO_MONGODB, terminarPrograma=True)
+
+    def obtenerTweetsEnPandas(self, filtro, enriquecer=True, ordenarPorId=False):
+        """
+        Lee de Mongodb los tweets parseados de un filtro y los convierte en pandas. Solo se leen los campos que
+        utiliza parsearTweet y el cursor se recorre en lotes de tamanyoLote documentos.
+        Si numeroProcesos es mayor que 1 se leen en paralelo con obtenerTweetsEnPandasEnParalelo.
+        Lanzara una excepcion para terminar el programa si no se puede conectar a Mongodb.
+
+        :param filtro: filtro de Mongodb de los tweets a leer, por ejemplo {"_id": {"$gt": marcaAgua}}
+        :param enriquecer: True (por defecto) para anyadir las caracteristicas del texto con
+            anyadirCaracteristicasTexto
+        :param ordenarPorId: True para leer los tweets ordenados por _id. Por defecto es False (orden natural)
+        :return: pandas con una fila por tweet
+        """
+        if self.numeroProcesos > 1 and self.manejadorMongodb.obtenerParametrosConexion() is not None:
+            return self.obtenerTweetsEnPandasEnParalelo(filtro, enriquecer)
+        try:
+            tweets = self.manejadorMongodb.obtenerColeccionTweetsFiltrados().find(
+                filtro, projection=MongodbParseadorTweetsAPandas.PROYECCION_CAMPOS_TWEET).batch_size(self.tamanyoLote)
+            if ordenarPorId:
+                tweets = tweets.sort("_id", pymongo.ASCENDING)
+            pdTweets = self.convertirTweetsEnPandas(tweets)
+        except pymongo.errors.ServerSelectionTimeoutError:
+            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_CONECTADO_MONGODB, terminarPrograma=True)
+        return self.anyadirCaracteristicasTexto(pdTweets) if enriquecer else pdTweets
+
+    def obtenerTweetsEnPandasPorFecha(self, fechaInicio=None, fechaFin=None, enriquecer=True):
+        """
+        Lee de Mongodb los tweets parseados creados en una ventana de tiempo y los convierte en pandas. Se utiliza el
+        indice de la fecha de creacion (ver ManejadorMongodb.INDICES_TWEETFILTRADO), por lo que solo se leen los
+        tweets de la ventana. Los tweets sin fecha en datetime no se leen (ver ManejadorMongodb.completarFechas).
+        Lanzara una excepcion para terminar el programa si no se puede conectar a Mongodb.
+
+        :param fechaInicio: datetime (UTC) desde el que se leen los tweets, incluido. Si es None no hay limite
+        :param fechaFin: datetime (UTC) hasta el que se leen los tweets, sin incluir. Si es None no hay limite
+        :param enriquecer: True (por defecto) para anyadir las caracteristicas del texto
+        :return: pandas con una fila por tweet
+        """
+        return self.obtenerTweetsEnPandas(self.crearFiltro(fechaInicio=fechaInicio, fechaFin=fechaFin), enriquecer)
+
+    def obtenerTweetsEnPandasPorLenguaje(self, lenguajes, enriquecer=True):
+        """
+        Lee de Mongodb los tweets parseados de uno o varios lenguajes y los convierte en pandas. Se utiliza el indice
+        del lenguaje (ver ManejadorMongodb.INDICES_TWEETFILTRADO).
+        Lanzara una excepcion para terminar el programa si no se puede conectar a Mongodb.
+
+        :param lenguajes: lenguaje (por ejemplo "es") o lista de lenguajes de los tweets
+        :param enriquecer: True (por defecto) para anyadir las caracteristicas del texto
+        :return: pandas con una fila por tweet
+        """
+        return self.obtenerTweetsEnPandas(self.crearFiltro(lenguajes=lenguajes), enriquecer)
+
+    def obtenerTweetsEnPandasPorHashtag(self, hashtags, enriquecer=True):
+        """
+        Lee de Mongodb los tweets parseados que tienen alguno de los hashtags y los convierte en pandas. Se busca en
+        los hashtags de las entidades del tweet con su indice (ver ManejadorMongodb.INDICES_TWEETFILTRADO), por lo que
+        se distinguen mayusculas y minusculas. Las entidades de los tweets truncados son las del texto truncado, por
+        lo que estos tweets no se encuentran por los hashtags que solo estan en el texto completo.
+        Lanzara una excepcion para terminar el programa si no se puede conectar a Mongodb.
+
+        :param hashtags: hashtag (con o sin #) o lista de hashtags
+        :param enriquecer: True (por defecto) para anyadir las caracteristicas del texto
+        :return: pandas con una fila por tweet
+        """
+        return self.obtenerTweetsEnPandas(self.crearFiltro(hashtags=hashtags), enriquecer)
+
+    def crearFiltro(self, fechaInicio=None, fechaFin=None, lenguajes=None, hashtags=None):
+        """
+        Crea el filtro de Mongodb de los tweets creados en una ventana de tiempo, de unos lenguajes y con unos
+        hashtags. Los campos son los de los indices de la coleccion (ver ManejadorMongodb.INDICES_TWEETFILTRADO).
+        El filtro tambien se puede utilizar con iterarTweetsFiltradoEnPandas o ManejadorMongodb.obtenerIndicesConsulta.
+
+        :param fechaInicio: datetime (UTC) desde el que se leen los tweets, incluido. Si es None no hay limite
+        :param fechaFin: datetime (UTC) hasta el que se leen los tweets, sin incluir. Si es None no hay limite
+        :param lenguajes: lenguaje o lista de lenguajes de los tweets. Si es None no se filtra por lenguaje
+        :param hashtags: hashtag (con o sin #) o lista de hashtags. Si es None no se filtra por hashtag
+        :return: filtro de Mongodb
+        """
+        filtro = dict()
+        if fechaInicio is not None or fechaFin is not None:
+            filtro[ManejadorMongodb.CAMPO_FECHA] = dict()
+            if fechaInicio is not None:
+                filtro[ManejadorMongodb.CAMPO_FECHA]["$gte"] = fechaInicio
+            if fechaFin is not None:
+                filtro[ManejadorMongodb.CAMPO_FECHA]["$lt"] = fechaFin
+        if lenguajes is not None:
+            if not isinstance(lenguajes, (list, tuple, set)):
+                lenguajes = [lenguajes]
+            filtro[ManejadorMongodb.CAMPO_LENGUAJE] = {"$in": list(lenguajes)}
+        if hashtags is not None:
+            if not isinstance(hashtags, (list, tuple, set)):
+                hashtags = [hashtags]
+            filtro[ManejadorMongodb.CAMPO_HASHTAGS] = {"$in": [hashtag[1:] if hashtag.startswith(u"#") else hashtag
+                                                               for hashtag in hashtags]}
+        return filtro
+
+    def obtenerTweetsEnPandasEnParalelo(self, filtro, enriquecer=True):
+        """
+        Lee los tweets de un filtro en numeroProcesos procesos. Los tweets se reparten en rangos de _id con el mismo
+        numero de tweets (ver obtenerLimitesRangosId) y cada proceso abre su propia conexion a Mongodb, lee su rango
+        ordenado por _id, lo parsea y lo enriquece (ver parsearRangoTweetsEnPandas). Los pandas de cada rango se
+        juntan en orden, por lo que el resultado queda ordenado por _id.
+        El primer rango no tiene limite inferior y el ultimo no tiene limite superior, por lo que no se pierden los
+        tweets que se escriban mientras se calculan los limites.
+
+        :param filtro: filtro de Mongodb de los tweets a leer
+        :param enriquecer: True (por defecto) para anyadir las caracteristicas del texto
+        :return: pandas con una fila por tweet ordenado por _id
+        """
+        limites = self.obtenerLimitesRangosId(filtro, self.numeroProcesos)
+        filtrosRango = list()
+        for numeroRango in range(len(limites) + 1):
+            rango = dict()
+            if numeroRango > 0:
+                rango["$gte"] = limites[numeroRango - 1]
+            if numeroRango < len(limites):
+                rango["$lt"] = limites[numeroRango]
+            filtroRango = {"_id": rango} if rango else dict()
+            filtrosRango.append({"$and": [filtro, filtroRango]} if filtro and filtroRango else filtro or filtroRango)
+
+        cacheCaracteristicasTexto = self.utilidadPatternTexto.cacheCaracteristicasTexto
+        capacidadCache = cacheCaracteristicasTexto.capacidad if cacheCaracteristicasTexto is not None else None
+        argumentos = [(self.manejadorMongodb.obtenerParametrosConexion(), filtroRango, self.tamanyoLote, enriquecer,
+                       capacidadCache) for filtroRango in filtrosRango]
+        if len(argumentos) == 1:  # No merece la pena crear procesos
+            pdTrozos = [parsearRangoTweetsEnPandas(argumentos[0])]
+        else:
+            procesos = multiprocessing.Pool(len(argumentos))
+            try:
+                pdTrozos = procesos.map(parsearRangoTweetsEnPandas, argumentos)
+            finally:
+                procesos.terminate()
+                procesos.join()
+        pdTrozos = [pdTrozo for pdTrozo in pdTrozos if len(pdTrozo) > 0]
+        return pd.concat(pdTrozos) if pdTrozos else pd.DataFrame()
+
+    def obtenerLimitesRangosId(self, filtro, numeroRangos):
+        """
+        Obtiene los _id que separan los tweets de un filtro en numeroRangos rangos con el mismo numero de tweets.
+        Cada limite es el _id del tweet en la posicion correspondiente al ordenar por _id, que se obtiene con el
+        indice de _id (sort, skip y limit).
+        Lanzara una excepcion para terminar el programa si no se puede conectar a Mongodb.
+
+        :param filtro: filtro de Mongodb de los tweets
+        :param numeroRangos: numero de rangos
+        :return: lista ordenada con el _id donde empieza cada rango menos el primero. Puede tener menos de
+            numeroRangos - 1 limites si hay pocos tweets
+        """
+        try:
+            coleccion = self.manejadorMongodb.obtenerColeccionTweetsFiltrados()
+            if hasattr(coleccion, "count_documents"):  # pymongo >= 3.7
+                numeroTweets = coleccion.count_documents(filtro)
+            else:
+                numeroTweets = coleccion.count(filtro)
+            limites = list()
+            for numeroRango in range(1, numeroRangos):
+                tweets = list(coleccion.find(filtro, projection={"_id": True}).sort("_id", pymongo.ASCENDING).skip(
+                    numeroTweets * numeroRango // numeroRangos).limit(1))
+                if tweets and (not limites or tweets[0]["_id"] > limites[-1]):
+                    limites.append(tweets[0]["_id"])
+            return limites
+        except pymongo.errors.ServerSelectionTimeoutError:
+            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_CONECTADO_MONGODB, terminarPrograma=True)
+
+    def actualizarCache(self):
+        """
+        Guarda pdTweetsFiltrado en la cache con su marca de agua. Se llama al leer los tweets y se puede llamar
+        despues de anyadir columnas (por ejemplo con anyadirHoraMinuto) para que tambien se guarden. No hace nada si
+        no hay directorio de cache.
+        """
+        if self.directorioCache is not None:
+            self.guardarCache(self.obtenerFicheroCache(),
+                              self.manejadorMongodb.obtenerColeccionTweetsFiltrados().full_name, self.marcaAgua)
+
+    def obtenerFicheroCache(self):
+        """
+        Obtiene la ruta del fichero de la cache de la coleccion de tweets parseados: basedatos.coleccion.parquet en
+        el directorio de cache.
+
+        :return: ruta del fichero de la cache
+        """
+        return os.path.join(self.directorioCache,
+                            "%s.parquet" % self.manejadorMongodb.obtenerColeccionTweetsFiltrados().full_name)
+
+    def obtenerMarcaAgua(self, pdTweets):
+        """
+        Obtiene el mayor _id de los tweets de un pandas.
+
+        :param pdTweets: pandas con los tweets
+        :return: mayor _id o None si el pandas esta vacio
+        """
+        if len(pdTweets) == 0:
+            return None
+        return int(self.obtenerIds(pdTweets).max())
+
+    def obtenerIds(self, pdTweets):
+        """
+        Obtiene el _id de los tweets de un pandas. El _id de cada tweet es su id, que es el indice del pandas.
+
+        :param pdTweets: pandas con los tweets
+        :return: array numpy con los _id
+        """
+        return pd.to_numeric(pd.Series(pdTweets.index, dtype=object)).values.astype(np.int64)
+
+    def obtenerIdsRecientes(self, ids):
+        """
+        Obtiene los _id que estan dentro del margen de refresco de la marca de agua. Son los unicos que se pueden
+        volver a leer al refrescar.
+
+        :param ids: array numpy con los _id
+        :return: conjunto con los _id recientes
+        """
+        if self.marcaAgua is None:
+            return set()
+        return set(ids[ids > self.marcaAgua - self.obtenerMargenId()].tolist())
+
+    def obtenerMargenId(self):
+        """
+        Obtiene el margen de refresco en ids: los milisegundos del margen desplazados como en los ids de los tweets.
+
+        :return: margen de refresco en ids
+        """
+        return int(self.margenRefresco * 1000) << MongodbParseadorTweetsAPandas.DESPLAZAMIENTO_MILISEGUNDOS_ID
+
+
+def parsearRangoTweetsEnPandas(argumentos):
+    """
+    Lee, parsea y enriquece los tweets de un rango de _id en un proceso trabajador (ver
+    MongodbParseadorTweetsAPandas.obtenerTweetsEnPandasEnParalelo). Es una funcion y no un metodo para que
+    multiprocessing la pueda enviar al proceso. Se abre una conexion nueva a Mongodb que se cierra al terminar.
+
+    :param argumentos: tupla con los parametros de conexion de ManejadorMongodb, el filtro del rango, el numero de
+        documentos de cada viaje del cursor, si se enriquecen los tweets y la capacidad de la CacheCaracteristicasTexto
+        del proceso (None para no utilizar cache)
+    :return: pandas con los tweets del rango ordenado por _id
+    """
+    parametrosConexion, filtro, tamanyoLote, enriquecer, capacidadCache = argumentos
+    cacheCaracteristicasTexto = CacheCaracteristicasTexto(capacidadCache) if capacidadCache is not None else None
+    manejadorMongodb = ManejadorMongodb(**parametrosConexion)
+    try:
+        return MongodbParseadorTweetsAPandas(
+            manejadorMongodb, tamanyoLote=tamanyoLote,
+            cacheCaracteristicasTexto=cacheCaracteristicasTexto).obtenerTweetsEnPandas(
+            filtro, enriquecer=enriquecer, ordenarPorId=True)
+    finally:
+        manejadorMongodb.mongoCliente.close()
+
+
+class BsonParseadorTweetsAPandas(ParseadorTweetsAPandas):
+    """
+    Clase que hereda de ParseadorTweetsAPandas y que lee los tweets parseados directamente de un fichero .bson de
+    mongodump (por ejemplo el dump que se adjunta en dump/tweetsfinal/tweetfiltrado.bson), sin mongorestore ni
+    Mongodb. Los tweets pasan por el mismo parseo y las mismas caracteristicas del texto que con
+    MongodbParseadorTweetsAPandas, por lo que el pandas es el mismo.
+
+    El fichero se mapea en memoria y se recorre saltando de documento en documento con la longitud que lleva cada
+    uno al principio. Los documentos se decodifican en lotes de tamanyoLote con bson.decode_all, que los decodifica
+    en C de una sola vez.
+
+    Metodos disponibles:
+        * pasearTodosTweetsFiltradoEnPandas: parsea todos los tweets del fichero y los convierte en pandas.
+        * iterarTweetsFiltradoEnPandas: generador que lee los tweets en trozos de pandas ya enriquecidos.
+        * iterarTweets: generador que devuelve los tweets del fichero uno a uno.
+        * iterarLotesBson: generador que devuelve los bytes de los lotes de documentos del fichero.
+    """
+
+    # Fichero del dump que se adjunta con los tweets parseados
+    FICHERO_DUMP = os.path.join("dump", "tweetsfinal", "tweetfiltrado.bson")
+    # Numero de documentos que se decodifican juntos
+    TAMANYO_LOTE = 1000
+    # Numero de tweets de cada trozo al leer los tweets por trozos (ver iterarTweetsFiltradoEnPandas)
+    TAMANYO_TROZO = MongodbParseadorTweetsAPandas.TAMANYO_TROZO
+    # Los documentos BSON empiezan con su longitud en bytes (int32 little-endian, incluida ella misma)
+    LONGITUD_DOCUMENTO = struct.Struct("<i")
+
+    def __init__(self, ficheroBson=FICHERO_DUMP, tamanyoLote=TAMANYO_LOTE, cacheCaracteristicasTexto=None):
+        """
+        Crea el objeto para convertir los tweets parseados de un fichero .bson en pandas
+
+        :param ficheroBson: ruta del fichero .bson. Por defecto el dump que se adjunta
+        :param tamanyoLote: numero de documentos que se decodifican juntos
+        :param cacheCaracteristicasTexto: CacheCaracteristicasTexto con la que no volver a calcular las
+            caracteristicas de los textos repetidos. Si es None (por defecto) no se utiliza cache
+        """
+        self.ficheroBson = ficheroBson
+        self.tamanyoLote = tamanyoLote
+        self.utilidadPatternTexto = UtilidadPatternTexto(cacheCaracteristicasTexto)
+        self.pdTweetsFiltrado = pd.DataFrame()
+
+    def pasearTodosTweetsFiltradoEnPandas(self):
+        """
+        Lee todos los tweets del fichero .bson y los convierte en pandas. Se almacenara en la variable del objeto
+        pdTweetsFiltrado. Despues se anyaden las caracteristicas del texto con anyadirCaracteristicasTexto, por lo
+        que el pandas ya tendra los emoticonos, hashtags y menciones.
+        Lanzara una excepcion para terminar el programa si no existe el fichero o esta corrupto.
+        """
+        self.pdTweetsFiltrado = self.anyadirCaracteristicasTexto(self.convertirTweetsEnPandas(self.iterarTweets()))
+
+    def iterarTweetsFiltradoEnPandas(self, tamanyoTrozo=TAMANYO_TROZO, conHoraMinuto=True):
+        """
+        Generador que lee los tweets del fichero .bson y devuelve pandas de tamanyoTrozo tweets como mucho, ya
+        enriquecidos con las caracteristicas del texto y, si conHoraMinuto es True, con la fecha, la hora y el
+        minuto. Para analizar los trozos se puede utilizar AcumuladorAnalisis.
+        Lanzara una excepcion para terminar el programa si no existe el fichero o esta corrupto.
+
+        :param tamanyoTrozo: numero maximo de tweets de cada trozo
+        :param conHoraMinuto: True (por defecto) para anyadir la fecha, la hora y el minuto a cada trozo
+        :return: generador de pandas
+        """
+        tweets = self.iterarTweets()
+        while True:
+            pdTrozo = self.convertirTweetsEnPandas(islice(tweets, tamanyoTrozo))
+            if len(pdTrozo) == 0:
+                return
+            pdTrozo = self.anyadirCaracteristicasTexto(pdTrozo)
+            if conHoraMinuto:
+                pdTrozo = self.anyadirHoraMinuto(pdTrozo)
+            yield pdTrozo
+
+    def iterarTweets(self):
+        """
+        Generador que devuelve los tweets del fichero .bson uno a uno en formato JSON (diccionarios), igual que los
+        devolveria un cursor de Mongodb.
+        Lanzara una excepcion para terminar el programa si no existe el fichero o esta corrupto.
+
+        :return: generador de tweets
+        """
+        for loteBson in self.iterarLotesBson():
+            try:
+                tweets = bson.decode_all(loteBson)
+            except bson.errors.InvalidBSON as e:
+                raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_FICHERO_BSON_CORRUPTO % self.ficheroBson,
+                                      errores=str(e), terminarPrograma=True)
+            for tweet in tweets:
+                yield tweet
+
+    def iterarLotesBson(self):
+        """
+        Generador que devuelve los bytes de lotes de tamanyoLote documentos seguidos del fichero .bson. El fichero se
+        mapea en memoria y de cada documento solo se lee su longitud para saltar al siguiente.
+        Lanzara una excepcion para terminar el programa si no existe el fichero o si un documento se sale del
+        fichero.
+
+        :return: generador de bytes
+        """
+        if not os.path.isfile(self.ficheroBson):
+            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_EXISTE_FICHERO % self.ficheroBson,
+                                  terminarPrograma=True)
+        if os.path.getsize(self.ficheroBson) == 0:  # No se puede mapear un fichero vacio
+            return
+
+        with open(self.ficheroBson, "rb") as fichero:
+            ficheroMapeado = mmap.mmap(fichero.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                tamanyoFichero = len(ficheroMapeado)
+                inicioLote = posicion = 0
+                numeroDocumentos = 0
+                while posicion < tamanyoFichero:
+                    longitud = BsonParseadorTweetsAPandas.LONGITUD_DOCUMENTO.unpack_from(ficheroMapeado, posicion)[0] \
+                        if posicion + 4 <= tamanyoFichero else 0
+                    if longitud < 5 or posicion + longitud > tamanyoFichero:
+                        raise TwiterExcepcion(
+                            TwiterExcepcion.EXCEPTION_MENSAJE_FICHERO_BSON_CORRUPTO % self.ficheroBson,
+                            errores="Documento incompleto en el byte %d" % posicion, terminarPrograma=True)
+                    posicion += longitud
+                    numeroDocumentos += 1
+                    if numeroDocumentos == self.tamanyoLote:
+                        yield ficheroMapeado[inicioLote:posicion]
+                        inicioLote = posicion
+                        numeroDocumentos = 0
+                if numeroDocumentos > 0:
+                    yield ficheroMapeado[inicioLote:posicion]
+            finally:
+                ficheroMapeado.close()
+
 
 class AnalisisUtilidad(object):
     """
     Clase que se utiliza para el analisis de los tweets almacenados: se puede obtener los elementos mas comunes
     en una serie pandas (columna en data frame) y su frecuencia, y el numero total de elementos.
 
+    Los contadores se calculan con numpy: los elementos se numeran con pandas.factorize en orden de aparicion, se
+    cuentan con numpy.bincount y se ordenan con una ordenacion estable, por lo que los resultados son los mismos que
+    con Counter.most_common, incluidos los empates (primero el elemento que aparece antes).
+
     Metodos disponibles:
         * obtenerNumeroDeElementosListaEnSeriePandas: obtiene el numero total de elementos de una serie pandas
             donde cada fila esta compuesta por una lista.
         * obtenerContadorDeElementosListaEnSeriePandas: obtiene el numero total de apariciones de cada elemento
-            de una serie pandas donde cada fila esta compuesta por una lista. Se utiliza collections.Counter.
+            de una serie pandas donde cada fila esta compuesta por una lista.
         * obtenerContadorDeElementosNoListaEnSeriePandas: obtiene el numero total de apariciones de cada elemento
             de una serie pandas donde cada fila esta compuesta un unico elemento (no lista).
-            Se utiliza collections.Counter.
-
+        * obtenerContadorPorGrupoDeElementosListaEnSeriePandas: obtiene el contador de elementos de una serie pandas
+            de listas para cada grupo (por ejemplo, por hora) de una vez.
+        * obtenerContadorPorGrupoDeElementosNoListaEnSeriePandas: obtiene el contador de elementos de una serie
+            pandas de elementos unicos para cada grupo de una vez.
+        * aplanarElementosListaEnSeriePandas: obtiene todos los elementos de las listas de una serie pandas y la
+            fila de cada uno.
+        * aplanarElementosNoListaEnSeriePandas: obtiene los elementos no vacios de una serie pandas y la fila de
+            cada uno.
+        * obtenerMasComunes: ordena los elementos por numero de apariciones como Counter.most_common.
+        * obtenerMasComunesPorGrupo: ordena los elementos de cada grupo por numero de apariciones.
     """
 
     def obtenerNumeroDeElementosListaEnSeriePandas(self, seriePandas, promedio=False):
@@ -557,10 +2824,7 @@ class AnalisisUtilidad(object):
         :return: numero de elementos totales en esta serie. El numero de apariciones puede ser total si promedio
             es False o la media si es True.
         """
-        numeroTotal = 0
-        for valoresFila in seriePandas:
-            if valoresFila:
-                numeroTotal += len(valoresFila)
+        numeroTotal = len(self.aplanarElementosListaEnSeriePandas(seriePandas)[0])
         if promedio and len(seriePandas) > 0:
             numeroTotal /= float(len(seriePandas))
         return numeroTotal
@@ -568,7 +2832,7 @@ class AnalisisUtilidad(object):
     def obtenerContadorDeElementosListaEnSeriePandas(self, seriePandas, promedio=False, top=None):
         """
         Obtiene el numero total de apariciones de cada elemento de una serie pandas donde cada fila esta
-        compuesta por una lista. Se utiliza collections.Counter.
+        compuesta por una lista.
 
         :param seriePandas: serie pandas del que se quiere obtener el contador de elementos. Los elementos en
             esta serie tiene que ser una lista.
@@ -580,23 +2844,13 @@ class AnalisisUtilidad(object):
             devolvera los tops primeros mas frecuentes. El numero de apariciones puede ser total si promedio
             es False o la media si es True.
         """
-        contador = Counter()
-        for valoresFila in seriePandas:
-            if valoresFila:
-                for valorFila in valoresFila:
-                    contador[valorFila] += 1
-        if promedio and len(seriePandas) > 0:
-            for elemento in contador:
-                contador[elemento] /= float(len(seriePandas))
-        if top:  # Si se ha pasado un top se devuelven solo los top que se desea
-            return contador.most_common(top)
-        else:  # Se devuelve el contador completo
-            return contador.most_common()
+        elementos = self.aplanarElementosListaEnSeriePandas(seriePandas)[0]
+        return self.obtenerMasComunes(elementos, len(seriePandas) if promedio else 0, top)
 
     def obtenerContadorDeElementosNoListaEnSeriePandas(self, seriePandas, promedio=False, top=None):
         """
         Obtiene el numero total de apariciones de cada elemento de una serie pandas donde cada fila esta
-        compuesta por un unico elemento. Se utiliza collections.Counter.
+        compuesta por un unico elemento. No se cuentan los elementos vacios (None, "", 0...).
 
         :param seriePandas: serie pandas del que se quiere obtener el contador de elementos. Los elementos en
             esta serie no tiene que ser lista.
@@ -608,14 +2862,855 @@ class AnalisisUtilidad(object):
             devolvera los tops primeros mas frecuentes. El numero de apariciones puede ser total si promedio
             es False o la media si es True.
         """
-        contador = Counter()
-        for valorFila in seriePandas:
-            if valorFila:
-                contador[valorFila] += 1
-        if promedio and len(seriePandas) > 0:
-            for elemento in contador:
-                contador[elemento] /= float(len(seriePandas))
+        elementos = self.aplanarElementosNoListaEnSeriePandas(seriePandas)[0]
+        return self.obtenerMasComunes(elementos, len(seriePandas) if promedio else 0, top)
+
+    def obtenerContadorPorGrupoDeElementosListaEnSeriePandas(self, seriePandas, seriePandasGrupos, promedio=False,
+                                                            top=None):
+        """
+        Obtiene el contador de elementos de una serie pandas donde cada fila esta compuesta por una lista, para cada
+        grupo de filas. Da el mismo resultado que
+        seriePandas.groupby(seriePandasGrupos).apply(lambda fila:
+            self.obtenerContadorDeElementosListaEnSeriePandas(fila, promedio, top))
+        pero contando todos los grupos a la vez en lugar de recorrer cada grupo por separado.
+
+        :param seriePandas: serie pandas del que se quiere obtener el contador de elementos. Los elementos en
+            esta serie tiene que ser una lista.
+        :param seriePandasGrupos: serie pandas con el grupo de cada fila (por ejemplo la columna de la hora)
+        :param promedio: True si se quiere obtener el numero promedio de apariciones de cada elemento en el grupo o
+            False si se quiere obtener el numero total. Por defecto es False.
+        :param top: None si se quiere obtener todos los elementos o un numero para obtener los top primeros de cada
+            grupo. Por defecto es None.
+        :return: serie pandas con los grupos como indice y los elementos mas comunes de cada grupo como valor
+        """
+        elementos, filas = self.aplanarElementosListaEnSeriePandas(seriePandas)
+        return self.obtenerMasComunesPorGrupo(elementos, filas, seriePandas, seriePandasGrupos, promedio, top)
+
+    def obtenerContadorPorGrupoDeElementosNoListaEnSeriePandas(self, seriePandas, seriePandasGrupos, promedio=False,
+                                                              top=None):
+        """
+        Obtiene el contador de elementos de una serie pandas donde cada fila esta compuesta por un unico elemento,
+        para cada grupo de filas. Da el mismo resultado que
+        seriePandas.groupby(seriePandasGrupos).apply(lambda fila:
+            self.obtenerContadorDeElementosNoListaEnSeriePandas(fila, promedio, top))
+
+        :param seriePandas: serie pandas del que se quiere obtener el contador de elementos. Los elementos en
+            esta serie no tiene que ser lista.
+        :param seriePandasGrupos: serie pandas con el grupo de cada fila (por ejemplo la columna de la hora)
+        :param promedio: True si se quiere obtener el numero promedio de apariciones de cada elemento en el grupo o
+            False si se quiere obtener el numero total. Por defecto es False.
+        :param top: None si se quiere obtener todos los elementos o un numero para obtener los top primeros de cada
+            grupo. Por defecto es None.
+        :return: serie pandas con los grupos como indice y los elementos mas comunes de cada grupo como valor
+        """
+        elementos, filas = self.aplanarElementosNoListaEnSeriePandas(seriePandas)
+        return self.obtenerMasComunesPorGrupo(elementos, filas, seriePandas, seriePandasGrupos, promedio, top)
+
+    def aplanarElementosListaEnSeriePandas(self, seriePandas):
+        """
+        Obtiene todos los elementos de las listas de una serie pandas, en orden, y la posicion de la fila de cada
+        elemento. Las filas vacias (None o lista vacia) no tienen elementos.
+
+        :param seriePandas: serie pandas donde cada fila es una lista
+        :return: tupla con el array numpy de elementos y el array numpy con la posicion de la fila de cada uno
+        """
+        valores = np.asarray(seriePandas, dtype=object)
+        conElementos = valores.astype(bool)
+        listas = valores[conElementos]
+        numeroElementosFila = np.fromiter(map(len, listas), dtype=np.int64, count=len(listas))
+        elementos = np.empty(numeroElementosFila.sum(), dtype=object)
+        elementos[:] = list(chain.from_iterable(listas))
+        return elementos, np.repeat(np.flatnonzero(conElementos), numeroElementosFila)
+
+    def aplanarElementosNoListaEnSeriePandas(self, seriePandas):
+        """
+        Obtiene los elementos no vacios de una serie pandas, en orden, y la posicion de la fila de cada elemento.
+
+        :param seriePandas: serie pandas donde cada fila es un unico elemento
+        :return: tupla con el array numpy de elementos y el array numpy con la posicion de la fila de cada uno
+        """
+        valores = np.asarray(seriePandas, dtype=object)
+        filas = np.flatnonzero(valores.astype(bool))
+        return valores[filas], filas
+
+    def obtenerMasComunes(self, elementos, numeroFilas=0, top=None):
+        """
+        Cuenta las apariciones de cada elemento y los ordena de mas a menos frecuente. Los elementos con las mismas
+        apariciones quedan en el orden en el que aparecen por primera vez, como en Counter.most_common.
+
+        :param elementos: array numpy con los elementos
+        :param numeroFilas: si es mayor que 0, se divide el numero de apariciones por el numero de filas para obtener
+            el promedio. Por defecto es 0
+        :param top: None si se quiere obtener todos los elementos o un numero para obtener los top primeros.
+        :return: lista de tuplas (elemento, apariciones)
+        """
+        codigos, elementosUnicos = pd.factorize(elementos, sort=False)
+        apariciones = np.bincount(codigos[codigos >= 0], minlength=len(elementosUnicos))
+        orden = np.argsort(-apariciones, kind="mergesort")
         if top:  # Si se ha pasado un top se devuelven solo los top que se desea
-            return contador.most_common(top)
-        else:  # Se devuelve el contador completo
-            return contador.most_common()
+            orden = orden[:top]
+        aparicionesOrdenadas = apariciones[orden] / float(numeroFilas) if numeroFilas > 0 else apariciones[orden]
+        return list(zip(np.asarray(elementosUnicos, dtype=object)[orden].tolist(), aparicionesOrdenadas.tolist()))
+
+    def obtenerMasComunesPorGrupo(self, elementos, filas, seriePandas, seriePandasGrupos, promedio, top):
+        """
+        Cuenta las apariciones de cada elemento en cada grupo y los ordena de mas a menos frecuente dentro del
+        grupo. Cada par (grupo, elemento) se numera con pandas.factorize en orden de aparicion, por lo que los
+        empates quedan en el orden en el que el elemento aparece por primera vez en el grupo. Los grupos quedan
+        ordenados y sin los grupos nulos, como en groupby.
+
+        :param elementos: array numpy con los elementos
+        :param filas: array numpy con la posicion de la fila de cada elemento
+        :param seriePandas: serie pandas de la que se han obtenido los elementos
+        :param seriePandasGrupos: serie pandas con el grupo de cada fila
+        :param promedio: True si se quiere dividir las apariciones por el numero de filas del grupo
+        :param top: None si se quiere obtener todos los elementos o un numero para obtener los top primeros de cada
+            grupo.
+        :return: serie pandas con los grupos como indice y la lista de tuplas (elemento, apariciones) como valor
+        """
+        codigosGrupoFila, grupos = pd.factorize(np.asarray(seriePandasGrupos), sort=True)
+        numeroFilasGrupo = np.bincount(codigosGrupoFila[codigosGrupoFila >= 0], minlength=len(grupos))
+
+        codigosElemento, elementosUnicos = pd.factorize(elementos, sort=False)
+        codigosGrupo = codigosGrupoFila[filas]
+        conGrupo = (codigosGrupo >= 0) & (codigosElemento >= 0)
+        codigosElemento = codigosElemento[conGrupo]
+        codigosGrupo = codigosGrupo[conGrupo]
+        codigosPar, pares = pd.factorize(codigosGrupo * np.int64(len(elementosUnicos)) + codigosElemento, sort=False)
+        apariciones = np.bincount(codigosPar, minlength=len(pares))
+        grupoPar = pares // max(len(elementosUnicos), 1)
+        elementoPar = pares % max(len(elementosUnicos), 1)
+
+        # Se ordena por grupo, luego por apariciones de mayor a menor y luego por orden de aparicion del par
+        orden = np.lexsort((np.arange(len(pares)), -apariciones, grupoPar))
+        elementosUnicos = np.asarray(elementosUnicos, dtype=object)
+        masComunesGrupo = [list() for _ in range(len(grupos))]
+        for posicionPar in orden:
+            grupo = grupoPar[posicionPar]
+            if top and len(masComunesGrupo[grupo]) >= top:
+                continue
+            numeroApariciones = apariciones[posicionPar].item()
+            if promedio:
+                numeroApariciones /= float(numeroFilasGrupo[grupo])
+            masComunesGrupo[grupo].append((elementosUnicos[elementoPar[posicionPar]], numeroApariciones))
+
+        serieMasComunes = pd.Series(masComunesGrupo, index=pd.Index(grupos, name=seriePandasGrupos.name),
+                                    name=seriePandas.name)
+        return serieMasComunes
+
+
+class AcumuladorAnalisis(object):
+    """
+    Clase que hace el mismo analisis que AnalisisUtilidad sobre los tweets leidos por trozos (ver
+    MongodbParseadorTweetsAPandas.iterarTweetsFiltradoEnPandas), sin tener todos los tweets en memoria a la vez.
+    De cada trozo solo se guardan los contadores de elementos (en total y por grupo), el numero de filas y las
+    sumas por grupo, por lo que la memoria depende del numero de elementos distintos y no del numero de tweets.
+
+    Los contadores guardan los elementos en el orden en el que aparecen por primera vez, por lo que los resultados
+    son los mismos que los de AnalisisUtilidad con todos los tweets, incluidos los empates.
+
+    Metodos disponibles:
+        * anyadirTrozo: anyade los contadores y sumas de un trozo de tweets.
+        * obtenerNumeroDeElementos: obtiene el numero total de elementos de una columna de listas.
+        * obtenerContadorDeElementos: obtiene el numero total de apariciones de cada elemento de una columna.
+        * obtenerContadorPorGrupoDeElementos: obtiene el numero de apariciones de cada elemento de una columna en
+            cada grupo.
+        * obtenerNumeroFilasPorGrupo: obtiene el numero de tweets de cada grupo, como groupby(...).size().
+        * obtenerSumaPorGrupo: obtiene la suma de una columna en cada grupo, como groupby(...)[columna].sum().
+        * obtenerMasComunes: ordena los elementos de un contador como Counter.most_common.
+    """
+
+    # Columnas que se acumulan por defecto
+    COLUMNAS_LISTA = ParseadorTweetsAPandas.COLUMNAS_LISTA
+    COLUMNAS_NO_LISTA = (ParseadorTweetsAPandas.NOMBRE_COLUMNA_LENGUAJE,)
+    COLUMNAS_SUMA = (ParseadorTweetsAPandas.NOMBRE_COLUMNA_NUMEROPALABRAS,
+                     ParseadorTweetsAPandas.NOMBRE_COLUMNA_NUMEROCARACTERES)
+    COLUMNA_GRUPO = ParseadorTweetsAPandas.NOMBRE_COLUMNA_HORA
+
+    def __init__(self, columnasLista=COLUMNAS_LISTA, columnasNoLista=COLUMNAS_NO_LISTA, columnasSuma=COLUMNAS_SUMA,
+                 columnaGrupo=COLUMNA_GRUPO):
+        """
+        Crea el acumulador vacio.
+
+        :param columnasLista: columnas cuyos valores son listas de las que se cuentan los elementos
+        :param columnasNoLista: columnas con un unico elemento por fila de las que se cuentan los elementos
+        :param columnasSuma: columnas que se suman por grupo
+        :param columnaGrupo: columna con el grupo de cada fila (por defecto la hora). None si no se quiere agrupar
+        """
+        self.columnasLista = tuple(columnasLista)
+        self.columnasNoLista = tuple(columnasNoLista)
+        self.columnasSuma = tuple(columnasSuma)
+        self.columnaGrupo = columnaGrupo
+        self.analisisUtilidad = AnalisisUtilidad()
+
+        self.numeroFilas = 0
+        self.numeroElementos = defaultdict(int)  # columna -> numero de elementos
+        self.contadores = defaultdict(OrderedDict)  # columna -> elemento -> apariciones
+        self.contadoresGrupo = defaultdict(lambda: defaultdict(OrderedDict))  # columna -> grupo -> elemento -> ...
+        self.numeroFilasGrupo = defaultdict(int)  # grupo -> numero de filas
+        self.sumasGrupo = defaultdict(lambda: defaultdict(int))  # columna -> grupo -> suma
+
+    def anyadirTrozo(self, pdTrozo):
+        """
+        Anyade los contadores y sumas de un trozo de tweets. Los trozos se tienen que anyadir en el mismo orden que
+        tendrian las filas en el pandas completo.
+
+        :param pdTrozo: pandas con los tweets del trozo
+        """
+        self.numeroFilas += len(pdTrozo)
+        if len(pdTrozo) == 0:
+            return
+
+        codigosGrupoFila = None
+        if self.columnaGrupo is not None:
+            gruposFila = np.asarray(pdTrozo[self.columnaGrupo], dtype=object)
+            codigosGrupoFila, grupos = pd.factorize(gruposFila, sort=False)
+            grupos = np.asarray(grupos, dtype=object).tolist()
+            conGrupo = codigosGrupoFila >= 0
+            for grupo, numeroFilas in zip(grupos, np.bincount(codigosGrupoFila[conGrupo],
+                                                              minlength=len(grupos)).tolist()):
+                self.numeroFilasGrupo[grupo] += numeroFilas
+            for columna in self.columnasSuma:
+                sumas = pdTrozo[columna][conGrupo].groupby(codigosGrupoFila[conGrupo]).sum()
+                for codigoGrupo, suma in sumas.items():
+                    self.sumasGrupo[columna][grupos[codigoGrupo]] += suma.item() if hasattr(suma, "item") else suma
+
+        for columna in self.columnasLista + self.columnasNoLista:
+            if columna in self.columnasLista:
+                elementos, filas = self.analisisUtilidad.aplanarElementosListaEnSeriePandas(pdTrozo[columna])
+            else:
+                elementos, filas = self.analisisUtilidad.aplanarElementosNoListaEnSeriePandas(pdTrozo[columna])
+            self.numeroElementos[columna] += len(elementos)
+
+            codigosElemento, elementosUnicos = pd.factorize(elementos, sort=False)
+            elementosUnicos = np.asarray(elementosUnicos, dtype=object).tolist()
+            conElemento = codigosElemento >= 0
+            contador = self.contadores[columna]
+            for elemento, apariciones in zip(elementosUnicos, np.bincount(codigosElemento[conElemento],
+                                                                          minlength=len(elementosUnicos)).tolist()):
+                contador[elemento] = contador.get(elemento, 0) + apariciones
+
+            if codigosGrupoFila is not None:
+                # Se numeran los pares (grupo, elemento) en orden de aparicion, como en
+                # AnalisisUtilidad.obtenerMasComunesPorGrupo
+                codigosGrupo = codigosGrupoFila[filas]
+                conGrupo = (codigosGrupo >= 0) & conElemento
+                numeroElementosUnicos = np.int64(max(len(elementosUnicos), 1))
+                codigosPar, pares = pd.factorize(codigosGrupo[conGrupo] * numeroElementosUnicos +
+                                                  codigosElemento[conGrupo], sort=False)
+                aparicionesPar = np.bincount(codigosPar, minlength=len(pares)).tolist()
+                contadoresGrupo = self.contadoresGrupo[columna]
+                for par, apariciones in zip(pares.tolist(), aparicionesPar):
+                    contadorGrupo = contadoresGrupo[grupos[par // numeroElementosUnicos]]
+                    elemento = elementosUnicos[par % numeroElementosUnicos]
+                    contadorGrupo[elemento] = contadorGrupo.get(elemento, 0) + apariciones
+
+    def obtenerNumeroDeElementos(self, columna, promedio=False):
+        """
+        Obtiene el numero total de elementos de una columna, como
+        AnalisisUtilidad.obtenerNumeroDeElementosListaEnSeriePandas.
+
+        :param columna: nombre de la columna
+        :param promedio: True si se quiere obtener el numero promedio o False si se quiere obtener el numero total.
+            Por defecto es False.
+        :return: numero de elementos totales en esta columna
+        """
+        numeroTotal = self.numeroElementos[columna]
+        if promedio and self.numeroFilas > 0:
+            numeroTotal /= float(self.numeroFilas)
+        return numeroTotal
+
+    def obtenerContadorDeElementos(self, columna, promedio=False, top=None):
+        """
+        Obtiene el numero total de apariciones de cada elemento de una columna, como
+        AnalisisUtilidad.obtenerContadorDeElementosListaEnSeriePandas o
+        AnalisisUtilidad.obtenerContadorDeElementosNoListaEnSeriePandas segun sea la columna.
+
+        :param columna: nombre de la columna
+        :param promedio: True si se quiere obtener el numero promedio de apariciones de cada elemento o False
+            si se quiere obtener el numero total. Por defecto es False.
+        :param top: None si se quiere obtener todos los elementos o un numero para obtener los top primeros.
+            Por defecto es None.
+        :return: lista de tuplas (elemento, apariciones) ordenada de mas a menos frecuente
+        """
+        return self.obtenerMasComunes(self.contadores[columna], self.numeroFilas if promedio else 0, top)
+
+    def obtenerContadorPorGrupoDeElementos(self, columna, promedio=False, top=None):
+        """
+        Obtiene el numero de apariciones de cada elemento de una columna en cada grupo, como
+        AnalisisUtilidad.obtenerContadorPorGrupoDeElementosListaEnSeriePandas.
+
+        :param columna: nombre de la columna
+        :param promedio: True si se quiere obtener el numero promedio de apariciones de cada elemento en el grupo o
+            False si se quiere obtener el numero total. Por defecto es False.
+        :param top: None si se quiere obtener todos los elementos o un numero para obtener los top primeros de cada
+            grupo. Por defecto es None.
+        :return: serie pandas con los grupos como indice y los elementos mas comunes de cada grupo como valor
+        """
+        grupos = sorted(self.numeroFilasGrupo)
+        contadoresGrupo = self.contadoresGrupo[columna]
+        return pd.Series([self.obtenerMasComunes(contadoresGrupo.get(grupo, {}),
+                                                 self.numeroFilasGrupo[grupo] if promedio else 0, top)
+                          for grupo in grupos], index=pd.Index(grupos, name=self.columnaGrupo), name=columna)
+
+    def obtenerNumeroFilasPorGrupo(self):
+        """
+        Obtiene el numero de tweets de cada grupo, como groupby(columnaGrupo).size().
+
+        :return: serie pandas con los grupos como indice y el numero de tweets como valor
+        """
+        grupos = sorted(self.numeroFilasGrupo)
+        return pd.Series([self.numeroFilasGrupo[grupo] for grupo in grupos],
+                         index=pd.Index(grupos, name=self.columnaGrupo))
+
+    def obtenerSumaPorGrupo(self, columna):
+        """
+        Obtiene la suma de una columna en cada grupo, como groupby(columnaGrupo)[columna].sum().
+
+        :param columna: nombre de la columna (ver columnasSuma)
+        :return: serie pandas con los grupos como indice y la suma como valor
+        """
+        grupos = sorted(self.numeroFilasGrupo)
+        return pd.Series([self.sumasGrupo[columna][grupo] for grupo in grupos],
+                         index=pd.Index(grupos, name=self.columnaGrupo), name=columna)
+
+    def obtenerMasComunes(self, contador, numeroFilas=0, top=None):
+        """
+        Ordena los elementos de un contador de mas a menos apariciones. Como la ordenacion es estable y el contador
+        guarda los elementos en orden de aparicion, los empates quedan como en Counter.most_common.
+
+        :param contador: diccionario ordenado elemento -> apariciones
+        :param numeroFilas: si es mayor que 0, se divide el numero de apariciones por el numero de filas para obtener
+            el promedio. Por defecto es 0
+        :param top: None si se quiere obtener todos los elementos o un numero para obtener los top primeros.
+        :return: lista de tuplas (elemento, apariciones)
+        """
+        masComunes = sorted(contador.items(), key=lambda elementoApariciones: -elementoApariciones[1])
+        if top:  # Si se ha pasado un top se devuelven solo los top que se desea
+            masComunes = masComunes[:top]
+        if numeroFilas > 0:
+            masComunes = [(elemento, apariciones / float(numeroFilas)) for elemento, apariciones in masComunes]
+        return masComunes
+
+
+class MongodbAnalisisUtilidad(object):
+    """
+    Clase que hace el mismo analisis que AnalisisUtilidad directamente en Mongodb, sin tener que leer los tweets en
+    pandas. Los metodos se llaman igual que en AnalisisUtilidad, pero en vez de una serie pandas reciben la ruta del
+    campo en el tweet (por ejemplo "entities.hashtags.text" o "lang"), por lo que no hereda de ella. Se ejecuta una
+    agregacion ($unwind, $group, $sort y $limit) en el servidor, por lo que solo viajan los resultados. Los
+    resultados tienen el mismo formato que en AnalisisUtilidad.
+
+    Metodos disponibles:
+        * obtenerNumeroDeElementosListaEnSeriePandas: obtiene el numero total de elementos de un campo lista.
+        * obtenerContadorDeElementosListaEnSeriePandas: obtiene el numero total de apariciones de cada elemento
+            de un campo lista.
+        * obtenerContadorDeElementosNoListaEnSeriePandas: obtiene el numero total de apariciones de cada elemento
+            de un campo con un unico elemento (no lista).
+        * obtenerContador: cuenta las apariciones de cada valor de un campo con una agregacion.
+        * obtenerExpresionCampo: obtiene la expresion de la agregacion para la ruta de un campo.
+        * obtenerNumeroTweets: obtiene el numero de tweets en la coleccion.
+        * agregar: ejecuta una agregacion en la coleccion.
+    """
+
+    # Ruta de los campos mas utilizados en el analisis
+    CAMPO_HASHTAGS = "entities.hashtags.text"
+    CAMPO_MENCIONES = "entities.user_mentions.screen_name"
+    CAMPO_LENGUAJE = "lang"
+    # Campo especial con la hora de creacion del tweet (UTC). Se obtiene con $hour de la fecha de creacion en
+    # datetime que guarda MongodbEscritorTweets (ManejadorMongodb.CAMPO_FECHA)
+    CAMPO_HORA = "hora"
+
+    def __init__(self, manejadorMongodb, coleccion=None):
+        """
+        Crea el objeto para analizar los tweets almacenados en Mongodb.
+
+        :param manejadorMongodb: manejador de Mongodb para obtener las colecciones
+        :param coleccion: coleccion que se analiza. Por defecto es la coleccion de los tweets parseados
+        """
+        self.manejadorMongodb = manejadorMongodb
+        self.coleccion = coleccion if coleccion is not None else manejadorMongodb.obtenerColeccionTweetsFiltrados()
+
+    def obtenerNumeroDeElementosListaEnSeriePandas(self, campo, promedio=False):
+        """
+        Obtiene el numero total de elementos de un campo lista de los tweets. Los tweets sin el campo cuentan
+        como una lista vacia.
+
+        :param campo: ruta del campo en el tweet del que se quiere obtener el numero total de elementos, por ejemplo
+            "entities.hashtags.text". Los valores tienen que ser listas.
+        :param promedio: True si se quiere obtener el numero promedio o False si se quiere obtener el numero total.
+            Por defecto es False.
+        :return: numero de elementos totales en este campo. El numero de apariciones puede ser total si promedio
+            es False o la media si es True.
+        """
+        resultado = list(self.agregar([
+            {"$group": {"_id": None,
+                        "total": {"$sum": {"$size": {"$ifNull": [self.obtenerExpresionCampo(campo), []]}}}}}]))
+        numeroTotal = resultado[0]["total"] if resultado else 0
+        if promedio:
+            numeroTweets = self.obtenerNumeroTweets()
+            if numeroTweets > 0:
+                numeroTotal /= float(numeroTweets)
+        return numeroTotal
+
+    def obtenerContadorDeElementosListaEnSeriePandas(self, campo, promedio=False, top=None):
+        """
+        Obtiene el numero total de apariciones de cada elemento de un campo lista de los tweets.
+
+        :param campo: ruta del campo en el tweet del que se quiere obtener el contador de elementos, por ejemplo
+            "entities.hashtags.text". Los valores tienen que ser listas.
+        :param promedio: True si se quiere obtener el numero promedio de apariciones de cada elemento o False
+            si se quiere obtener el numero total. Por defecto es False.
+        :param top: None si se quiere obtener todos los elementos o un numero para obtener los top primeros.
+            Por defecto es None.
+        :return: lista de tuplas (elemento, apariciones) ordenada de mas a menos frecuente, como la de
+            Counter.most_common. Los empates se ordenan por el elemento.
+        """
+        return self.obtenerContador(campo, [], promedio, top)
+
+    def obtenerContadorDeElementosNoListaEnSeriePandas(self, campo, promedio=False, top=None):
+        """
+        Obtiene el numero total de apariciones de cada elemento de un campo con un unico elemento de los tweets.
+        Como en AnalisisUtilidad, no se cuentan los valores vacios (None, "", 0 y False). Se puede utilizar
+        CAMPO_HORA para contar los tweets por hora de creacion.
+
+        :param campo: ruta del campo en el tweet del que se quiere obtener el contador de elementos, por ejemplo
+            "lang". Los valores no tienen que ser listas.
+        :param promedio: True si se quiere obtener el numero promedio de apariciones de cada elemento o False
+            si se quiere obtener el numero total. Por defecto es False.
+        :param top: None si se quiere obtener todos los elementos o un numero para obtener los top primeros.
+            Por defecto es None.
+        :return: lista de tuplas (elemento, apariciones) ordenada de mas a menos frecuente, como la de
+            Counter.most_common. Los empates se ordenan por el elemento.
+        """
+        return self.obtenerContador(campo, [{"$match": {"valor": {"$nin": [None, "", 0, False]}}}], promedio, top)
+
+    def obtenerContador(self, campo, filtroValores, promedio, top):
+        """
+        Cuenta las apariciones de cada valor de un campo en Mongodb: se separan los valores de las listas ($unwind),
+        se agrupan y cuentan ($group), se ordenan ($sort) y se limitan al top ($limit).
+
+        :param campo: ruta del campo en el tweet
+        :param filtroValores: etapas de la agregacion para descartar valores despues del $unwind
+        :param promedio: True si se quiere obtener el numero promedio de apariciones de cada elemento
+        :param top: None si se quiere obtener todos los elementos o un numero para obtener los top primeros.
+        :return: lista de tuplas (elemento, apariciones) ordenada de mas a menos frecuente
+        """
+        pipeline = [{"$project": {"_id": False, "valor": self.obtenerExpresionCampo(campo)}},
+                    {"$unwind": "$valor"}] + filtroValores + \
+                   [{"$group": {"_id": "$valor", "apariciones": {"$sum": 1}}},
+                    {"$sort": {"apariciones": pymongo.DESCENDING, "_id": pymongo.ASCENDING}}]
+        if top:  # Si se ha pasado un top se devuelven solo los top que se desea
+            pipeline.append({"$limit": top})
+
+        numeroTweets = self.obtenerNumeroTweets() if promedio else 0
+        contador = list()
+        for resultado in self.agregar(pipeline):
+            apariciones = resultado["apariciones"] / float(numeroTweets) if numeroTweets > 0 else \
+                resultado["apariciones"]
+            contador.append((resultado["_id"], apariciones))
+        return contador
+
+    def obtenerExpresionCampo(self, campo):
+        """
+        Obtiene la expresion de la agregacion para la ruta de un campo. Para CAMPO_HORA se obtiene la hora de la
+        fecha de creacion con $hour, que en los tweets sin fecha es null y no se cuenta.
+
+        :param campo: ruta del campo en el tweet
+        :return: expresion de la agregacion que da el valor del campo
+        """
+        if campo == MongodbAnalisisUtilidad.CAMPO_HORA:
+            return {"$hour": "$" + ManejadorMongodb.CAMPO_FECHA}
+        return "$" + campo
+
+    def obtenerNumeroTweets(self):
+        """
+        Obtiene el numero de tweets en la coleccion. Se utiliza para los promedios, como len(seriePandas) en
+        AnalisisUtilidad.
+
+        :return: numero de tweets en la coleccion
+        """
+        try:
+            if hasattr(self.coleccion, "count_documents"):  # pymongo >= 3.7
+                return self.coleccion.count_documents({})
+            return self.coleccion.count()
+        except pymongo.errors.ServerSelectionTimeoutError:
+            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_CONECTADO_MONGODB, terminarPrograma=True)
+
+    def agregar(self, pipeline):
+        """
+        Ejecuta una agregacion en la coleccion. Se permite utilizar disco para no superar el limite de memoria
+        de Mongodb en colecciones grandes.
+        Lanzara una excepcion para terminar el programa si no se puede conectar a Mongodb.
+
+        :param pipeline: etapas de la agregacion
+        :return: cursor con los resultados
+        """
+        try:
+            return self.coleccion.aggregate(pipeline, allowDiskUse=True)
+        except pymongo.errors.ServerSelectionTimeoutError:
+            raise TwiterExcepcion(TwiterExcepcion.EXCEPTION_MENSAJE_NO_CONECTADO_MONGODB, terminarPrograma=True)
+
+
+class ContadorSpaceSaving(object):
+    """
+    Contador aproximado de los elementos mas frecuentes (algoritmo Space-Saving) con memoria acotada: como mucho
+    se guardan capacidad elementos. Cuando llega un elemento nuevo y ya no hay hueco, se sustituye el elemento con
+    menos apariciones y el nuevo hereda sus apariciones como error.
+
+    Garantias, siendo N el numero de elementos anyadidos:
+        * Las apariciones de cada elemento guardado nunca son menores que las reales y como mucho son error mas
+            (apariciones - error <= reales <= apariciones).
+        * El error de cualquier elemento es como mucho N / capacidad (ver obtenerCotaError).
+        * Cualquier elemento con mas de N / capacidad apariciones reales esta guardado.
+
+    Metodos disponibles:
+        * anyadir: anyade las apariciones de un elemento.
+        * masComunes: obtiene los elementos con mas apariciones como Counter.most_common.
+        * obtenerError: obtiene el error de las apariciones de un elemento.
+        * obtenerCotaError: obtiene el maximo error posible de las apariciones de cualquier elemento.
+        * obtenerMinimo: obtiene el elemento con menos apariciones y sus apariciones.
+        * fusionar: fusiona varios contadores en uno nuevo.
+        * instantanea: obtiene el estado del contador para poder guardarlo en JSON.
+        * restaurar: restaura el estado del contador a partir de una instantanea.
+    """
+
+    CAPACIDAD = 1000  # Numero maximo de elementos que se guardan
+
+    def __init__(self, capacidad=CAPACIDAD):
+        """
+        Crea el contador vacio.
+
+        :param capacidad: numero maximo de elementos que se guardan
+        """
+        self.capacidad = capacidad
+        self.contadores = dict()  # elemento -> [apariciones, error]
+        # Monticulo con (apariciones, elemento) de cada elemento guardado. Las apariciones solo crecen, por lo que
+        # las del monticulo pueden estar desactualizadas pero nunca son mayores que las reales (ver obtenerMinimo)
+        self.monticulo = list()
+        self.numeroAnyadidos = 0
+
+    def anyadir(self, elemento, cantidad=1):
+        """
+        Anyade las apariciones de un elemento.
+
+        :param elemento: elemento que aparece
+        :param cantidad: numero de apariciones. Por defecto es 1
+        """
+        self.numeroAnyadidos += cantidad
+        contador = self.contadores.get(elemento)
+        if contador is not None:
+            contador[0] += cantidad
+            return
+        if len(self.contadores) < self.capacidad:
+            self.contadores[elemento] = [cantidad, 0]
+            heapq.heappush(self.monticulo, (cantidad, elemento))
+            return
+        # No hay hueco, se sustituye el elemento con menos apariciones
+        elementoMinimo, aparicionesMinimo = self.obtenerMinimo()
+        heapq.heappop(self.monticulo)
+        del self.contadores[elementoMinimo]
+        self.contadores[elemento] = [aparicionesMinimo + cantidad, aparicionesMinimo]
+        heapq.heappush(self.monticulo, (aparicionesMinimo + cantidad, elemento))
+
+    def obtenerMinimo(self):
+        """
+        Obtiene el elemento con menos apariciones. Deja actualizada la cima del monticulo con ese elemento: se
+        sacan las entradas de la cima desactualizadas y se vuelven a meter con sus apariciones actuales.
+
+        :return: tupla (elemento, apariciones) o (None, 0) si el contador esta vacio
+        """
+        while self.monticulo:
+            apariciones, elemento = self.monticulo[0]
+            aparicionesActuales = self.contadores[elemento][0]
+            if apariciones == aparicionesActuales:
+                return elemento, apariciones
+            heapq.heapreplace(self.monticulo, (aparicionesActuales, elemento))
+        return None, 0
+
+    def masComunes(self, top=None):
+        """
+        Obtiene los elementos con mas apariciones, con el mismo formato que Counter.most_common.
+
+        :param top: None si se quiere obtener todos los elementos o un numero para obtener los top primeros.
+            Por defecto es None.
+        :return: lista de tuplas (elemento, apariciones) ordenada de mas a menos apariciones
+        """
+        elementos = sorted(self.contadores.items(), key=lambda elementoContador: -elementoContador[1][0])
+        if top:  # Si se ha pasado un top se devuelven solo los top que se desea
+            elementos = elementos[:top]
+        return [(elemento, contador[0]) for elemento, contador in elementos]
+
+    def obtenerError(self, elemento):
+        """
+        Obtiene el error de las apariciones de un elemento, esto es, cuantas de sus apariciones pueden no ser suyas.
+
+        :param elemento: elemento del que se quiere obtener el error
+        :return: error del elemento. Si el elemento no esta guardado, el maximo de apariciones que puede tener
+        """
+        contador = self.contadores.get(elemento)
+        if contador is not None:
+            return contador[1]
+        return self.obtenerMinimo()[1] if len(self.contadores) >= self.capacidad else 0
+
+    def obtenerCotaError(self):
+        """
+        Obtiene el maximo error posible de las apariciones de cualquier elemento: las apariciones del elemento con
+        menos apariciones si el contador esta lleno, que nunca es mayor que numeroAnyadidos / capacidad.
+
+        :return: maximo error posible
+        """
+        return self.obtenerMinimo()[1] if len(self.contadores) >= self.capacidad else 0
+
+    def fusionar(self, contadores):
+        """
+        Fusiona varios contadores en uno nuevo de la misma capacidad que este. Un elemento que no esta en un
+        contador lleno puede haber aparecido en el tantas veces como el minimo de ese contador, por lo que se suma
+        ese minimo a sus apariciones y a su error. Las garantias se mantienen con N la suma de los anyadidos.
+
+        :param contadores: lista de ContadorSpaceSaving que se fusionan
+        :return: nuevo ContadorSpaceSaving
+        """
+        minimos = [contador.obtenerCotaError() for contador in contadores]
+        elementos = set()
+        for contador in contadores:
+            elementos.update(contador.contadores)
+
+        fusionados = list()
+        for elemento in elementos:
+            apariciones = 0
+            error = 0
+            for contador, minimo in zip(contadores, minimos):
+                aparicionesError = contador.contadores.get(elemento)
+                if aparicionesError is not None:
+                    apariciones += aparicionesError[0]
+                    error += aparicionesError[1]
+                else:
+                    apariciones += minimo
+                    error += minimo
+            fusionados.append((apariciones, error, elemento))
+        if len(fusionados) > self.capacidad:
+            fusionados = heapq.nlargest(self.capacidad, fusionados, key=lambda fusionado: fusionado[0])
+
+        contadorFusionado = ContadorSpaceSaving(self.capacidad)
+        contadorFusionado.numeroAnyadidos = sum(contador.numeroAnyadidos for contador in contadores)
+        contadorFusionado.contadores = dict((elemento, [apariciones, error])
+                                            for apariciones, error, elemento in fusionados)
+        contadorFusionado.monticulo = [(apariciones, elemento) for apariciones, _, elemento in fusionados]
+        heapq.heapify(contadorFusionado.monticulo)
+        return contadorFusionado
+
+    def instantanea(self):
+        """
+        Obtiene el estado del contador para poder guardarlo en JSON.
+
+        :return: diccionario con la capacidad, el numero de anyadidos y una lista [elemento, apariciones, error]
+        """
+        return {"capacidad": self.capacidad,
+                "numeroAnyadidos": self.numeroAnyadidos,
+                "contadores": [[elemento, contador[0], contador[1]] for elemento, contador in
+                               self.contadores.items()]}
+
+    def restaurar(self, instantanea):
+        """
+        Restaura el estado del contador a partir de una instantanea obtenida con el metodo instantanea.
+
+        :param instantanea: diccionario con el estado del contador
+        """
+        self.capacidad = instantanea["capacidad"]
+        self.numeroAnyadidos = instantanea["numeroAnyadidos"]
+        self.contadores = dict((elemento, [apariciones, error])
+                               for elemento, apariciones, error in instantanea["contadores"])
+        self.monticulo = [(contador[0], elemento) for elemento, contador in self.contadores.items()]
+        heapq.heapify(self.monticulo)
+
+
+class RastreadorTendencias(object):
+    """
+    Clase que obtiene los emoticonos, hashtags y menciones mas frecuentes mientras se escuchan los tweets, sin tener
+    que leerlos en pandas. El tiempo se divide en cubos de segundosCubo segundos y cada cubo tiene un
+    ContadorSpaceSaving por tipo, por lo que la memoria esta acotada. Las tendencias de una ventana (por ejemplo
+    los ultimos 5 minutos o la ultima hora) se obtienen fusionando los cubos de la ventana. Como los cubos son
+    enteros, la ventana incluye el cubo actual, que puede estar a medias.
+
+    El instante de cada tweet es su timestamp_ms, por lo que al reproducir tweets grabados las ventanas son las
+    originales. Las ventanas se cuentan desde el tweet mas reciente. Se puede llamar desde varios hilos a la vez.
+
+    Metodos disponibles:
+        * anyadirTweet: anyade los emoticonos, hashtags y menciones del texto de un tweet.
+        * anyadirTexto: anyade los emoticonos, hashtags y menciones de un texto en un instante.
+        * obtenerTendencias: obtiene los elementos mas frecuentes de un tipo en una ventana.
+        * obtenerContadorVentana: obtiene el ContadorSpaceSaving con las apariciones de un tipo en una ventana.
+        * instantanea: obtiene el estado para poder guardarlo en JSON, con las tendencias actuales.
+        * restaurar: restaura el estado a partir de una instantanea.
+        * guardarInstantanea: guarda la instantanea en un fichero JSON.
+        * cargarInstantanea: restaura el estado desde un fichero JSON.
+    """
+
+    VENTANAS = (300, 3600)  # Segundos de las ventanas: ultimos 5 minutos y ultima hora
+    SEGUNDOS_CUBO = 60
+    TOP = 10  # Numero de elementos de cada tendencia en la instantanea
+    TIPOS = (ParseadorTweetsAPandas.NOMBRE_COLUMNA_EMOTICONOS, ParseadorTweetsAPandas.NOMBRE_COLUMNA_HASHTAGS,
+             ParseadorTweetsAPandas.NOMBRE_COLUMNA_MENCIONES)
+
+    def __init__(self, capacidad=ContadorSpaceSaving.CAPACIDAD, ventanas=VENTANAS, segundosCubo=SEGUNDOS_CUBO,
+                 cacheCaracteristicasTexto=None):
+        """
+        Crea el rastreador sin ninguna tendencia.
+
+        :param capacidad: numero maximo de elementos de cada tipo que se guardan en cada cubo
+        :param ventanas: segundos de las ventanas de las que se quieren obtener tendencias
+        :param segundosCubo: segundos de cada cubo
+        :param cacheCaracteristicasTexto: CacheCaracteristicasTexto con la que no volver a calcular las
+            caracteristicas de los textos repetidos. Si es None (por defecto) no se utiliza cache
+        """
+        self.capacidad = capacidad
+        self.ventanas = tuple(ventanas)
+        self.segundosCubo = segundosCubo
+        self.cubos = deque()  # (instante de inicio del cubo, {tipo: ContadorSpaceSaving}) de mas antiguo a reciente
+        self.utilidadPatternTexto = UtilidadPatternTexto(cacheCaracteristicasTexto)
+        self.cerrojo = threading.Lock()
+
+    def anyadirTweet(self, tweetJson):
+        """
+        Anyade los emoticonos, hashtags y menciones del texto de un tweet. El instante es su timestamp_ms o el
+        actual si no lo tiene.
+
+        :param tweetJson: tweet en formato JSON
+        """
+        if not tweetJson.get("text"):
+            return
+        instante = float(tweetJson["timestamp_ms"]) / 1000 if tweetJson.get("timestamp_ms") else time.time()
+        self.anyadirTexto(tweetJson["text"], instante)
+
+    def anyadirTexto(self, texto, instante):
+        """
+        Anyade los emoticonos, hashtags y menciones de un texto en el cubo de su instante. Si el instante es
+        anterior a todos los cubos guardados, se descarta.
+
+        :param texto: texto del tweet
+        :param instante: segundos desde epoch del tweet
+        """
+        _, _, emoticonos, hashtags, menciones, _ = self.utilidadPatternTexto.obtenerCaracteristicasTexto(texto)
+        elementosTipo = {ParseadorTweetsAPandas.NOMBRE_COLUMNA_EMOTICONOS: emoticonos,
+                         ParseadorTweetsAPandas.NOMBRE_COLUMNA_HASHTAGS: hashtags,
+                         ParseadorTweetsAPandas.NOMBRE_COLUMNA_MENCIONES: menciones}
+        inicioCubo = int(instante // self.segundosCubo) * self.segundosCubo
+        with self.cerrojo:
+            contadoresCubo = self.obtenerContadoresCubo(inicioCubo)
+            if contadoresCubo is None:
+                return
+            for tipo, elementos in elementosTipo.items():
+                for elemento in elementos:
+                    contadoresCubo[tipo].anyadir(elemento)
+
+    def obtenerContadoresCubo(self, inicioCubo):
+        """
+        Obtiene los contadores del cubo que empieza en inicioCubo, creandolo si no existe. Al crear un cubo nuevo se
+        borran los que ya no estan en ninguna ventana. Se tiene que llamar con el cerrojo cogido.
+
+        :param inicioCubo: instante de inicio del cubo
+        :return: diccionario {tipo: ContadorSpaceSaving} o None si el cubo es demasiado antiguo
+        """
+        if self.cubos and inicioCubo <= self.cubos[-1][0]:  # Tweet desordenado, se busca su cubo
+            for inicio, contadoresCubo in reversed(self.cubos):
+                if inicio == inicioCubo:
+                    return contadoresCubo
+                if inicio < inicioCubo:
+                    break
+            if inicioCubo < self.cubos[0][0]:
+                return None
+            # Cubo intermedio sin tweets, se inserta en su sitio
+            contadoresCubo = dict((tipo, ContadorSpaceSaving(self.capacidad)) for tipo in RastreadorTendencias.TIPOS)
+            cubos = sorted(list(self.cubos) + [(inicioCubo, contadoresCubo)], key=lambda cubo: cubo[0])
+            self.cubos = deque(cubos)
+            return contadoresCubo
+
+        contadoresCubo = dict((tipo, ContadorSpaceSaving(self.capacidad)) for tipo in RastreadorTendencias.TIPOS)
+        self.cubos.append((inicioCubo, contadoresCubo))
+        while self.cubos[0][0] <= inicioCubo - max(self.ventanas):
+            self.cubos.popleft()
+        return contadoresCubo
+
+    def obtenerContadorVentana(self, tipo, ventana):
+        """
+        Obtiene el ContadorSpaceSaving con las apariciones de un tipo en los cubos de una ventana, contada desde el
+        cubo mas reciente.
+
+        :param tipo: emoticonos, hashtags o menciones (ver TIPOS)
+        :param ventana: segundos de la ventana
+        :return: ContadorSpaceSaving con las apariciones en la ventana
+        """
+        with self.cerrojo:
+            if not self.cubos:
+                return ContadorSpaceSaving(self.capacidad)
+            inicioUltimoCubo = self.cubos[-1][0]
+            contadores = [contadoresCubo[tipo] for inicio, contadoresCubo in self.cubos
+                          if inicio > inicioUltimoCubo - ventana]
+            return ContadorSpaceSaving(self.capacidad).fusionar(contadores)
+
+    def obtenerTendencias(self, tipo, ventana, top=TOP):
+        """
+        Obtiene los elementos mas frecuentes de un tipo en una ventana. Las apariciones son aproximadas: nunca son
+        menores que las reales y como mucho son obtenerContadorVentana(tipo, ventana).obtenerCotaError() mayores.
+
+        :param tipo: emoticonos, hashtags o menciones (ver TIPOS)
+        :param ventana: segundos de la ventana
+        :param top: numero de elementos. None para obtener todos los guardados
+        :return: lista de tuplas (elemento, apariciones) ordenada de mas a menos apariciones
+        """
+        return self.obtenerContadorVentana(tipo, ventana).masComunes(top)
+
+    def instantanea(self):
+        """
+        Obtiene el estado para poder guardarlo en JSON. Ademas de los cubos, se incluyen las tendencias actuales
+        de cada tipo y ventana para poder consultarlas sin restaurar el estado.
+
+        :return: diccionario con el estado y las tendencias
+        """
+        tendencias = dict((tipo, dict((str(ventana), self.obtenerTendencias(tipo, ventana))
+                                      for ventana in self.ventanas)) for tipo in RastreadorTendencias.TIPOS)
+        with self.cerrojo:
+            return {"capacidad": self.capacidad,
+                    "ventanas": list(self.ventanas),
+                    "segundosCubo": self.segundosCubo,
+                    "cubos": [[inicio, dict((tipo, contador.instantanea())
+                                            for tipo, contador in contadoresCubo.items())]
+                              for inicio, contadoresCubo in self.cubos],
+                    "tendencias": tendencias}
+
+    def restaurar(self, instantanea):
+        """
+        Restaura el estado a partir de una instantanea obtenida con el metodo instantanea.
+
+        :param instantanea: diccionario con el estado
+        """
+        with self.cerrojo:
+            self.capacidad = instantanea["capacidad"]
+            self.ventanas = tuple(instantanea["ventanas"])
+            self.segundosCubo = instantanea["segundosCubo"]
+            self.cubos = deque()
+            for inicio, instantaneaContadores in instantanea["cubos"]:
+                contadoresCubo = dict()
+                for tipo, instantaneaContador in instantaneaContadores.items():
+                    contadoresCubo[tipo] = ContadorSpaceSaving()
+                    contadoresCubo[tipo].restaurar(instantaneaContador)
+                self.cubos.append((inicio, contadoresCubo))
+
+    def guardarInstantanea(self, fichero):
+        """
+        Guarda la instantanea en un fichero JSON.
+
+        :param fichero: ruta del fichero
+        """
+        with open(fichero, "w") as ficheroInstantanea:
+            json.dump(self.instantanea(), ficheroInstantanea)
+
+    def cargarInstantanea(self, fichero):
+        """
+        Restaura el estado desde un fichero JSON guardado con guardarInstantanea.
+
+        :param fichero: ruta del fichero
+        """
+        with open(fichero) as ficheroInstantanea:
+            self.restaurar(json.load(ficheroInstantanea))